@@ -1,4 +1,8 @@
 import numpy as np                                                              # numpy
+from th_belief import th_belief                                                 # support-set belief state
+from th_filter import th_filter, th_filter_memmap                               # full-state Bayes filters
+from th_policy import th_policy_key                                             # information state keys of the optimal policy table
+from th_mcts import th_mcts                                                     # Monte Carlo tree search
 
 
 class th_agent:
@@ -10,22 +14,68 @@ class th_agent:
         Inputs
             a_init     (obj) : agent initialization parameter structure with fields
                 .task  (obj) : task object
+                .index (obj) : optional node to hypotheses inverted index (th_inverted_index)
+                .F     (obj) : optional observation-weighted transition operators (th_filter_operators),
+                               if provided, the belief state is a full-state Bayes filter (th_filter)
+                .memmap_dir (str) : optional directory, if provided, the belief state is an out-of-core
+                               full-state Bayes filter with memory-mapped belief files (th_filter_memmap)
+                .policy (obj) : optional optimal policy table structure (th_policy), if provided, the agent
+                               decides by table lookup of its information state
+                .mcts  (obj) : optional Monte Carlo tree search parameter structure with optional fields
+                               .seconds, .rollouts, .c and .seed (th_mcts), if provided, the agent
+                               decides by Monte Carlo tree search on its belief state
+                .rng   (obj) : optional random number generator of the agent's decisions, a
+                               np.random.RandomState object, defaults to the np.random module
 
         Authors - Belinda Fleischmann, Dirk Ostwald
         """
         # structural components
         self.task   = a_init.task                                               # task information
 
+        self.rng    = a_init.rng if hasattr(a_init, "rng") else np.random       # random number generator of decisions
+
         # dynamic components
         self.c      = np.nan                                                    # current round
         self.t      = np.nan                                                    # current trial
-        self.b      = np.nan                                                    # current belief state
+        if hasattr(a_init, "memmap_dir"):
+            self.b  = th_filter_memmap(                                         # current belief state
+                self.task.theta, self.task.S, self.task.O, self.task.A,
+                self.task.Phi, self.task.Omega, directory=a_init.memmap_dir)
+        elif hasattr(a_init, "F"):
+            self.b  = th_filter(                                                # current belief state
+                self.task.theta, self.task.S, self.task.O, self.task.A,
+                self.task.Omega, a_init.F)
+        else:
+            self.b  = th_belief(                                                # current belief state
+                self.task.theta, self.task.S, self.task.O, self.task.Omega,
+                index=a_init.index if hasattr(a_init, "index") else None)
         self.v      = np.nan                                                    # current action valences
         self.d      = np.nan                                                    # current decision
+        self.policy = a_init.policy if hasattr(a_init, "policy") else None      # optimal policy table
+        if self.policy is not None:                                             # the table holds the reachable states of its configuration only
+            theta  = self.task.theta
+            config = (self.policy.d, self.policy.n_h, self.policy.n_c, self.policy.n_t)
+            if config != (theta.d, theta.n_h, theta.n_c, theta.n_t):
+                raise ValueError(
+                    f"Policy table of d = {config[0]}, n_h = {config[1]}, n_c = {config[2]}, n_t = {config[3]} "
+                    f"does not match the task with d = {theta.d}, n_h = {theta.n_h}, n_c = {theta.n_c}, "
+                    f"n_t = {theta.n_t}, evaluate the table with th_policy for this configuration")
+        self.found  = 0                                                         # bitmask of previous treasure locations
+        self.visited = 0                                                        # bitmask of nodes visited in the current round
+        self.mcts   = None                                                      # Monte Carlo tree search
+        if hasattr(a_init, "mcts"):
+            mcts = dict(vars(a_init.mcts))
+            if mcts.get("seed") is None:                                        # search seeded by the agent's generator
+                mcts["seed"] = int(self.rng.randint(2 ** 31))
+            self.mcts = th_mcts(self.task.theta, self.task.A, **mcts)
 
     def delta(self):
         """
-        This function implements the agent's decision function delta.
+        This function implements the agent's decision function delta, i.e.
+        a uniformly random available action or, given a policy table, the
+        optimal action of the agent's information state, or, given Monte
+        Carlo tree search parameters, the action found within the search
+        budget.
 
         Input
             self   (obj) : agent object
@@ -34,5 +84,66 @@ class th_agent:
             self   (obj) : agent object with updated attribute
                 .d (int) : decision
         """
-        self.d = np.random.choice(self.task.A_giv_s1, 1)
+        if self.mcts is not None:
+            self.d = self.mcts.search(
+                self.b, self.task.s[0], int(self.task.theta.n_t - 1 - self.task.t))
+            return self.d
+        if self.policy is None:
+            self.d = self.rng.choice(self.task.A_giv_s1)
+            return self.d
+
+        task   = self.task
+        colors = task.node_colors
+        hide   = self.found                                                     # known hiding spots
+        empty  = 0                                                              # known non-hiding spots
+        for node in np.flatnonzero(colors == 2):
+            hide |= 1 << int(node)
+        for node in np.flatnonzero(colors == 1):
+            empty |= 1 << int(node)
+        key = th_policy_key(task.theta, int(task.theta.n_t - 1 - task.t), int(task.s[0]),
+                            hide, empty, self.visited)
+        if key not in self.policy.table:
+            raise KeyError(f"Information state of node {task.s[0]} in trial {task.t + 1} is not in the policy "
+                           f"table, which holds the states reachable under the policy for theta.n_c rounds")
+        self.d = self.policy.table[key]
         return self.d
+
+    def start_round(self):
+        """
+        This function carries the agent's belief state over to a new round,
+        keeping its hiding spot posterior.
+
+        Input
+            self   (obj) : agent object
+
+        Output
+            self   (obj) : agent object with updated attribute
+                .b (obj) : belief state
+        """
+        self.b.new_round(s1=self.task.s[0])
+        self.visited = 0                                                        # visited nodes are tracked per round
+
+    def update_belief(self, a, o):
+        """
+        This function updates the agent's belief state given the action and
+        the resulting observation on its (observable) current position.
+
+        Input
+            self   (obj) : agent object
+            a      (int) : action value that resulted in observation o
+            o      (arr) : 1 x 2 array of observation values
+
+        Output
+            self   (obj) : agent object with updated attribute
+                .b (obj) : belief state
+        """
+        self.b.update(s1=self.task.s[0], a=a, o=o)
+        if self.mcts is not None:                                               # search tree of the current history
+            if self.task.t == 0:
+                self.mcts.reset()
+            else:
+                self.mcts.advance(a, o)
+        bit = 1 << int(self.task.s[0] - 1)                                      # current position
+        self.visited |= bit
+        if o[0] == 1:                                                           # treasure location is a hiding spot
+            self.found |= bit
@@ -0,0 +1,235 @@
+import numpy as np                                                              # numpy
+from th_bitmask import th_s3_masks, th_consistent                               # hiding spot bitmasks
+from th_index import th_intersect                                               # posting list intersection
+from th_components import th_toarray                                            # representation independent array conversion
+from th_kernels import th_kernel_compact                                        # optional compiled kernels
+
+
+class th_belief:
+    def __init__(self, theta, S, O, Omega, index=None):
+        """This function encodes the instantiation method of the treasure hunt
+        support-set belief class. The agent knows its current position s1,
+        such that its belief state is a distribution over the n_s / n_n
+        hypotheses (s2, s3), i.e. the treasure location and hiding spot
+        values of the states in the first s1 block of S. Instead of a dense
+        vector over all hypotheses, only the indices and probabilities of
+        hypotheses that are still consistent with the observations are
+        stored, and the support set is compacted after each update.
+
+        Inputs
+            theta      (obj) : task parameter structure with required fields
+                .n_n   (int) : number of nodes
+                .n_h   (int) : number of hiding spots
+                .n_s   (int) : state space cardinality
+            S          (arr) : n_s x (2 + n_h) array of state values
+            O          (arr) : n_o x 2 array of observation values
+            Omega      (dic) : dict with 2 entries of n_s x n_o sparse arrays of observation probability
+            index      (obj) : optional th_inverted_index object, if provided, updates filter the support
+                               set with the posting list of the current position instead of evaluating
+                               Omega for all live hypotheses
+
+        Authors - Belinda Fleischmann, Dirk Ostwald
+        """
+        # Structural components
+        self.theta   = theta                                                    # task parameters
+        self.O       = O                                                        # observation set
+        self.Omega   = Omega                                                    # action-dependent and state-conditional observation probability distribution
+        self.n_ident = theta.n_s // theta.n_n                                   # number of hypotheses (s2, s3)
+        self.H       = S[:self.n_ident, 1:]                                     # n_ident x (1 + n_h) array of hypothesis values (s2, s3)
+        self.M       = th_s3_masks(self.H[:, 1:], theta.n_n)                    # n_ident x 0 array of hypothesis hiding spot bitmasks
+        self.index   = index                                                    # node to hypotheses inverted index
+
+        self.order   = None                                                     # hypothesis indices sorted by bitmask, evaluated on first new round
+
+        # Dynamic components
+        self.i_h     = np.arange(self.n_ident)                                  # support set, i.e. indices of hypotheses with nonzero probability
+        self.p       = np.full(self.n_ident, 1 / self.n_ident)                  # probabilities of support set hypotheses
+
+    @property
+    def n_live(self):
+        """Number of hypotheses with nonzero probability"""
+        return self.i_h.size
+
+    def update(self, s1, a, o):
+        """This function evaluates the posterior belief state after action a
+        and observation o on position s1 and compacts the support set.
+
+        Inputs
+            self       (obj) : belief object
+            s1         (int) : current position
+            a          (int) : action in trial t
+            o          (arr) : 1 x 2 array of observation values
+
+        Outputs
+            self       (obj) : belief object with updated attributes
+                .i_h   (arr) : support set (compacted)
+                .p     (arr) : support set probabilities
+        """
+        if self.index is not None:
+            self.filter(s1, a, o)
+            return
+
+        i_a  = 0 if a == 0 else 1                                               # compressed action index (drill/step)
+        i_o  = int(np.flatnonzero(np.all(self.O == o, axis=1))[0])              # observation index
+        rows = (int(s1) - 1) * self.n_ident + self.i_h                          # state indices of support set hypotheses
+
+        likelihood = th_toarray(self.Omega[i_a][rows, i_o]).ravel()             # observation likelihood of support set hypotheses
+        i_h, p     = th_kernel_compact(self.i_h, self.p, likelihood)            # normalized posterior of consistent hypotheses
+        if not len(i_h):
+            raise ValueError(
+                f"Observation {o} after action {a} on node {s1} is inconsistent with the belief state")
+
+        self.i_h = i_h                                                          # compacted support set
+        self.p   = p                                                            # normalized posterior probabilities
+
+    def filter(self, s1, a, o):
+        """This function evaluates the posterior belief state after action a
+        and observation o on position s1 with the inverted index. Omega is
+        an indicator function of the consistency of observations with the
+        position being the treasure location and a hiding spot, such that the
+        posterior is the prior restricted to the consistent hypotheses, which
+        are obtained from one posting list and one treasure location block.
+
+        Inputs
+            self       (obj) : belief object
+                .index (obj) : node to hypotheses inverted index
+            s1         (int) : current position
+            a          (int) : action in trial t
+            o          (arr) : 1 x 2 array of observation values
+
+        Outputs
+            self       (obj) : belief object with updated attributes
+                .i_h   (arr) : support set (compacted)
+                .p     (arr) : support set probabilities
+        """
+        s1                     = int(s1)                                        # current position
+        tr_flag, node_color    = o[0], o[1]                                     # treasure flag and node color
+        start, stop            = np.searchsorted(                               # live hypotheses with treasure location s1
+            self.i_h, self.index.block(s1))
+        keep                   = np.ones(self.n_live, dtype=bool)               # consistent hypotheses
+
+        # Treasure flag, drill observations are only possible, if s1 is not the treasure location
+        if tr_flag == 1 and a != 0:                                             # treasure found
+            keep[:start] = False
+            keep[stop:]  = False
+        else:                                                                   # no treasure found
+            keep[start:stop] = False
+
+        # Node color, blue and grey unveil whether s1 is a hiding spot
+        if node_color != 0:
+            pos = th_intersect(self.i_h, self.index.postings[s1])               # live hypotheses with hiding spot s1
+            if node_color == 2:                                                 # s1 is a hiding spot
+                is_hide      = np.zeros(self.n_live, dtype=bool)
+                is_hide[pos] = True
+                keep        &= is_hide
+            else:                                                               # s1 is not a hiding spot
+                keep[pos]    = False
+
+        if not np.any(keep):
+            raise ValueError(
+                f"Observation {o} after action {a} on node {s1} is inconsistent with the belief state")
+
+        self.i_h, self.p = th_kernel_compact(self.i_h, self.p, keep)            # compacted support set, normalized posterior probabilities
+
+    def prune(self, node_colors):
+        """This function removes hypotheses whose hiding spots are
+        inconsistent with the node colors and compacts the support set.
+
+        Inputs
+            self         (obj) : belief object
+            node_colors  (arr) : 1 x n_n array of node colors
+
+        Outputs
+            self         (obj) : belief object with updated attributes
+                .i_h     (arr) : support set (compacted)
+                .p       (arr) : support set probabilities
+        """
+        keep     = th_consistent(self.M[self.i_h], node_colors)                 # hypotheses consistent with node colors
+        self.i_h = self.i_h[keep]                                               # compacted support set
+        self.p   = self.p[keep] / self.p[keep].sum()                            # normalized probabilities
+
+    def new_round(self, s1):
+        """This function carries the belief state over to a new round, in
+        which the treasure is hidden again among the hiding spots other than
+        the current position s1. The hiding spot posterior is kept, the
+        treasure location belief is reset, see th_carry_s3.
+
+        Inputs
+            self       (obj) : belief object
+            s1         (int) : current position
+
+        Outputs
+            self       (obj) : belief object with updated attributes
+                .i_h   (arr) : support set
+                .p     (arr) : support set probabilities
+        """
+        if self.order is None:
+            self.order = np.argsort(self.M, kind="stable")
+        self.i_h, self.p = th_carry_s3(
+            self.H, self.M, self.order, self.i_h, self.p, s1, self.theta.n_h)
+
+    def marg_s2(self):
+        """This function evaluates the marginal belief over the treasure
+        location s2
+
+        Outputs
+            marg   (arr) : 1 x n_n array of treasure location probabilities
+        """
+        return np.bincount(
+            self.H[self.i_h, 0] - 1, weights=self.p,
+            minlength=self.theta.n_n)
+
+    def marg_s3(self):
+        """This function evaluates the marginal probabilities of each node
+        being a hiding spot
+
+        Outputs
+            marg   (arr) : 1 x n_n array of hiding spot probabilities
+        """
+        return np.bincount(
+            self.H[self.i_h, 1:].ravel() - 1,
+            weights=np.repeat(self.p, self.theta.n_h),
+            minlength=self.theta.n_n)
+
+    def sample(self, n, rng):
+        """This function samples hypotheses from the belief state
+
+        Inputs
+            n          (int) : number of samples
+            rng        (obj) : np.random.Generator object
+
+        Outputs
+            h          (arr) : n x (1 + n_h) array of hypothesis values (s2, s3)
+        """
+        return self.H[rng.choice(self.i_h, size=n, p=self.p)]
+
+
+def th_carry_s3(H, M, order, i_h, p, s1, n_h):
+    """This function evaluates the belief over hypotheses (s2, s3) at the
+    start of a new round. The probability of each hiding spot combination s3
+    is kept, and distributed uniformly over the hypotheses with the same s3
+    and a treasure location s2 other than the current position s1, unless s1
+    is the only hiding spot. Only the live hypotheses are processed.
+
+    Inputs
+        H        (arr) : n_ident x (1 + n_h) array of hypothesis values (s2, s3)
+        M        (arr) : n_ident x 0 array of hypothesis hiding spot bitmasks
+        order    (arr) : n_ident x 0 array of hypothesis indices sorted by M
+        i_h      (arr) : support set, i.e. indices of hypotheses with nonzero probability
+        p        (arr) : probabilities of support set hypotheses
+        s1       (int) : current position
+        n_h      (int) : number of hiding spots
+
+    Outputs
+        i_h      (arr) : support set of the new round (sorted)
+        p        (arr) : probabilities of support set hypotheses
+    """
+    masks, inverse = np.unique(M[i_h], return_inverse=True)                     # live hiding spot combinations
+    p_s3           = np.bincount(inverse, weights=p)                            # hiding spot combination probabilities
+    first          = np.searchsorted(M[order], masks)                           # each combination has n_h hypotheses, one per s2
+    candidates     = order[first[:, None] + np.arange(n_h)]                     # n_masks x n_h hypothesis indices
+    valid          = (H[candidates, 0] != s1) | (n_h == 1)                      # treasure not hidden on the current position
+    weights        = p_s3[:, None] * valid / valid.sum(axis=1, keepdims=True)
+    i_h, p         = candidates[valid], weights[valid]
+    sort           = np.argsort(i_h)                                            # support sets are sorted
+    return i_h[sort], p[sort]
@@ -0,0 +1,349 @@
+"""
+This Python script benchmarks the construction of the treasure hunt sets,
+components and games across a ladder of task configurations (d, n_h). For
+each configuration and stage, the wall time and the peak memory allocated
+during the stage are measured. Results are stored as JSON and compared
+against a stored baseline to flag regressions. Stages that exceed the time
+budget are marked as infeasible and skipped for all larger configurations,
+such that the output shows where each configuration stops being feasible.
+
+The import time of the simulation and component building modules is
+measured in a fresh interpreter and checked against an import time budget.
+These modules must be importable without plotting libraries, such that
+short-lived batch workers do not pay for them.
+
+Usage (from the repository root)
+    python Code/th_bench.py --label <label> [--ladder 2:1,3:2] [--baseline <json>] [--import-budget 0.75]
+
+Results are written to Benchmarks/<label>.json, which is ignored by git except
+for Benchmarks/baseline.json, the stored baseline for the default ladder.
+Timings are machine-specific, such that the baseline should be recreated on
+the machine used for comparison before changes are benchmarked
+    python Code/th_bench.py --label baseline
+    python Code/th_bench.py --label <label> --baseline Benchmarks/baseline.json
+
+Authors - Belinda Fleischmann, Dirk Ostwald
+"""
+import argparse                                                                 # command line arguments
+import contextlib                                                               # context managers
+import io                                                                       # in-memory streams
+import json                                                                     # JSON serialization
+import os                                                                       # operating system interface
+import platform                                                                 # python version
+import subprocess                                                               # child processes
+import sys                                                                      # system interface
+import tempfile                                                                 # temporary directories
+import time                                                                     # wall time
+import tracemalloc                                                              # peak memory
+import numpy as np                                                              # numpy
+import pandas as pd                                                             # pandas
+from th_structure import th_structure                                           # structures
+from th_paths import th_paths                                                   # path variables
+from th_cards import th_cards                                                   # task sets' cardinalities
+from th_sets import th_sets                                                     # task/agent model sets generator
+from th_phi import th_phi                                                       # action-dependent state-state transition probability matrices
+from th_omega import th_omega                                                   # action-dependent state conditional observation probability matrices
+from th_index import th_inverted_index                                          # node to hypotheses inverted index
+from th_belief import th_belief                                                 # support-set belief state
+from th_sim_game import th_sim_game                                             # game simulation routine
+from th_helper import humanreadable_time                                        # time formatting
+
+
+# Default ladder of (d, n_h) configurations, ordered by state space cardinality
+LADDER = [(2, 1), (2, 2), (3, 2), (3, 3), (4, 2), (4, 3), (4, 4), (5, 2), (5, 3), (5, 4), (5, 6)]
+
+# Benchmark stages, each stage depends on all previous stages
+STAGES = ["th_sets", "th_index", "th_phi", "th_omega", "th_sim_game", "th_belief"]
+
+# Simulation and component building modules, importable without plotting libraries
+HEADLESS_MODULES = ["th_structure", "th_paths", "th_cards", "th_plan", "th_sets", "th_phi", "th_omega",
+                    "th_index", "th_belief", "th_sim_game", "th_data", "th_queue", "th_policy", "th_mcts"]
+
+# Modules the headless modules must not import
+HEAVY_MODULES = ["matplotlib", "mpl_toolkits", "scipy.stats"]
+
+
+def th_bench_theta(d, n_h):
+    """This function returns the task and model parameter structure of a
+    benchmark configuration
+
+    Inputs
+        d        (int) : dimensionality of the square grid world
+        n_h      (int) : number of hiding spots
+
+    Outputs
+        theta    (obj) : task parameter structure
+    """
+    theta         = th_structure()                                              # task parameter structure initialization
+    theta.d       = d                                                           # dimension of the square grid world
+    theta.n_n     = d ** 2                                                      # number of grid world cells/nodes
+    theta.n_h     = n_h                                                         # number of treasure hiding spots
+    theta.d_s     = 2 + n_h                                                     # state vector dimension
+    theta.n_c     = 1                                                           # number of rounds per game
+    theta.n_t     = 12                                                          # maximal number of actions per round
+    theta         = th_cards(theta)                                             # task sets' cardinalities
+    theta.tau     = np.nan                                                      # post-decision noise parameter
+    theta.lambda_ = np.nan                                                      # weighting parameter for agent A3
+    return theta
+
+
+def th_bench_measure(func):
+    """This function measures the wall time and peak memory of a function
+    call. Standard output of the function is discarded.
+
+    Inputs
+        func     (fun) : function without arguments
+
+    Outputs
+        result   (obj) : return value of func
+        seconds  (flt) : wall time in seconds
+        peak     (int) : peak memory allocated during the call in bytes
+    """
+    tracemalloc.start()                                                         # start tracing allocations (numpy included)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):                             # discard per-iteration prints
+        result = func()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()                                   # peak traced memory
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def th_bench_config(d, n_h, skip, seed=0):
+    """This function runs all benchmark stages for one configuration in a
+    temporary directory, such that no components are loaded from disk
+
+    Inputs
+        d        (int) : dimensionality of the square grid world
+        n_h      (int) : number of hiding spots
+        skip     (set) : set of stages to be skipped as infeasible
+        seed     (int) : random seed of the simulated game
+
+    Outputs
+        records (list) : list of result dicts, one per stage
+    """
+    theta   = th_bench_theta(d, n_h)                                            # configuration parameters
+    records = []
+    objs    = th_structure()                                                    # stage outputs passed on to later stages
+    cwd     = os.getcwd()
+
+    def run_sets():
+        th_sets(theta, objs.paths)
+        objs.S = np.load(os.path.join(objs.paths.components, "S.npy"))
+        objs.O = np.load(os.path.join(objs.paths.components, "O.npy"))
+        objs.A = np.load(os.path.join(objs.paths.components, "A.npy"))
+
+    def run_index():
+        objs.index = th_inverted_index(theta)
+
+    def run_phi():
+        objs.Phi = th_phi(objs.S, objs.A, theta, objs.paths)
+        for p in objs.Phi:                                                      # build all actions
+            objs.Phi[p]
+
+    def run_omega():
+        objs.Omega = th_omega(objs.S, objs.O, theta, objs.paths)
+        for p in objs.Omega:                                                    # build all actions
+            objs.Omega[p]
+
+    def run_game():
+        np.random.seed(seed)
+        sim             = th_structure()
+        sim.mode        = "simulation"
+        sim.theta       = theta
+        sim.t_init      = th_structure()
+        sim.t_init.theta, sim.t_init.S, sim.t_init.O = theta, objs.S, objs.O
+        sim.t_init.A, sim.t_init.R = objs.A, objs.A
+        sim.t_init.Phi, sim.t_init.Omega = objs.Phi, objs.Omega
+        sim.a_init      = th_structure()
+        sim.a_init.a_name = "bench"
+        sim.a_init.index  = objs.index
+        sim.m_init      = th_structure()
+        sim.m_init.theta = theta
+        objs.data       = th_sim_game(sim).data
+
+    def run_belief():
+        data   = objs.data[objs.data["s1_t"].notna()]                           # recorded trials
+        belief = th_belief(theta, objs.S, objs.O, objs.Omega, index=objs.index)
+        a_prev = 1                                                              # first observation as if stepped on start position
+        for row in data.itertuples():                                           # replay game observations
+            belief.update(s1=int(row.s1_t), a=a_prev, o=row.o_t)
+            if pd.notna(row.a_t):                                               # no action after treasure was found
+                a_prev = int(row.a_t)
+
+    stages = dict(zip(STAGES, [run_sets, run_index, run_phi, run_omega, run_game, run_belief]))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)                                                       # components directory relative to temporary directory
+        try:
+            objs.paths = th_paths(theta, out_directory_label="bench")
+            failed     = False
+            for stage, run in stages.items():
+                record = {"d": d, "n_h": n_h, "n_s": theta.n_s, "stage": stage,
+                          "seconds": None, "peak_bytes": None}
+                if failed or stage in skip:
+                    record["status"] = "skipped"
+                    failed           = True                                     # later stages depend on this stage
+                else:
+                    _, record["seconds"], record["peak_bytes"] = th_bench_measure(run)
+                    record["status"] = "ok"
+                records.append(record)
+        finally:
+            os.chdir(cwd)
+
+    return records
+
+
+def th_bench_imports(modules=HEADLESS_MODULES, repeat=3):
+    """This function measures the import time of modules in fresh
+    interpreters, i.e. the start-up cost of a batch worker, and reports which
+    heavy modules were imported along
+
+    Inputs
+        modules  (list) : list of module names
+        repeat    (int) : number of measurements, the minimum is reported
+
+    Outputs
+        record   (dict) : dict with fields
+            modules (list) : list of module names
+            seconds  (flt) : minimal import time in seconds
+            heavy   (list) : heavy modules imported, see HEAVY_MODULES
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {', '.join(modules)}\n"
+        "seconds = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'seconds': seconds, 'heavy': heavy}))\n"
+    )
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(                                                   # fresh interpreter, Code directory on the path
+            [sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    return {"modules": modules,
+            "seconds": min(r["seconds"] for r in runs),
+            "heavy": runs[0]["heavy"]}
+
+
+def th_bench_compare(results, baseline, tolerance, min_seconds=0.05, min_bytes=2 ** 20):
+    """This function compares benchmark results against a baseline
+
+    Inputs
+        results      (list) : list of result dicts
+        baseline     (list) : list of baseline result dicts
+        tolerance     (flt) : relative increase of time or memory tolerated
+        min_seconds   (flt) : wall time below which timing differences are considered noise
+        min_bytes     (int) : peak memory below which memory differences are considered noise
+
+    Outputs
+        regressions  (list) : list of (config, stage, metric, baseline value, value) tuples
+    """
+    base = {(r["d"], r["n_h"], r["stage"]): r for r in baseline if r["status"] == "ok"}
+    regressions = []
+    for r in results:
+        b = base.get((r["d"], r["n_h"], r["stage"]))
+        if b is None or r["status"] != "ok":
+            continue
+        if (r["seconds"] > b["seconds"] * (1 + tolerance)
+                and r["seconds"] > min_seconds):
+            regressions.append(((r["d"], r["n_h"]), r["stage"], "seconds", b["seconds"], r["seconds"]))
+        if (r["peak_bytes"] > b["peak_bytes"] * (1 + tolerance)
+                and r["peak_bytes"] > min_bytes):
+            regressions.append(((r["d"], r["n_h"]), r["stage"], "peak_bytes", b["peak_bytes"], r["peak_bytes"]))
+    return regressions
+
+
+def th_bench(ladder=LADDER, max_seconds=60.0, seed=0):
+    """This function runs the benchmark stages for a ladder of
+    configurations. Once a stage exceeds the time budget, it is marked as
+    infeasible and skipped for all configurations with larger state space.
+
+    Inputs
+        ladder       (list) : list of (d, n_h) configurations
+        max_seconds   (flt) : time budget per stage
+        seed          (int) : random seed of the simulated games
+
+    Outputs
+        results      (list) : list of result dicts
+    """
+    results    = []
+    infeasible = {}                                                             # stage -> smallest n_s exceeding budget
+    ladder     = sorted(ladder, key=lambda c: th_bench_theta(*c).n_s)
+    for d, n_h in ladder:
+        n_s  = th_bench_theta(d, n_h).n_s
+        skip = {stage for stage, n_s_max in infeasible.items() if n_s >= n_s_max}
+        for record in th_bench_config(d, n_h, skip, seed):
+            if record["status"] == "ok" and record["seconds"] > max_seconds:
+                record["status"] = "infeasible"
+                infeasible.setdefault(record["stage"], n_s)
+            results.append(record)
+            print(f"d = {d}, n_h = {n_h}, n_s = {n_s:>10}, {record['stage']:<12}: "
+                  f"{record['status']:<10}"
+                  + (f" {humanreadable_time(record['seconds']):>12}"
+                     f" {record['peak_bytes'] / 2 ** 20:10.1f} MiB"
+                     if record["seconds"] is not None else ""))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Treasure hunt scaling benchmarks")
+    parser.add_argument("--label", default="bench", help="result label")
+    parser.add_argument("--ladder", default=None,
+                        help="comma separated d:n_h configurations, e.g. 2:1,3:2")
+    parser.add_argument("--max-seconds", type=float, default=60.0,
+                        help="time budget per stage beyond which larger configurations are skipped")
+    parser.add_argument("--out-dir", default="Benchmarks", help="directory to store JSON results")
+    parser.add_argument("--baseline", default=None, help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative time or memory increase flagged as regression")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the simulated games")
+    parser.add_argument("--import-budget", type=float, default=0.75,
+                        help="import time budget of the headless modules in seconds")
+    args = parser.parse_args(argv)
+
+    imports = th_bench_imports()
+    print(f"import of headless modules: {humanreadable_time(imports['seconds'])}"
+          + (f", imports {', '.join(imports['heavy'])}" if imports["heavy"] else ""))
+
+    ladder = LADDER
+    if args.ladder:
+        ladder = [tuple(int(x) for x in c.split(":")) for c in args.ladder.split(",")]
+
+    results = th_bench(ladder, args.max_seconds, args.seed)
+
+    if not os.path.exists(args.out_dir):
+        os.makedirs(args.out_dir)
+    out_path = os.path.join(args.out_dir, f"{args.label}.json")
+    with open(out_path, "w", encoding="utf8") as json_file:
+        json.dump({"label": args.label,
+                   "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "python": platform.python_version(),
+                   "numpy": np.__version__,
+                   "max_seconds": args.max_seconds,
+                   "imports": imports,
+                   "results": results}, json_file, indent=1)
+    print(f"Results saved to {out_path}")
+
+    status = 0
+    if imports["seconds"] > args.import_budget or imports["heavy"]:
+        print(f"IMPORT BUDGET EXCEEDED: {imports['seconds']:.3f} sec. "
+              f"(budget {args.import_budget:.3f} sec.), heavy modules: {imports['heavy']}")
+        status = 1
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf8") as json_file:
+            baseline = json.load(json_file)["results"]
+        regressions = th_bench_compare(results, baseline, args.tolerance)
+        for config, stage, metric, base_value, value in regressions:
+            print(f"REGRESSION d, n_h = {config}, {stage}, {metric}: {base_value:.4g} -> {value:.4g}")
+        if regressions:
+            return 1
+        print("No regressions")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import numpy as np                                                              # numpy
+
+
+def th_mask_dtype(n_n):
+    """This function returns the smallest unsigned integer datatype that holds
+    one bit per grid world node
+
+    Inputs
+        n_n      (int) : number of nodes
+
+    Outputs
+        dtype    (obj) : np.uint32 for n_n <= 32, np.uint64 for n_n <= 64
+    """
+    if n_n <= 32:
+        return np.dtype(np.uint32)
+    if n_n <= 64:
+        return np.dtype(np.uint64)
+    raise ValueError(f"Bitmask encoding supports up to 64 nodes (d <= 8), got n_n = {n_n}")
+
+
+def th_s3_masks(s3, n_n):
+    """This function encodes hiding spot combinations as bitmasks, in which
+    bit n - 1 is set if node n is a hiding spot
+
+    Inputs
+        s3       (arr) : m x n_h array of hiding spot node values in {1, ..., n_n}
+        n_n      (int) : number of nodes
+
+    Outputs
+        masks    (arr) : m x 0 array of hiding spot bitmasks
+
+    Authors - Belinda Fleischmann, Dirk Ostwald
+    """
+    dtype = th_mask_dtype(n_n)                                                  # bitmask datatype
+    s3    = np.atleast_2d(np.asarray(s3)).astype(dtype)                         # hiding spots as unsigned integers
+    bits  = np.left_shift(dtype.type(1), s3 - dtype.type(1))                    # one bit per hiding spot
+    return np.bitwise_or.reduce(bits, axis=1)
+
+
+def th_nodes_mask(nodes, n_n):
+    """This function encodes a set of nodes as a single bitmask
+
+    Inputs
+        nodes    (arr) : array of node values in {1, ..., n_n}
+        n_n      (int) : number of nodes
+
+    Outputs
+        mask     (int) : bitmask of the node set
+    """
+    dtype = th_mask_dtype(n_n)                                                  # bitmask datatype
+    mask  = dtype.type(0)                                                       # empty set
+    for node in np.asarray(nodes).ravel():
+        mask |= dtype.type(1) << dtype.type(node - 1)                           # add node to set
+    return mask
+
+
+def th_is_hiding_spot(masks, nodes):
+    """This function evaluates whether nodes are hiding spots
+
+    Inputs
+        masks    (arr) : m x 0 array of hiding spot bitmasks
+        nodes    (arr) : node value, or m x 0 array of node values in {1, ..., n_n}
+
+    Outputs
+        is_hide  (arr) : m x 0 boolean array
+    """
+    masks = np.asarray(masks)
+    nodes = np.asarray(nodes).astype(masks.dtype)                               # nodes as unsigned integers
+    return ((masks >> (nodes - masks.dtype.type(1))) & masks.dtype.type(1)).astype(bool)
+
+
+def th_consistent(masks, node_colors):
+    """This function evaluates whether hiding spot combinations are
+    consistent with the node colors, i.e. all blue nodes are hiding spots
+    and no grey node is a hiding spot
+
+    Inputs
+        masks        (arr) : m x 0 array of hiding spot bitmasks
+        node_colors  (arr) : 1 x n_n array of node colors (0: black, 1: grey, 2: blue)
+
+    Outputs
+        consistent   (arr) : m x 0 boolean array
+    """
+    masks       = np.asarray(masks)
+    node_colors = np.asarray(node_colors)
+    n_n         = node_colors.size                                              # number of nodes
+    nodes       = np.arange(1, n_n + 1)                                         # set of nodes
+    blue        = masks.dtype.type(th_nodes_mask(nodes[node_colors == 2], n_n))  # unveiled hiding spots
+    grey        = masks.dtype.type(th_nodes_mask(nodes[node_colors == 1], n_n))  # unveiled non-hiding spots
+    return ((masks & blue) == blue) & ((masks & grey) == 0)
+
+
+def th_popcount(masks):
+    """This function counts the number of set bits, i.e. nodes, per bitmask
+
+    Inputs
+        masks    (arr) : m x 0 array of bitmasks
+
+    Outputs
+        count    (arr) : m x 0 array of set bit counts
+    """
+    masks = np.asarray(masks).astype(np.uint64)
+    if hasattr(np, "bitwise_count"):                                            # numpy >= 2.0
+        return np.bitwise_count(masks)
+
+    # SWAR popcount for older numpy versions
+    x = masks - ((masks >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((x * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.uint8)
@@ -1,4 +1,4 @@
-from math import factorial as fact                                              # factorial function
+from math import comb                                                           # binomial coefficient (exact integer)
 
 
 def th_cards(theta):
@@ -24,12 +24,12 @@ def th_cards(theta):
     n_h         = theta.n_h                                                     # number of hiding spots
 
     # Cardinalities
-    n_s3        = (fact(n_n)) / (fact(n_n - n_h) * fact(n_h))                   # number of unique hiding spot combination possibilities
+    n_s3        = comb(n_n, n_h)                                                # number of unique hiding spot combination possibilities
     n_s         = n_s3 * n_h * n_n                                              # latent state space cardinality
 
     # Output
-    theta.n_s3  = int(n_s3)                                                     # number of unique hiding spots combination possibilities
-    theta.n_s   = int(n_s)                                                      # state space cardinality
+    theta.n_s3  = n_s3                                                          # number of unique hiding spots combination possibilities
+    theta.n_s   = n_s                                                           # state space cardinality
     theta.n_a   = 5                                                             # action space cardinality
     theta.n_o   = 5                                                             # observation space cardinality
     return theta
@@ -0,0 +1,164 @@
+import json                                                                     # JSON serialization
+import os                                                                       # operating system interface
+import shutil                                                                   # directory removal
+import socket                                                                   # host name
+import time                                                                     # lock polling
+import numpy as np                                                              # numpy
+from th_instrument import instrument                                            # timers, counters and progress reports
+
+
+# Default number of states per checkpointed chunk, rounded up to whole s1 blocks
+CHUNK_STATES = 2 ** 22
+
+# Seconds between attempts to take the lock of a checkpoint directory held by another process
+LOCK_POLL = 1.0
+
+
+def th_checkpoint_chunk(n_ident, chunk_states=None):
+    """This function evaluates the number of states per chunk, a multiple of
+    the number of states per s1 block
+
+    Inputs
+        n_ident       (int) : number of states per s1 block
+        chunk_states  (int) : approximate number of states per chunk, None for CHUNK_STATES
+
+    Outputs
+        chunk         (int) : number of states per chunk
+    """
+    chunk_states = CHUNK_STATES if chunk_states is None else chunk_states
+    return max(1, -(-chunk_states // n_ident)) * n_ident
+
+
+def th_checkpoint_tmp(path):
+    """This function returns a temporary file name of a path, which is unique
+    per host and process, as by th_queue.th_queue_write"""
+    return f"{path}.{socket.gethostname()}-{os.getpid()}.tmp"
+
+
+def th_checkpoint_alive(pid):
+    """This function returns True, if a process of this host is running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:                                                     # running under another user
+        return True
+    return True
+
+
+def th_checkpoint_lock(directory, wait=True):
+    """This function takes the lock of a checkpoint directory, i.e. creates
+    the lock file <directory>.lock exclusively, which succeeds for exactly
+    one process. The lock file holds the host name and process id of its
+    owner, such that the lock of a terminated process on the same host is
+    removed. Locks of processes on other hosts are not removed.
+
+    Inputs
+        directory   (str) : checkpoint directory
+        wait       (bool) : wait until the lock is released, if held by another process
+
+    Outputs
+        locked     (bool) : True, if the lock was taken, False otherwise
+    """
+    lock_path = f"{directory}.lock"
+    host      = socket.gethostname()
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(lock_path, encoding="utf8") as file:
+                    owner_host, owner_pid = file.read().split()
+                if owner_host == host and not th_checkpoint_alive(int(owner_pid)):
+                    os.remove(lock_path)                                        # lock of a terminated process
+                    continue
+            except (FileNotFoundError, ValueError):                             # released, or owner still writing
+                pass
+            if not wait:
+                return False
+            time.sleep(LOCK_POLL)
+            continue
+        with os.fdopen(fd, "w", encoding="utf8") as file:
+            file.write(f"{host} {os.getpid()}")
+        return True
+
+
+def th_checkpoint_unlock(directory):
+    """This function releases the lock of a checkpoint directory"""
+    try:
+        os.remove(f"{directory}.lock")
+    except FileNotFoundError:
+        pass
+
+
+def th_checkpoint_build(directory, n, chunk, build, name, meta=None, target=None):
+    """This function evaluates a component in chunks of items, and persists
+    each completed chunk in a checkpoint directory. An interrupted build
+    resumes from the completed chunks; checkpoints of a build with different
+    parameters are discarded. Chunk files are written atomically, such that
+    an interruption while saving leaves no partial chunk. The build holds
+    the lock of the checkpoint directory, see th_checkpoint_lock, such that
+    concurrent builds of the same component wait for each other and resume
+    from each other's chunks. If the component was saved by another process
+    while waiting for the lock, nothing is evaluated.
+
+    Inputs
+        directory   (str) : checkpoint directory, e.g. Components/<config>/<name>.chunks
+        n           (int) : number of items, e.g. states
+        chunk       (int) : number of items per chunk
+        build       (fun) : function build(start, stop) returning a dict of arrays of the items start, ..., stop - 1
+        name        (str) : progress name
+        meta       (dict) : additional build parameters stored in the manifest, e.g. the action
+        target      (str) : path of the saved component, e.g. Components/<config>/<name>.npz
+
+    Outputs
+        chunks     (list) : list of dicts of arrays, one per chunk in order, None if target exists
+    """
+    th_checkpoint_lock(directory)
+    try:
+        if target is not None and os.path.exists(target):                       # saved by another process
+            return None
+        manifest = {"n": int(n), "chunk": int(chunk), **(meta or {})}
+        manifest_path = os.path.join(directory, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf8") as file:
+                if json.load(file) != manifest:                                 # checkpoints of another build
+                    shutil.rmtree(directory)
+        if not os.path.exists(manifest_path):
+            os.makedirs(directory, exist_ok=True)
+            with open(th_checkpoint_tmp(manifest_path), "w", encoding="utf8") as file:
+                json.dump(manifest, file)
+            os.replace(th_checkpoint_tmp(manifest_path), manifest_path)
+
+        starts   = range(0, n, chunk)
+        chunks   = []
+        progress = instrument.progress(name, len(starts))                       # progress over chunks
+        for k, start in enumerate(starts):
+            path = os.path.join(directory, f"chunk-{k:06d}.npz")
+            if os.path.exists(path):                                            # completed before an interruption
+                with np.load(path) as npz:
+                    arrays = {key: npz[key] for key in npz.files}
+                instrument.count(f"{name}.resumed")
+            else:
+                arrays = build(start, min(start + chunk, n))
+                with open(th_checkpoint_tmp(path), "wb") as file:
+                    np.savez(file, **arrays)
+                os.replace(th_checkpoint_tmp(path), path)                       # atomic completion of the chunk
+            chunks.append(arrays)
+            progress.update()
+        progress.close()
+        return chunks
+    finally:
+        th_checkpoint_unlock(directory)
+
+
+def th_checkpoint_clear(directory):
+    """This function removes a checkpoint directory after the component was
+    saved. The directory is removed only if its lock is taken, otherwise
+    another process is building the component and removes it thereafter"""
+    if not th_checkpoint_lock(directory, wait=False):
+        return
+    try:
+        shutil.rmtree(directory, ignore_errors=True)
+    finally:
+        th_checkpoint_unlock(directory)
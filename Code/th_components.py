@@ -0,0 +1,195 @@
+from collections.abc import Mapping                                             # read-only dictionary interface
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed  # worker pools
+import multiprocessing                                                          # process start methods
+import os                                                                       # operating system interface
+import numpy as np                                                              # numpy
+
+
+class th_components(Mapping):
+    def __init__(self, names, build, persisted=None):
+        """This function encodes the instantiation method of the lazy
+        component container class. It behaves like the dictionary of
+        action-specific matrices returned by th_phi and th_omega, but each
+        matrix is only loaded from disk, or evaluated, on first access, such
+        that runs that never use some actions never pay for them.
+
+        Inputs
+            names   (list) : list of n_a matrix labels, keys are the indices 0, ..., n_a - 1
+            build   (func) : function mapping an action index p to the matrix of action index p
+            persisted (func) : optional function mapping an action index p to whether build(p) saves the
+                               matrix to disk, such that a second build(p) loads it, see th_components_build
+
+        Authors - Belinda Fleischmann, Dirk Ostwald
+        """
+        self.names    = names                                                   # matrix labels
+        self.build    = build                                                   # per-action matrix builder
+        self.matrices = {}                                                      # dict of matrices built or loaded so far
+        self.persisted = persisted if persisted is not None else lambda p: False  # matrices saved to disk by build
+
+    def __getitem__(self, p):
+        if p not in range(len(self.names)):
+            raise KeyError(p)
+        if p not in self.matrices:
+            self.matrices[p] = self.build(p)                                    # build or load on first access
+        return self.matrices[p]
+
+    def __iter__(self):
+        return iter(range(len(self.names)))
+
+    def __len__(self):
+        return len(self.names)
+
+    def is_loaded(self, p):
+        """This function returns whether the matrix of action index p has
+        already been built or loaded"""
+        return p in self.matrices
+
+    def unload(self, p):
+        """This function releases the matrix of action index p, which is
+        built or loaded again on next access"""
+        self.matrices.pop(p, None)
+
+    def named(self):
+        """This function returns all matrices as a dictionary keyed by their
+        labels, building or loading missing matrices"""
+        return {name: self[p] for p, name in enumerate(self.names)}
+
+
+# Containers of the running process pool, inherited by the forked workers
+pool_containers = []
+
+
+def th_components_worker(i, p):
+    """This function builds matrix p of container i in a process pool
+    worker, and returns it, unless it was saved to disk"""
+    container = pool_containers[i]
+    matrix    = container.build(p)
+    return None if container.persisted(p) else matrix
+
+
+def th_components_build(containers, workers=None, processes=False):
+    """This function builds or loads the missing matrices of several lazy
+    component containers concurrently, e.g. the five Phi and the two Omega
+    matrices. At most workers matrices are built at the same time, such that
+    the peak memory is bounded by the workers largest temporary build
+    allocations, see th_plan_workers.
+
+    On a thread pool, the builds share the process and rely on NumPy and
+    SciPy releasing the global interpreter lock in their bulk operations. On
+    a process pool, the workers are forked from the current process, such
+    that the containers and state sets are inherited rather than pickled.
+    Matrices that are saved to disk by their build are loaded from disk
+    afterwards, all other matrices are returned by the workers. Instrument
+    timers and counters of process pool workers are not collected.
+
+    Inputs
+        containers (list) : list of th_components objects, e.g. [Phi, Omega]
+        workers     (int) : maximal number of concurrent builds, None for the number of CPUs
+        processes  (bool) : build on a process pool instead of a thread pool
+
+    Outputs
+        containers (list) : list of th_components objects with all matrices loaded
+    """
+    global pool_containers
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    missing = [(i, p) for i, container in enumerate(containers) for p in container
+               if not container.is_loaded(p)]
+    if not missing:
+        return containers
+
+    if not processes:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(containers[i].build, p): (i, p) for i, p in missing}
+            for future in as_completed(futures):
+                i, p = futures[future]
+                containers[i].matrices[p] = future.result()
+        return containers
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise ValueError("Process pool builds require the fork start method, use a thread pool instead")
+    pool_containers = containers
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+            futures = {pool.submit(th_components_worker, i, p): (i, p) for i, p in missing}
+            for future in as_completed(futures):
+                i, p   = futures[future]
+                matrix = future.result()
+                if matrix is None:
+                    matrix = containers[i].build(p)                             # load from disk
+                containers[i].matrices[p] = matrix
+    finally:
+        pool_containers = []
+    return containers
+
+
+def th_toarray(x):
+    """This function converts rows or entries of component matrices to numpy
+    arrays, irrespective of their representation (sparse matrix, dense array
+    or implicit operator)
+
+    Inputs
+        x        (obj) : sparse matrix, dense array or array-like
+
+    Outputs
+        x        (arr) : numpy array
+    """
+    return x.toarray() if hasattr(x, "toarray") else np.asarray(x)
+
+
+def th_density(x, resolution=512, chunk=2 ** 22):
+    """This function bins the nonzero entries of a component matrix into a
+    density image of fixed resolution directly from its index arrays, i.e.
+    without densifying the matrix. Rows and columns are binned uniformly,
+    and each pixel holds the number of nonzero entries of its bin. Sparse
+    matrices are processed in chunks of columns, dense arrays in chunks of
+    rows, implicit operators from their target or label arrays.
+
+    Inputs
+        x          (obj) : n x m sparse matrix, dense array or implicit operator (th_phi_operator,
+                           th_omega_table)
+        resolution (int) : maximal number of row and column bins
+        chunk      (int) : approximate number of entries per chunk
+
+    Outputs
+        image      (arr) : min(n, resolution) x min(m, resolution) int64 array of nonzero counts per bin
+    """
+    n, m     = x.shape
+    n_r, n_c = min(n, resolution), min(m, resolution)                           # number of row and column bins
+    image    = np.zeros(n_r * n_c, dtype=np.int64)
+
+    def add(rows, cols):
+        """Accumulate entries into the image"""
+        bins = (rows * n_r // n) * n_c + cols * n_c // m                        # pixel index per entry
+        image[:] += np.bincount(bins, minlength=n_r * n_c)
+
+    if hasattr(x, "target"):                                                    # implicit transition operator, one entry per row
+        for start in range(0, n, chunk):
+            stop = min(start + chunk, n)
+            add(np.arange(start, stop, dtype=np.int64), x.target[start:stop].astype(np.int64))
+    elif hasattr(x, "labels"):                                                  # state class observation matrix
+        counts = np.zeros((x.table.shape[0], n_r), dtype=np.int64)              # number of states per class and row bin
+        for start in range(0, n, chunk):
+            labels = x.labels[start:start + chunk]
+            for c in range(x.table.shape[0]):
+                counts[c] += np.bincount((np.flatnonzero(labels == c) + start) * n_r // n, minlength=n_r)
+        pixels = image.reshape(n_r, n_c)
+        for c, col in zip(*np.nonzero(x.table)):                                # nonzero observation probabilities per class
+            pixels[:, col * n_c // m] += counts[c]
+    elif isinstance(x, np.ndarray):                                             # dense array
+        step = max(1, chunk // max(m, 1))
+        for start in range(0, n, step):
+            rows, cols = np.nonzero(x[start:start + step])
+            add(rows.astype(np.int64) + start, cols.astype(np.int64))
+    else:                                                                       # sparse matrix
+        x      = x.tocsc()
+        indptr = x.indptr
+        start  = 0
+        while start < m:
+            stop = int(np.searchsorted(indptr, indptr[start] + chunk, side="right")) - 1
+            stop = min(max(stop, start + 1), m)                                 # at least one column per chunk
+            rows = x.indices[indptr[start]:indptr[stop]].astype(np.int64)
+            cols = np.repeat(np.arange(start, stop, dtype=np.int64), np.diff(indptr[start:stop + 1]))
+            keep = x.data[indptr[start]:indptr[stop]] != 0                      # explicitly stored zeros
+            add(rows[keep], cols[keep])
+            start = stop
+    return image.reshape(n_r, n_c)
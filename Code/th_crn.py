@@ -0,0 +1,108 @@
+"""
+This module evaluates several agents on common random numbers. For each
+game, the task's random start states, i.e. the game start state and the
+hiding spot rankings of subsequent rounds, are drawn once from a generator
+seeded with the game's seed, see th_task.th_task_starts, and replayed to
+the task of each agent. Each agent's decisions are drawn from its own
+generator seeded with the game's seed, such that the global generator and
+seeds set by the caller are left untouched. All agents thus face the same
+games, and differences between agents are evaluated per game, which removes
+the between-game variance from agent comparisons. The task components are
+built or loaded once and shared by all agents and games.
+
+Authors - Belinda Fleischmann, Dirk Ostwald
+"""
+import copy as cp                                                               # shallow copies of initialization structures
+import numpy as np                                                              # numpy
+import pandas as pd                                                             # pandas
+from th_sim_game import th_sim_game                                             # game simulation routine
+from th_task import th_task_starts                                              # start states drawn beforehand
+
+
+def th_crn(sim, a_inits, n_games, seed=0):
+    """This function simulates n_games games for each of several agents on
+    common random numbers
+
+    Inputs
+        sim          (obj) : simulation structure, see th_sim_game, without .a_init
+        a_inits     (list) : list of agent initialization structures with distinct .a_name
+        n_games      (int) : number of games
+        seed         (int) : seed of the first game, game g is seeded with seed + g - 1
+
+    Outputs
+        data          (df) : concatenated behavioral data of all agents and games with additional column
+            game     (int) : game index
+    """
+    names = [a_init.a_name for a_init in a_inits]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Agent labels {names} are not distinct")
+
+    datas = []
+    for g in range(1, n_games + 1):
+        t_init        = cp.copy(sim.t_init)                                     # components are shared
+        t_init.rng    = np.random.RandomState(seed + g - 1)
+        t_init.starts = th_task_starts(t_init)                                  # common start states, drawn once per game
+        for a_init in a_inits:
+            run            = cp.copy(sim)
+            run.g          = g                                                  # game index
+            run.t_init     = t_init
+            run.a_init     = cp.copy(a_init)
+            run.a_init.rng = np.random.RandomState(seed + g - 1)                # common decision random numbers
+            data           = th_sim_game(run).data
+            data.insert(1, "game", g)
+            datas.append(data)
+    return pd.concat(datas, ignore_index=True)
+
+
+def th_crn_scores(data):
+    """This function evaluates the scores of each agent and game
+
+    Inputs
+        data          (df) : behavioral data, see th_crn
+
+    Outputs
+        scores        (df) : data frame with one row per agent and game and columns
+            agent    (str) : agent label
+            game     (int) : game index
+            rewards  (int) : number of treasures found
+            actions  (int) : number of actions
+    """
+    rewards = (data["r_t"].astype(float) == 1)
+    actions = data["a_t"].notna()
+    return (pd.DataFrame({"agent": data["agent"], "game": data["game"],
+                          "rewards": rewards.astype(int), "actions": actions.astype(int)})
+            .groupby(["agent", "game"], sort=False, as_index=False).sum())
+
+
+def th_crn_compare(scores, metric="rewards", reference=None):
+    """This function compares each agent with a reference agent by the mean
+    per-game score difference. The standard error of the paired differences
+    is reported along with the standard error of independent samples, whose
+    squared ratio is the factor of games saved by common random numbers.
+
+    Inputs
+        scores        (df) : scores, see th_crn_scores
+        metric       (str) : score column
+        reference    (str) : reference agent label, None for the first agent
+
+    Outputs
+        compare       (df) : data frame with one row per agent other than the reference and columns
+            agent    (str) : agent label
+            mean     (flt) : mean score difference agent - reference
+            se       (flt) : standard error of the paired differences
+            se_independent (flt) : standard error, if the agents were evaluated on independent games
+            games_factor   (flt) : (se_independent / se) ** 2
+    """
+    table     = scores.pivot(index="game", columns="agent", values=metric)
+    reference = scores["agent"].iloc[0] if reference is None else reference
+    n         = len(table)
+    rows      = []
+    for agent in scores["agent"].unique():
+        if agent == reference:
+            continue
+        diff           = table[agent] - table[reference]
+        se             = diff.std(ddof=1) / np.sqrt(n)
+        se_independent = np.sqrt((table[agent].var(ddof=1) + table[reference].var(ddof=1)) / n)
+        rows.append({"agent": agent, "mean": diff.mean(), "se": se, "se_independent": se_independent,
+                     "games_factor": (se_independent / se) ** 2 if se > 0 else np.inf})
+    return pd.DataFrame(rows, columns=["agent", "mean", "se", "se_independent", "games_factor"])
@@ -0,0 +1,276 @@
+import io                                                                       # in-memory streams
+import os                                                                       # operating system interface
+import re                                                                       # regular expressions
+import numpy as np                                                              # numpy
+import pandas as pd                                                             # pandas
+
+
+# Array-valued columns of the behavioral data, written as numpy array strings, e.g. "[ 8 13 14]"
+ARRAY_COLUMNS = ["s3_t", "o_t", "v_t", "marg_s1_b_t", "marg_s2_b_t", "marg_s3_b_t", "node_colors"]
+
+
+def th_parse_arrays(strings):
+    """This function parses a column of numpy array strings. All array
+    strings of the column are joined and parsed in a single call and split by
+    their element counts, such that no per-row parsing in Python is required.
+    Columns without decimal points, exponents and nan values are parsed as
+    integer arrays.
+
+    Inputs
+        strings  (ser) : series of array strings, or other values (e.g. nan)
+
+    Outputs
+        arrays   (ser) : object series of 1-dim arrays, other values unchanged
+    """
+    strings = pd.Series(strings, dtype=object)
+    arrays  = strings.copy()
+    is_arr  = strings.map(lambda v: isinstance(v, str) and v.startswith("[")).to_numpy(dtype=bool)
+    if not is_arr.any():
+        return arrays
+
+    bodies = strings[is_arr].str.slice(1, -1)                                   # strip brackets
+    counts = bodies.str.split().str.len().to_numpy()                            # number of elements per array
+    joined = " ".join(bodies)
+    dtype  = float if any(c in joined for c in ".eEn") else int                 # integer arrays, if possible
+    values = np.array(joined.split(), dtype=float).astype(dtype)
+    arrays[is_arr] = pd.Series(np.split(values, np.cumsum(counts)[:-1]),
+                               index=bodies.index, dtype=object)
+    return arrays
+
+
+def th_read_beh(path):
+    """This function reads a behavioral data file written by th_sim and parses
+    the array-valued columns
+
+    Inputs
+        path     (str) : path to sub-<label>_beh.tsv file
+
+    Outputs
+        data     (df)  : behavioral data frame, see th_sim_game
+    """
+    data = pd.read_csv(path, sep="\t", dtype={c: object for c in ARRAY_COLUMNS})
+    for column in ARRAY_COLUMNS:
+        if column in data:
+            data[column] = th_parse_arrays(data[column])
+    return data
+
+
+# Name of the binary sidecar file caching the parsed data of a configuration directory
+CACHE_NAME = ".th_beh_cache.npz"
+
+
+def th_data_scan(data_dir="Data"):
+    """This function scans a Data directory for behavioral data files, i.e.
+    Data/<label>_dim-<d>_hide-<n_h>/sub-*/beh/sub-*_beh.tsv, without reading
+    them
+
+    Inputs
+        data_dir  (str) : path to Data directory
+
+    Outputs
+        files      (df) : data frame with one row per file and columns
+            config  (str) : configuration directory name
+            label   (str) : output directory label
+            d       (int) : dimensionality of the square grid world
+            n_h     (int) : number of hiding spots
+            subject (str) : subject directory name sub-<label>
+            path    (str) : path to the behavioral data file
+            mtime   (int) : modification time in nanoseconds
+            size    (int) : file size in bytes
+    """
+    records = []
+    for config in sorted(os.listdir(data_dir)) if os.path.isdir(data_dir) else []:
+        match = re.fullmatch(r"(.*)_dim-(\d+)_hide-(\d+)", config)
+        if match is None:
+            continue
+        with os.scandir(os.path.join(data_dir, config)) as entries:
+            subjects = sorted(e.name for e in entries if e.name.startswith("sub-") and e.is_dir())
+        for subject in subjects:
+            path = os.path.join(data_dir, config, subject, "beh", f"{subject}_beh.tsv")
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            records.append((config, match.group(1), int(match.group(2)), int(match.group(3)),
+                            subject, path, stat.st_mtime_ns, stat.st_size))
+    return pd.DataFrame(records, columns=["config", "label", "d", "n_h", "subject", "path", "mtime", "size"])
+
+
+def th_data_parse(paths):
+    """This function reads and parses behavioral data files in one pass.
+    The files' records are concatenated and read with a single parser call,
+    and each array-valued column is parsed at once for all files.
+
+    Inputs
+        paths    (list) : list of paths to behavioral data files with equal columns
+
+    Outputs
+        data       (df) : concatenated behavioral data
+        n_rows    (arr) : number of rows of each file
+    """
+    header, bodies, n_rows = None, [], []
+    for path in paths:
+        with open(path, encoding="utf8") as file:
+            text = file.read()
+        first, body = text.split("\n", 1)
+        if header is None:
+            header = first
+        elif first != header:
+            raise ValueError(f"Columns of {path} differ from {paths[0]}")
+        if body and not body.endswith("\n"):
+            body += "\n"
+        bodies.append(body)
+        n_rows.append(sum(part.count("\n") for part in body.split('"')[::2]))  # record ends outside of quoted fields
+    if header is None:
+        return pd.DataFrame(), np.zeros(0, dtype=int)
+
+    data = pd.read_csv(io.StringIO(header + "\n" + "".join(bodies)), sep="\t",
+                       dtype={c: object for c in ARRAY_COLUMNS})
+    for column in ARRAY_COLUMNS:
+        if column in data:
+            data[column] = th_parse_arrays(data[column])
+    return data, np.array(n_rows, dtype=int)
+
+
+def th_data_encode(data):
+    """This function encodes behavioral data as a dict of numeric and string
+    arrays, array-valued columns as flat values and element counts (-1 for
+    missing arrays), for saving without pickling"""
+    arrays = {"columns": np.array(data.columns, dtype=str)}
+    for column in data.columns:
+        values = data[column].to_numpy()
+        if column in ARRAY_COLUMNS:
+            counts = np.array([len(v) if np.ndim(v) else -1 for v in values], dtype=np.int64)
+            parts  = [v for v in values if np.ndim(v)]
+            flat   = np.concatenate(parts) if parts else np.zeros(0)
+            arrays[f"{column}.values"] = flat
+            arrays[f"{column}.counts"] = counts
+        elif values.dtype == object:
+            arrays[column] = values.astype(str)
+        else:
+            arrays[column] = values
+    return arrays
+
+
+def th_data_decode(arrays):
+    """This function decodes behavioral data encoded by th_data_encode"""
+    data = {}
+    for column in arrays["columns"]:
+        if f"{column}.counts" in arrays:
+            counts  = arrays[f"{column}.counts"]
+            present = counts >= 0
+            parts   = np.split(arrays[f"{column}.values"], np.cumsum(counts[present])[:-1]) if present.any() else []
+            values  = np.full(len(counts), np.nan, dtype=object)
+            for i, part in zip(np.flatnonzero(present), parts):                 # element-wise, equal lengths must not broadcast
+                values[i] = part
+            data[column] = values
+        else:
+            data[column] = arrays[column]
+    return pd.DataFrame(data)
+
+
+def th_data_load_config(files, cache=True):
+    """This function loads the behavioral data files of one configuration
+    directory. Parsed data are cached in a binary sidecar file in the
+    configuration directory; files whose modification time or size changed
+    since caching, and new files, are parsed again, and the sidecar is
+    rewritten.
+
+    Inputs
+        files      (df) : files of one configuration, see th_data_scan
+        cache    (bool) : use and update the sidecar file
+
+    Outputs
+        data       (df) : concatenated behavioral data
+        n_rows    (arr) : number of rows of each file
+    """
+    config_dir = os.path.dirname(os.path.dirname(os.path.dirname(files["path"].iloc[0])))
+    cache_path = os.path.join(config_dir, CACHE_NAME)
+    subjects   = files["subject"].to_numpy(dtype=str)
+    stamps     = files[["mtime", "size"]].to_numpy(dtype=np.int64)
+
+    cached = None
+    if cache and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as npz:
+                cached = {key: npz[key] for key in npz.files}
+        except (OSError, ValueError):                                           # unreadable sidecar, parse again
+            cached = None
+
+    # Match files to cached files by subject and stamp (modification time and size)
+    in_cache = np.full(len(files), -1)                                          # position in the sidecar, -1 for changed or new files
+    if cached is not None:
+        position = {s: j for j, s in enumerate(cached["index.subjects"])}
+        for i, subject in enumerate(subjects):
+            j = position.get(subject, -1)
+            if j >= 0 and np.array_equal(cached["index.stamps"][j], stamps[i]):
+                in_cache[i] = j
+    changed   = np.flatnonzero(in_cache < 0)
+    unchanged = (cached is not None and len(changed) == 0
+                 and np.array_equal(in_cache, np.arange(len(cached["index.subjects"]))))
+
+    # Reuse the cached rows of unchanged files, parse changed and new files
+    frames, offset = [], 0
+    starts, n_rows = np.zeros(len(files), dtype=int), np.zeros(len(files), dtype=int)
+    if (in_cache >= 0).any():
+        frames.append(th_data_decode({k: v for k, v in cached.items() if not k.startswith("index.")}))
+        hit          = in_cache >= 0
+        cached_start = np.concatenate([[0], np.cumsum(cached["index.rows"])])
+        starts[hit]  = cached_start[in_cache[hit]]
+        n_rows[hit]  = cached["index.rows"][in_cache[hit]]
+        offset       = len(frames[0])
+    if len(changed):
+        parsed, parsed_rows = th_data_parse(files["path"].iloc[changed].tolist())
+        frames.append(parsed)
+        starts[changed] = offset + np.concatenate([[0], np.cumsum(parsed_rows)[:-1]])
+        n_rows[changed] = parsed_rows
+
+    data = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if not unchanged:                                                           # rows in file order
+        first = np.concatenate([[0], np.cumsum(n_rows)[:-1]])
+        take  = np.repeat(starts - first, n_rows) + np.arange(n_rows.sum())
+        data  = data.take(take).reset_index(drop=True)
+
+    if cache and not unchanged:
+        arrays = th_data_encode(data)
+        arrays.update({"index.subjects": subjects, "index.stamps": stamps, "index.rows": n_rows})
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, cache_path)                                        # atomic replacement
+    return data, n_rows
+
+
+def th_data_load(data_dir="Data", cache=True):
+    """This function loads all behavioral data files of a Data directory.
+    The directory tree is scanned once, each configuration directory is
+    loaded from its sidecar cache, parsing only changed files, and an index
+    of all subjects is returned along with the concatenated data.
+
+    Inputs
+        data_dir  (str) : path to Data directory
+        cache    (bool) : use and update the sidecar files
+
+    Outputs
+        data       (df) : concatenated behavioral data of all subjects with additional columns
+            config  (str) : configuration directory name
+            subject (str) : subject directory name
+        index      (df) : data frame with one row per subject, see th_data_scan, and additional columns
+            agent   (str) : agent label
+            rows    (int) : number of data rows
+            start   (int) : index of the subject's first row in data
+    """
+    files = th_data_scan(data_dir)
+    datas, rows = [], []
+    for config, config_files in files.groupby("config", sort=False):
+        data, n_rows = th_data_load_config(config_files, cache)
+        data.insert(0, "subject", np.repeat(config_files["subject"].to_numpy(), n_rows))
+        data.insert(0, "config", config)
+        datas.append(data)
+        rows.append(n_rows)
+
+    data  = pd.concat(datas, ignore_index=True) if datas else pd.DataFrame()
+    index = files.copy()
+    index["rows"]  = np.concatenate(rows) if rows else np.zeros(0, dtype=int)
+    index["start"] = np.concatenate([[0], np.cumsum(index["rows"])[:-1]]).astype(int) if len(index) else []
+    index["agent"] = data["agent"].to_numpy()[index["start"]] if len(index) and "agent" in data else None
+    return data, index
@@ -0,0 +1,142 @@
+"""
+This Python script renders the agent behavior figures of all simulated
+subjects found under a Data directory, i.e. of all
+Data/<label>_dim-<d>_hide-<n_h>/sub-*/beh/sub-*_beh.tsv files, across a
+process pool. Each worker process reuses one figure layout per task
+configuration, with one trial column per data row, see th_behavior_renderer. Figures are
+written to Figures/<label>_dim-<d>_hide-<n_h>/.
+
+Usage (from the repository root)
+    python Code/th_export.py [--data Data] [--figures Figures] [--format png] [--workers 4]
+
+Authors - Belinda Fleischmann, Dirk Ostwald
+"""
+import argparse                                                                 # command line arguments
+import glob                                                                     # path name patterns
+import os                                                                       # operating system interface
+import re                                                                       # regular expressions
+import time                                                                     # wall time
+from concurrent.futures import ProcessPoolExecutor                              # process pool
+from functools import partial                                                   # partial function application
+from th_structure import th_structure                                           # structures
+from th_data import th_read_beh                                                 # behavioral data reader
+from th_helper import humanreadable_time                                        # time formatting
+
+
+# Renderers of this worker process, keyed by (d, n_h, number of data rows, usetex)
+renderers = {}
+
+
+def th_export_scan(data_dir):
+    """This function finds all behavioral data files under a Data directory
+
+    Inputs
+        data_dir  (str) : path to Data directory
+
+    Outputs
+        jobs     (list) : list of dicts with fields
+            path    (str) : path to behavioral data file
+            config  (str) : configuration directory name <label>_dim-<d>_hide-<n_h>
+            subject (str) : subject directory name sub-<label>
+            d       (int) : dimensionality of the square grid world
+            n_h     (int) : number of hiding spots
+    """
+    jobs = []
+    pattern = os.path.join(data_dir, "*_dim-*_hide-*", "sub-*", "beh", "sub-*_beh.tsv")
+    for path in sorted(glob.glob(pattern)):
+        subject_dir = os.path.dirname(os.path.dirname(path))
+        config      = os.path.basename(os.path.dirname(subject_dir))
+        match       = re.fullmatch(r".*dim-(\d+)_hide-(\d+)", config)
+        jobs.append({"path": path, "config": config, "subject": os.path.basename(subject_dir),
+                     "d": int(match.group(1)), "n_h": int(match.group(2))})
+    return jobs
+
+
+def th_export_figure(job, figures_dir, fig_format, usetex):
+    """This function renders the behavior figure of one subject, reusing
+    the renderer of the worker process for equal configurations
+
+    Inputs
+        job        (dict) : job, see th_export_scan
+        figures_dir (str) : path to Figures directory
+        fig_format  (str) : figure file format
+        usetex     (bool) : render labels with LaTeX
+
+    Outputs
+        fig_path    (str) : path to the figure file
+    """
+    from th_imshow import th_behavior_renderer                                  # plotting only in worker processes
+
+    beh_data = th_read_beh(job["path"])
+    n_rows   = len(beh_data)                                                    # equal for all games of a simulation
+    key      = (job["d"], job["n_h"], n_rows, usetex)
+    if key not in renderers:
+        theta        = th_structure()
+        theta.d      = job["d"]
+        theta.n_n    = job["d"] ** 2
+        theta.n_h    = job["n_h"]
+        renderers[key] = th_behavior_renderer(theta, n_rows, agg=True, usetex=usetex)
+    renderer = renderers[key]
+
+    fig_dir = os.path.join(figures_dir, job["config"])
+    os.makedirs(fig_dir, exist_ok=True)
+    fig_fn  = (
+        f"{job['subject']}"
+        f"_agent-{beh_data['agent'].iloc[0]}"
+        f"_{renderer.theta.n_n}-nodes"
+        f"_{renderer.theta.n_h}-hides"
+    )
+    renderer.render(beh_data, fig_path=os.path.join(fig_dir, fig_fn), fig_format=fig_format)
+    return os.path.join(fig_dir, f"{fig_fn}.{fig_format}")
+
+
+def th_export_chunk(jobs, figures_dir, fig_format, usetex):
+    """This function renders the behavior figures of a chunk of subjects"""
+    return [th_export_figure(job, figures_dir, fig_format, usetex) for job in jobs]
+
+
+def th_export(data_dir="Data", figures_dir="Figures", fig_format="png", n_workers=None,
+              usetex=False, chunk_size=32):
+    """This function renders the behavior figures of all subjects under a
+    Data directory across a process pool. Jobs are sorted by configuration
+    and sent in chunks, such that workers reuse their figure layouts.
+
+    Inputs
+        data_dir    (str) : path to Data directory
+        figures_dir (str) : path to Figures directory
+        fig_format  (str) : figure file format, png is blitted, vector formats are fully drawn
+        n_workers   (int) : number of worker processes, None for the number of CPUs, 0 for no pool
+        usetex     (bool) : render labels with LaTeX
+        chunk_size  (int) : number of subjects per chunk
+
+    Outputs
+        fig_paths  (list) : paths to the figure files
+    """
+    jobs   = th_export_scan(data_dir)
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    if n_workers == 0:
+        results = [th_export_chunk(chunk, figures_dir, fig_format, usetex) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(partial(
+                th_export_chunk, figures_dir=figures_dir, fig_format=fig_format, usetex=usetex), chunks))
+    return [fig_path for chunk in results for fig_path in chunk]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render behavior figures of all subjects under a Data directory")
+    parser.add_argument("--data", default="Data", help="Data directory")
+    parser.add_argument("--figures", default="Figures", help="Figures directory")
+    parser.add_argument("--format", default="png", help="figure file format")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes, 0 for no pool")
+    parser.add_argument("--usetex", action="store_true", help="render labels with LaTeX")
+    args = parser.parse_args()
+
+    start     = time.perf_counter()
+    fig_paths = th_export(args.data, args.figures, args.format, args.workers, args.usetex)
+    print(f"{len(fig_paths)} figures written to {args.figures} in "
+          f"{humanreadable_time(time.perf_counter() - start)}")
+
+
+if __name__ == "__main__":
+    main()
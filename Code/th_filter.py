@@ -0,0 +1,461 @@
+import os
+import shutil                                                                   # file operations
+import tempfile                                                                 # temporary directories
+import weakref                                                                  # cleanup of temporary directories
+import numpy as np                                                              # numpy
+import scipy.sparse as sp                                                       # sparse matrices
+from th_components import th_components, th_toarray                             # lazy per-action component container
+from th_phi import matrix_names as phi_names                                    # Phi matrix labels
+from th_bitmask import th_s3_masks                                              # hiding spot bitmasks
+from th_belief import th_carry_s3                                               # belief carry-over between rounds
+
+
+def th_filter_operators(A, O, Phi, Omega, paths):
+    """This function returns the observation-weighted state-state transition
+    operators of the Bayes filter, i.e. for action A[p] and observation O[m]
+
+        F[p * n_o + m] = diag(Omega_a[:, m]) * Phi[p].T
+
+    such that the unnormalized posterior after action A[p] and observation
+    O[m] is F[p * n_o + m] @ b for the prior b. The operators are returned
+    as a lazy container, i.e. F[k] is loaded from disk, or evaluated and
+    saved to disk, on first access only. Combinations of actions and
+    observations with zero likelihood for all states are not saved, and
+    F[k] is None for these.
+
+    Inputs:
+        A        (arr) : n_a x 0 action set array
+        O        (arr) : n_o x 2 array of observation values
+        Phi      (obj) : th_components object of n_a state-state transition matrices
+        Omega    (obj) : th_components object of 2 observation matrices
+        paths    (obj) : paths object storing directory path variables
+
+    Outputs:
+        F        (obj) : th_components object with n_a * n_o entries of n_s x n_s sparse arrays, or None
+
+    Saves to disk, if not existing and not all zero
+        Filter_<action label>_o-<m>.npz : n_s x n_s csr array
+    """
+    n_o   = O.shape[0]                                                          # observation space cardinality
+    names = [f"{name.replace('Phi', 'Filter')}_o-{m}" for name in phi_names for m in range(n_o)]
+
+    def build(k):
+        p, m = divmod(k, n_o)                                                   # action index and observation index
+        path = os.path.join(paths.components, f"{names[k]}.npz")
+        if os.path.exists(path):
+            return sp.load_npz(path)
+
+        i_a        = 0 if A[p] == 0 else 1                                      # compressed action index (drill/step)
+        likelihood = th_toarray(Omega[i_a][:, m]).ravel()                       # observation likelihood of all states
+        if not np.any(likelihood):                                              # impossible observation after this action
+            return None
+        Phi_p = Phi[p]
+        Phi_p = Phi_p.tocsc() if hasattr(Phi_p, "tocsc") else sp.csc_matrix(Phi_p)
+        D     = sp.diags_array(likelihood.astype(np.int8), dtype=np.int8)       # int8 observation likelihood diagonal
+        F_k   = sp.csr_matrix(D @ Phi_p.T)                                      # observation-weighted transposed transition
+        F_k.eliminate_zeros()
+        paths.save_arrays(sparse=True, file_name=names[k], array=F_k)
+        return F_k
+
+    return th_components(names=names, build=build)
+
+
+def th_carry_structures(b):
+    """This function evaluates the hypotheses (s2, s3) of an s1 block of S,
+    their hiding spot bitmasks and bitmask order for th_carry_s3 once per
+    filter object"""
+    if b.carry is None:
+        H       = b.S[:b.n_ident, 1:]                                           # hypotheses are equal across s1 blocks
+        M       = th_s3_masks(H[:, 1:], b.theta.n_n)
+        b.carry = (H, M, np.argsort(M, kind="stable"))
+    return b.carry
+
+
+class th_filter:
+    def __init__(self, theta, S, O, A, Omega, F):
+        """This function encodes the instantiation method of the treasure hunt
+        full-state Bayes filter class. The belief state is a distribution over
+        all n_s states. After an action, it is updated with a single sparse
+        matrix-vector product with the cached observation-weighted transition
+        operator of the action and the observation, see th_filter_operators,
+        and a normalization. It exposes the update and marginal belief
+        interface of th_belief.
+
+        Inputs
+            theta      (obj) : task parameter structure with required fields
+                .n_n   (int) : number of nodes
+                .n_h   (int) : number of hiding spots
+                .n_s   (int) : state space cardinality
+            S          (arr) : n_s x (2 + n_h) array of state values
+            O          (arr) : n_o x 2 array of observation values
+            A          (arr) : n_a x 0 action set array
+            Omega      (obj) : th_components object of 2 observation matrices
+            F          (obj) : th_components object of observation-weighted transition operators
+
+        Authors - Belinda Fleischmann, Dirk Ostwald
+        """
+        # Structural components
+        self.theta   = theta                                                    # task parameters
+        self.S       = S                                                        # state set
+        self.O       = O                                                        # observation set
+        self.A       = A                                                        # action set
+        self.Omega   = Omega                                                    # action-dependent and state-conditional observation probability distribution
+        self.F       = F                                                        # observation-weighted transition operators
+        self.n_ident = theta.n_s // theta.n_n                                   # number of states per s1 block
+        self.carry   = None                                                     # hypotheses, bitmasks and bitmask order, evaluated on first new round
+
+        # Dynamic components
+        self.b       = None                                                     # n_s x 0 belief state, None before the first observation
+        self.fresh   = True                                                     # next observation is the first of a round, without preceding transition
+
+    @property
+    def n_live(self):
+        """Number of states with nonzero probability"""
+        return 0 if self.b is None else int(np.count_nonzero(self.b))
+
+    def update(self, s1, a, o):
+        """This function evaluates the posterior belief state after action a
+        and observation o. The first observation of a round is made on the
+        current position s1 without preceding state transition, and updates
+        the prior over the states with current position s1, which is uniform
+        in the first round.
+
+        Inputs
+            self       (obj) : filter object
+            s1         (int) : current position
+            a          (int) : action in trial t
+            o          (arr) : 1 x 2 array of observation values
+
+        Outputs
+            self       (obj) : filter object with updated attribute
+                .b     (arr) : n_s x 0 belief state
+        """
+        i_o = int(np.flatnonzero(np.all(self.O == o, axis=1))[0])               # observation index
+
+        if self.fresh:                                                          # first observation of a round on the current position
+            i_a        = 0 if a == 0 else 1                                     # compressed action index (drill/step)
+            block      = slice((int(s1) - 1) * self.n_ident, int(s1) * self.n_ident)
+            prior      = 1 if self.b is None else self.b[block]                 # uniform prior in the first round
+            posterior  = np.zeros(self.theta.n_s)
+            posterior[block] = prior * th_toarray(self.Omega[i_a][block, i_o]).ravel()
+            self.fresh = False
+        else:
+            p   = int(np.flatnonzero(self.A == a)[0])                           # action index
+            F_k = self.F[p * self.O.shape[0] + i_o]
+            posterior = F_k @ self.b if F_k is not None else np.zeros(self.theta.n_s)
+
+        total = posterior.sum()
+        if total == 0:
+            raise ValueError(
+                f"Observation {o} after action {a} on node {s1} is inconsistent with the belief state")
+        self.b = posterior / total                                              # normalized posterior
+
+    def new_round(self, s1):
+        """This function carries the belief state over to a new round, in
+        which the treasure is hidden again among the hiding spots other than
+        the current position s1, see th_carry_s3. The belief over the
+        hypotheses (s2, s3) is marginalized over the s1 blocks of S, as the
+        last action of a round may not be followed by an observation, and
+        carried over to the s1 block of the current position.
+
+        Inputs
+            self       (obj) : filter object
+            s1         (int) : current position
+
+        Outputs
+            self       (obj) : filter object with updated attribute
+                .b     (arr) : n_s x 0 belief state
+        """
+        start  = (int(s1) - 1) * self.n_ident
+        b_h    = self.b.reshape(self.theta.n_n, self.n_ident).sum(axis=0)       # belief over hypotheses, states are sorted by s1
+        i_h    = np.flatnonzero(b_h)                                            # live hypotheses
+        i_h, p = th_carry_s3(*th_carry_structures(self), i_h, b_h[i_h], s1, self.theta.n_h)
+        self.b = np.zeros(self.theta.n_s)
+        self.b[start + i_h] = p
+        self.fresh = True
+
+    def marg_s1(self):
+        """This function evaluates the marginal belief over the current
+        position s1
+
+        Outputs
+            marg   (arr) : 1 x n_n array of current position probabilities
+        """
+        return self.b.reshape(self.theta.n_n, self.n_ident).sum(axis=1)         # states are sorted by s1
+
+    def marg_s2(self):
+        """This function evaluates the marginal belief over the treasure
+        location s2
+
+        Outputs
+            marg   (arr) : 1 x n_n array of treasure location probabilities
+        """
+        return np.bincount(
+            self.S[:, 1] - 1, weights=self.b,
+            minlength=self.theta.n_n)
+
+    def marg_s3(self):
+        """This function evaluates the marginal probabilities of each node
+        being a hiding spot
+
+        Outputs
+            marg   (arr) : 1 x n_n array of hiding spot probabilities
+        """
+        return np.bincount(
+            self.S[:, 2:].ravel() - 1,
+            weights=np.repeat(self.b, self.theta.n_h),
+            minlength=self.theta.n_n)
+
+    def sample(self, n, rng):
+        """This function samples hypotheses from the belief state, whose
+        probability mass is on the states of the current position
+
+        Inputs
+            n          (int) : number of samples
+            rng        (obj) : np.random.Generator object
+
+        Outputs
+            h          (arr) : n x (1 + n_h) array of hypothesis values (s2, s3)
+        """
+        live = np.flatnonzero(self.b)                                           # states with nonzero probability
+        return self.S[rng.choice(live, size=n, p=self.b[live] / self.b[live].sum()), 1:]
+
+
+class th_filter_memmap:
+    def __init__(self, theta, S, O, A, Phi, Omega, directory=None, chunk_bytes=2 ** 26):
+        """This function encodes the instantiation method of the out-of-core
+        full-state Bayes filter class. The belief state over all n_s states
+        is stored in a memory-mapped file, and updates stream through it in
+        chunks of whole s1 blocks of S: each chunk of the prior is read once,
+        moved to its target states with Phi, weighted with the observation
+        likelihood, and accumulated into a second memory-mapped file, which
+        becomes the belief state. Since Phi maps each s1 block onto a single
+        s1 block, reads and writes are contiguous. The normalization constant
+        is kept separately and applied while reading, such that each update
+        is a single pass. It exposes the update and marginal belief interface
+        of th_belief. A temporary directory of the belief files is removed by
+        close, on exit of a with statement, or when the filter object is
+        garbage collected.
+
+        Inputs
+            theta       (obj) : task parameter structure with required fields
+                .n_n    (int) : number of nodes
+                .n_h    (int) : number of hiding spots
+                .n_s    (int) : state space cardinality
+            S           (arr) : n_s x (2 + n_h) array of state values
+            O           (arr) : n_o x 2 array of observation values
+            A           (arr) : n_a x 0 action set array
+            Phi         (obj) : th_components object of n_a state-state transition matrices
+            Omega       (obj) : th_components object of 2 observation matrices
+            directory   (str) : directory of the belief files, None for a temporary directory
+            chunk_bytes (int) : approximate size of a belief chunk in bytes
+
+        Authors - Belinda Fleischmann, Dirk Ostwald
+        """
+        # Structural components
+        self.theta    = theta                                                   # task parameters
+        self.S        = S                                                       # state set
+        self.O        = O                                                       # observation set
+        self.A        = A                                                       # action set
+        self.Phi      = Phi                                                     # action-dependent state-state transition probability
+        self.Omega    = Omega                                                   # action-dependent and state-conditional observation probability distribution
+        self.n_ident  = theta.n_s // theta.n_n                                  # number of states per s1 block
+        self.chunk    = max(1, chunk_bytes // (8 * self.n_ident)) * self.n_ident  # chunk size in states, whole s1 blocks
+        self.carry    = None                                                    # hypotheses, bitmasks and bitmask order, evaluated on first new round
+        self.tmp_dir  = tempfile.mkdtemp(prefix="th_belief_") if directory is None else None
+        self.cleanup  = (weakref.finalize(self, shutil.rmtree, self.tmp_dir, ignore_errors=True)
+                         if self.tmp_dir is not None else None)                 # removal of the temporary directory
+        directory     = self.tmp_dir if directory is None else directory
+        os.makedirs(directory, exist_ok=True)
+        self.files    = [np.memmap(os.path.join(directory, f"belief_{i}.dat"), dtype=np.float64,
+                                   mode="w+", shape=(theta.n_s,)) for i in range(2)]
+
+        # Dynamic components
+        self.cur      = 0                                                       # index of the file holding the belief state
+        self.total    = None                                                    # normalization constant, None before the first observation
+        self.fresh    = True                                                    # next observation is the first of a round, without preceding transition
+        self.n_live   = 0                                                       # number of states with nonzero probability, counted in the update passes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def b(self):
+        """Unnormalized belief state (memory-mapped)"""
+        return self.files[self.cur]
+
+    def chunks(self):
+        """Chunk boundaries (start, stop) of the belief state"""
+        for start in range(0, self.theta.n_s, self.chunk):
+            yield start, min(start + self.chunk, self.theta.n_s)
+
+    def targets(self, p, start, stop):
+        """Target state indices of the states start, ..., stop - 1 under Phi[p]"""
+        Phi_p = self.Phi[p]
+        if hasattr(Phi_p, "target"):                                            # implicit operator
+            return Phi_p.target[start:stop]
+        if isinstance(Phi_p, np.ndarray):                                       # dense array
+            return np.argmax(Phi_p[start:stop], axis=1)
+        return Phi_p[start:stop].tocsr().indices                                # one nonzero entry per row
+
+    def update(self, s1, a, o):
+        """This function evaluates the posterior belief state after action a
+        and observation o in a single chunked pass over the belief files. The
+        first observation of a round is made on the current position s1
+        without preceding state transition, and updates the prior over the
+        states with current position s1, which is uniform in the first round.
+
+        Inputs
+            self       (obj) : filter object
+            s1         (int) : current position
+            a          (int) : action in trial t
+            o          (arr) : 1 x 2 array of observation values
+
+        Outputs
+            self       (obj) : filter object with updated attributes
+                .cur   (int) : index of the file holding the belief state
+                .total (flt) : normalization constant
+                .n_live (int): number of states with nonzero probability
+        """
+        i_a  = 0 if a == 0 else 1                                               # compressed action index (drill/step)
+        i_o  = int(np.flatnonzero(np.all(self.O == o, axis=1))[0])              # observation index
+        nxt  = self.files[1 - self.cur]
+        total = 0.0
+        n_live = 0
+
+        if self.fresh:                                                          # first observation of a round on the current position
+            block = ((int(s1) - 1) * self.n_ident, int(s1) * self.n_ident)
+            for start, stop in self.chunks():
+                nxt[start:stop] = 0
+            for start in range(block[0], block[1], self.chunk):
+                stop  = min(start + self.chunk, block[1])
+                prior = 1 if self.total is None else self.b[start:stop] / self.total  # uniform prior in the first round
+                nxt[start:stop] = prior * th_toarray(self.Omega[i_a][start:stop, i_o]).ravel()
+                total  += nxt[start:stop].sum()
+                n_live += int(np.count_nonzero(nxt[start:stop]))
+            self.fresh = False
+        else:
+            p = int(np.flatnonzero(self.A == a)[0])                             # action index
+            for start, stop in self.chunks():
+                nxt[start:stop] = 0
+            for start, stop in self.chunks():
+                prior = self.b[start:stop] / self.total                         # normalized prior chunk
+                if not prior.any():
+                    continue
+                target     = self.targets(p, start, stop)
+                likelihood = th_toarray(self.Omega[i_a][target, i_o]).ravel()
+                low, high  = int(target.min()), int(target.max()) + 1           # contiguous target range
+                moved      = np.bincount(target - low, weights=prior * likelihood, minlength=high - low)
+                region     = nxt[low:high]                                      # target ranges of chunks may overlap
+                n_live    -= int(np.count_nonzero(region))
+                region    += moved
+                n_live    += int(np.count_nonzero(region))
+                total      += moved.sum()
+
+        if total == 0:
+            raise ValueError(
+                f"Observation {o} after action {a} on node {s1} is inconsistent with the belief state")
+        nxt.flush()
+        self.cur, self.total, self.n_live = 1 - self.cur, total, n_live
+
+    def new_round(self, s1):
+        """This function carries the belief state over to a new round, in
+        which the treasure is hidden again among the hiding spots other than
+        the current position s1, see th_carry_s3. The belief over the
+        hypotheses (s2, s3) is marginalized over the s1 blocks of the belief
+        files in a chunked pass, and carried over to the s1 block of the
+        current position.
+
+        Inputs
+            self       (obj) : filter object
+            s1         (int) : current position
+
+        Outputs
+            self       (obj) : filter object with updated attributes
+                .cur   (int) : index of the file holding the belief state
+                .total (flt) : normalization constant
+                .n_live (int): number of states with nonzero probability
+        """
+        start  = (int(s1) - 1) * self.n_ident
+        b_h    = np.zeros(self.n_ident)                                         # belief over hypotheses
+        for chunk_start, chunk_stop in self.chunks():
+            b_h += np.asarray(self.b[chunk_start:chunk_stop]).reshape(-1, self.n_ident).sum(axis=0)
+        b_h   /= self.total
+        i_h    = np.flatnonzero(b_h)                                            # live hypotheses
+        i_h, p = th_carry_s3(*th_carry_structures(self), i_h, b_h[i_h], s1, self.theta.n_h)
+        nxt    = self.files[1 - self.cur]
+        for chunk_start, chunk_stop in self.chunks():
+            nxt[chunk_start:chunk_stop] = 0
+        nxt[start + i_h] = p
+        nxt.flush()
+        self.cur, self.total, self.fresh = 1 - self.cur, 1.0, True
+        self.n_live = int(np.count_nonzero(p))
+
+    def marg(self, values, weights=1):
+        """Chunked marginal of the normalized belief over node values"""
+        marg = np.zeros(self.theta.n_n)
+        for start, stop in self.chunks():
+            b     = np.asarray(self.b[start:stop]) / self.total
+            marg += np.bincount(
+                (values(start, stop) - 1).ravel(),
+                weights=np.repeat(b, weights), minlength=self.theta.n_n)
+        return marg
+
+    def marg_s1(self):
+        """This function evaluates the marginal belief over the current
+        position s1
+
+        Outputs
+            marg   (arr) : 1 x n_n array of current position probabilities
+        """
+        return self.marg(lambda start, stop: self.S[start:stop, 0])
+
+    def marg_s2(self):
+        """This function evaluates the marginal belief over the treasure
+        location s2
+
+        Outputs
+            marg   (arr) : 1 x n_n array of treasure location probabilities
+        """
+        return self.marg(lambda start, stop: self.S[start:stop, 1])
+
+    def marg_s3(self):
+        """This function evaluates the marginal probabilities of each node
+        being a hiding spot
+
+        Outputs
+            marg   (arr) : 1 x n_n array of hiding spot probabilities
+        """
+        return self.marg(lambda start, stop: self.S[start:stop, 2:], self.theta.n_h)
+
+    def sample(self, n, rng):
+        """This function samples hypotheses from the belief state in two
+        chunked passes, which draw the number of samples per chunk and the
+        samples within each chunk
+
+        Inputs
+            n          (int) : number of samples
+            rng        (obj) : np.random.Generator object
+
+        Outputs
+            h          (arr) : n x (1 + n_h) array of hypothesis values (s2, s3)
+        """
+        chunks = list(self.chunks())
+        mass   = np.array([float(np.sum(self.b[start:stop])) for start, stop in chunks])
+        counts = rng.multinomial(n, mass / mass.sum())                          # number of samples per chunk
+        h      = []
+        for (start, stop), count in zip(chunks, counts):
+            if count:
+                b = np.asarray(self.b[start:stop])
+                h.append(self.S[start + rng.choice(stop - start, size=count, p=b / b.sum()), 1:])
+        return rng.permutation(np.concatenate(h))
+
+    def close(self):
+        """This function releases the belief files, and removes them, if
+        stored in a temporary directory"""
+        self.files = []
+        if self.cleanup is not None:
+            self.cleanup()                                                      # removes the directory once
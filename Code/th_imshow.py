@@ -1,11 +1,15 @@
 import os
 from th_paths import th_paths
 import matplotlib
+import matplotlib.image
 import numpy as np
-from matplotlib import pyplot, colors, cm
+from matplotlib import colors
 from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from mpl_toolkits.axes_grid1 import make_axes_locatable
-from matplotlib.patches import Rectangle
+from matplotlib.patches import FancyArrow, Rectangle
+from matplotlib.collections import LineCollection
 
 
 def plot_color_map(paths: th_paths, **arrays):
@@ -22,7 +26,7 @@ def plot_color_map(paths: th_paths, **arrays):
         fig_fn = os.path.join(paths.figures, key)
 
         # Preapre figure
-        plt = pyplot
+        from matplotlib import pyplot as plt                                    # pyplot (GUI backends) only imported if needed
 
         fig, ax = plt.subplots(figsize=(11, 5))
 
@@ -37,363 +41,384 @@ def plot_color_map(paths: th_paths, **arrays):
         fig.savefig(f"{fig_fn}.pdf", format='pdf')
 
 
-def plot_agent_behavior(paths, theta, beh_data):
-    """Function to plot model variables over trials
+def plot_density_map(paths: th_paths, resolution=512, **matrices):
+    """This function visualizes the structure of large component matrices as
+    density images of their nonzero entries, binned directly from the index
+    arrays without densifying the matrices, see th_density. Pixel colors
+    encode the fraction of nonzero entries per bin on a logarithmic scale
+    from a single entry to full bins, and bins without nonzero entries are
+    drawn in grey.
 
-    Inputs
-        theta       : task parameter structure with required fields
-            .d      : dimensionality of the square grid world
-            .n_n    : number of nodes
-            .n_h    : number of hiding spots
-            .n_s    : state space cardinality
-    """
-
-    def prepare_data() -> dict:
-        """Function to prepare data for plotting in 2-dim heatmaps"""
-        data = {}
+    Inputs:
+        paths            : class with paths variables
+        resolution (int) : maximal number of row and column bins
+        **matrices (dict): Keyword arguments, component matrices to be plotted in any representation
+                           Keys represent name of matrix, and values represent corresponding matrices.
 
-        for component in model_components:
-            data[component] = np.full(
-                (n_nodes, n_plotable_trials + 1), np.nan)
-
-            for trial_col in range(n_plotable_trials):
-
-                if component in ["s1_t", "s2_t"]:
-                    data[component][:, trial_col] = np.array(
-                        [1 if node == beh_data[component][trial_col] - 1 else 0
-                            for node in range(n_nodes)]
-                    )
-
-                elif component == "o_t":
-                    data[component][:, trial_col] = beh_data["node_colors"][trial_col]  # TODO: hier wieter
-                    if beh_data["o_t"][trial_col][0] == 1:
-                        data[component][:, trial_col][
-                            (beh_data["s2_t"][trial_col] - 1)] = 3
-
-                elif component in ["marg_s1_b_t", "marg_s2_b_t"]:
-                    data[component][:, trial_col] = beh_data[component][trial_col]
-
-                elif component in [
-                    # "v_t",
-                    "d_t",
-                    "a_t"
-                ]:
-
-                    # plot current position along in a grid
-                    data[component][:, trial_col] = np.array(
-                        [1 if node == beh_data["s1_t"][trial_col] - 1 else 0
-                            for node in range(n_nodes)]
-                    )
-        return data
-
-    def define_color_maps() -> dict:
-        # Get viridis colormap
-        viridis_cmap = cm.get_cmap("viridis")
-
-        return {
-            "s1_t": colors.ListedColormap(["black", "grey"]),
-            "s2_t": colors.ListedColormap(["black", "green"]),
-            "o_t": colors.ListedColormap(["black", "#C0C0C0", "#006666", "green"]),
-            "marg_s1_b_t": colors.ListedColormap([viridis_cmap(0),
-                                                  viridis_cmap(256)]),
-            "marg_s2_b_t": "viridis",
-            "v_t": colors.ListedColormap(["black", "grey"]),
-            "d_t": colors.ListedColormap(["black", "grey"]),
-            "a_t": colors.ListedColormap(["black", "grey"])
-        }
-
-    def define_y_labels() -> dict:
-        return {
-            "s1_t": r"$s^1_t$",
-            "s2_t": r"$s^2_t$",
-            "o_t": r"$o_t$",
-            "marg_s1_b_t": r"$p(s^1_t\vert o_t)$",
-            "marg_s2_b_t": r"$p(s^2_t\vert o_t)$",
-            "v_t": r"$v_t$",
-            "d_t": r"$d_t$",
-            "a_t": r"$a_t$"
-        }
-
-    def define_variable_ranges() -> dict:
-        return {
-            "s1_t": [0, 1],
-            "s2_t": [0, 1],
-            "o_t": [0, 3],
-            "marg_s1_b_t": [0, 1],
-            "marg_s2_b_t": [0, 1],
-            "v_t": [0, 1],
-            "d_t": [0, 1],
-            "a_t": [0, 1]
-        }
-
-    def define_cmap_ticks() -> dict:
-        return {
-            "s1_t": np.linspace(0, 1, 2),
-            "s2_t": np.linspace(0, 1, 2),
-            "o_t": np.linspace(0, 3, 4),
-            "marg_s1_b_t": np.linspace(0, 1, 2),
-            "marg_s2_b_t": np.linspace(0, 1, 2),
-            "v_t": np.linspace(0, 1, 2),
-            "d_t": np.linspace(0, 1, 2),
-            "a_t": np.linspace(0, 1, 2)
-        }
-
-    def create_images() -> list:
-
-        def draw_heatmap_to_this_ax() -> matplotlib.image.AxesImage:
-            """Function to create heatmap Axis image from 2 dimensional
-            array"""
-
-            return this_ax.imshow(
-                data[component][:, trial_col].reshape(dim, dim),
-                cmap=cmaps[component],
-                vmin=variable_range[component][0],
-                vmax=variable_range[component][1]
-            )
-
-        def adjust_ticks_n_labels_of_this_axis():
-            """Fucntion to adjust ticks, grid and labels
-            """
-            this_ax.set_yticklabels([])  # Remove y-axis ticks
-            this_ax.set_xticklabels([])  # Remove y-axis ticks
-            this_ax.set_ylabel(y_labels[component],
-                               loc="center",
-                               rotation="horizontal",
-                               labelpad=20)
-            this_ax.label_outer()
-            this_ax.set_xticks(np.arange(-0.5, dim, 1), minor=True)
-            this_ax.set_yticks(np.arange(-0.5, dim, 1), minor=True)
-            this_ax.set_xticks([])
-            this_ax.set_yticks([])
-            this_ax.grid(
-                which="minor",
-                color='grey',
-                linestyle='-',
-                linewidth=0.1)
-
-        def return_axis_coords():
-            # Get the extent (x0, x1, y0, y1) in data coordinates
-            extent = images[row].get_extent()  # returns the image extent as tuple (left, right, bottom, top).
-
-            # Extract x and y coordinates
-            x_coords = np.linspace(extent[0] + 1,  # left
-                                   extent[1],      # right
-                                   dim)
-            y_coords = np.linspace(extent[3] + 1,  # top
-                                   extent[2],      # bottom,
-                                   dim)
-
-            return x_coords, y_coords
-
-        def get_node_coords(node_in_question):
-
-            node_one_hot = np.array(
-                [1 if node == node_in_question - 1 else 0
-                    for node in range(n_nodes)]
-            )
-
-            node_grid_coordinate = np.where(
-                node_one_hot.reshape(dim, dim) == 1)
-
-            node_x_coord = int(node_grid_coordinate[1])  # column --> x axis
-            node_y_coord = int(node_grid_coordinate[0])  # row --> y axis
-
-            return node_x_coord, node_y_coord
-
-        def specify_arrow_coordinates(pos_1, pos_2) -> dict:
-            arrow_coords = {}
-
-            pos_1_x, pos_1_y = get_node_coords(pos_1)
-            pos_2_x, pos_2_y = get_node_coords(pos_2)
-
-            # calculate arrow "direction" as difference between s_{t + 1} and s_t
-            arrow_coords["dx"] = (axis_x_coords[pos_2_x] - 0.5) - (axis_x_coords[pos_1_x] - 0.5)
-            arrow_coords["dy"] = (axis_y_coords[pos_2_y] - 0.5) - (axis_y_coords[pos_1_y] - 0.5)
-
-            arrow_coords["start_x"] = axis_x_coords[pos_1_x] - 0.5
-            arrow_coords["start_y"] = axis_y_coords[pos_1_y] - 0.5
-
-            return arrow_coords
-
-        def draw_arrow(arrow_coords: dict, color,
-                       width_=0.002,
-                       head_width=0.3,
-                       head_length=0.25):
-
-            this_ax.arrow(
-                arrow_coords["start_x"],
-                arrow_coords["start_y"],
-                arrow_coords["dx"],
-                arrow_coords["dy"],
-                color=color,
-                width=width_,
-                length_includes_head=True,
-                head_width=head_width,
-                head_length=head_length)
-
-        def draw_drill(start_x, start_y, dx, dy):
-
-            this_ax.add_patch(
-                Rectangle(
-                    (start_x, start_y),
-                    dx, dy,
-                    # edgecolor='pink',
-                    facecolor='lightgrey',
-                    fill=True,
-                    lw=5,
-                    angle=90,
-                    rotation_point="center"
-                ))
-
-        def add_colorbar():
-            axs[row, -1].axis("off")                                            # remove last columns axes
-            if row in [2, 3, 4]:
-                divider = make_axes_locatable(axs[row, -1])
-                cax = divider.append_axes("right", pad=0.0001, size="20%")
-                ticks = cmap_ticks[component]
-
-                cbar = fig.colorbar(
-                    images[(row + 1) * n_plotable_trials - 1],
-                    cax,
-                    orientation='vertical',
-                    ticks=ticks
-                )
-
-                cbar.ax.tick_params(labelsize=6)                          # Set fontsize for colorbar ticks
-                # Explicitly update colorbar layout engine
-                cax.get_yaxis().set_label_coords(-0.5, 0.5)
-                cax.xaxis.set_label_position('top')
-                cax.xaxis.set_ticks_position('top')
-
-        # ------ Start Plotting Rountine ----------------------------------
-        images = []
-
-        # Iterate model components (rows)
-        for row, component in enumerate(model_components):
-
-            # Iterate trials (columns)
-            for trial_col in range(n_plotable_trials):
-
-                # Specify this axis
-                this_ax = axs[row, trial_col]
-
-                # Crate heatmap and append to image list
-                images.append(draw_heatmap_to_this_ax())
-                # Adjust ticks, labels and grid
-                adjust_ticks_n_labels_of_this_axis()
-
-                # Add arrows for action a_t
-                if component in ["d_t", "a_t"]:
-
-                    axis_x_coords, axis_y_coords = return_axis_coords()
-
-                    # Extract action variabel for this trial
-                    d_or_a = beh_data[component][trial_col]
-
-                    # Skip routine of drawing arrow, if a_t == nan
-                    if not np.isnan(d_or_a):
-
-                        s1_t_x, s1_t_y = get_node_coords(
-                            beh_data["s1_t"][trial_col]
-                        )
-
-                        if d_or_a == 0:
-                            draw_drill(
-                                start_x=axis_x_coords[s1_t_x] - 1,
-                                start_y=axis_y_coords[s1_t_y] - 1,
-                                dx=1, dy=1
-                            )
-
-                        else:  # if a_t != 0, i.e. is a step
-
-                            arrow_coords = specify_arrow_coordinates(
-                                pos_1=beh_data["s1_t"][trial_col],
-                                pos_2=beh_data["s1_t"][trial_col] + d_or_a
-                            )
-
-                            draw_arrow(
-                                arrow_coords=arrow_coords,
-                                color=arrow_colors[component]
-                            )
-
-                # if component == "v_t":
-
-                #     v_t = beh_data["v_t"][trial_col]
-                #     if not np.any(np.isnan(v_t)):
-                #         axis_x_coords, axis_y_coords = return_axis_coords()
-
-                #         # TODO: hier weiter
-                #         v_t.sort()
-
-                #         a_giv_s1 = beh_data["a_giv_s1"][trial_col]
-
-                #         for possible_a in a_giv_s1:
-
-                #             arrow_coords = specify_arrow_coordinates(
-                #                 pos_1=beh_data["s1_t"][trial_col],
-                #                 pos_2=beh_data["s1_t"][trial_col]
-                #                 + possible_a
-                #             )
-
-                #             draw_arrow(
-                #                 arrow_coords=arrow_coords,
-                #                 color="lightgrey"
-                #            )
-            add_colorbar()
-
-        return images
-
-    dim = theta.d                                                               # dimensionality of square grid world
-    n_nodes = theta.n_n                                                         # number nodes in gridworld
-    n_plotable_trials = beh_data["s1_t"].count()
-    model_components = ["s1_t", "s2_t", "o_t",
-                        "marg_s1_b_t", "marg_s2_b_t",
-                        "v_t", "d_t",
-                        "a_t"]
-    n_rows = len(model_components)
-
-    data = prepare_data()
-
-    # ------Prepare figure-----------------------------------------------
-    plt = pyplot
-    rc_params = {
-        'text.usetex': 'True',
-        'axes.spines.top': 'False',
-        'axes.spines.right': 'False',
-        'yaxis.labellocation': 'bottom'
-    }
-    plt.rcParams.update(rc_params)
+    """
+    from th_components import th_density                                        # nonzero binning
+
+    for key, matrix in matrices.items():
+        fig_fn  = os.path.join(paths.figures, f"{key}_density")
+        image   = th_density(matrix, resolution)
+        n, m    = matrix.shape
+        area    = (n / image.shape[0]) * (m / image.shape[1])                   # mean number of entries per bin
+        density = np.ma.masked_equal(image, 0) / area                           # fraction of nonzero entries per bin
+
+        fig     = Figure(figsize=(11, 5))
+        FigureCanvasAgg(fig)
+        ax      = fig.add_subplot()
+        cmap    = matplotlib.colormaps["viridis"].copy()
+        cmap.set_bad("darkgrey")                                                # bins without nonzero entries
+        extent  = (-0.5, m - 0.5, n - 0.5, -0.5)                                # matrix indices on the axes
+        shown   = ax.imshow(density, cmap=cmap, aspect="auto", interpolation="nearest", extent=extent,
+                            norm=colors.LogNorm(vmin=min(1 / area, 0.1), vmax=1))   # from one entry per bin to full bins
+        ax.set_title(f"{key}: {n} x {m}, {int(image.sum())} nonzero entries, "
+                     f"{image.shape[0]} x {image.shape[1]} bins", fontsize=10)
+        fig.colorbar(shown, ax=ax, shrink=0.4, label="fraction of nonzero entries")
+        fig.savefig(f"{fig_fn}.pdf", format='pdf')
 
-    fig, axs = plt.subplots(
-        n_rows,
-        n_plotable_trials + 1,
-        sharex=True, sharey=True,
-        # layout="constrained"
-        # figsize=(9, 4)
-    )
 
-    fig.suptitle(f"Agent {beh_data['agent'][0]} behavior "
-                 # r"$\tau = $" f"{beh_data['tau_gen'][0]}"
-                 )
+# Model components plotted in rows, and their y-labels, colormaps, ranges and colorbar ticks
+model_components = ["s1_t", "s2_t", "o_t", "marg_s1_b_t", "marg_s2_b_t", "v_t", "d_t", "a_t"]
+
+y_labels = {
+    "s1_t": r"$s^1_t$",
+    "s2_t": r"$s^2_t$",
+    "o_t": r"$o_t$",
+    "marg_s1_b_t": r"$p(s^1_t\vert o_t)$",
+    "marg_s2_b_t": r"$p(s^2_t\vert o_t)$",
+    "v_t": r"$v_t$",
+    "d_t": r"$d_t$",
+    "a_t": r"$a_t$"
+}
+
+cmaps = {
+    "s1_t": colors.ListedColormap(["black", "grey"]),
+    "s2_t": colors.ListedColormap(["black", "green"]),
+    "o_t": colors.ListedColormap(["black", "#C0C0C0", "#006666", "green"]),
+    "marg_s1_b_t": colors.ListedColormap([matplotlib.colormaps["viridis"](0),
+                                          matplotlib.colormaps["viridis"](256)]),
+    "marg_s2_b_t": "viridis",
+    "v_t": colors.ListedColormap(["black", "grey"]),
+    "d_t": colors.ListedColormap(["black", "grey"]),
+    "a_t": colors.ListedColormap(["black", "grey"])
+}
+
+variable_ranges = {
+    "s1_t": [0, 1],
+    "s2_t": [0, 1],
+    "o_t": [0, 3],
+    "marg_s1_b_t": [0, 1],
+    "marg_s2_b_t": [0, 1],
+    "v_t": [0, 1],
+    "d_t": [0, 1],
+    "a_t": [0, 1]
+}
+
+cmap_ticks = {
+    "s1_t": np.linspace(0, 1, 2),
+    "s2_t": np.linspace(0, 1, 2),
+    "o_t": np.linspace(0, 3, 4),
+    "marg_s1_b_t": np.linspace(0, 1, 2),
+    "marg_s2_b_t": np.linspace(0, 1, 2),
+    "v_t": np.linspace(0, 1, 2),
+    "d_t": np.linspace(0, 1, 2),
+    "a_t": np.linspace(0, 1, 2)
+}
+
+arrow_colors = {"d_t": "lightgrey", "a_t": "lightgreen"}
+
+rc_params = {
+    'text.usetex': True,
+    'axes.spines.top': False,
+    'axes.spines.right': False,
+    'yaxis.labellocation': 'bottom'
+}
+
+
+def stack_column(values, width):
+    """Function to stack an array-valued data column to a width x n array,
+    entries that are no arrays (e.g. nan) become nan columns"""
+    return np.stack(
+        [np.asarray(v, dtype=float) if np.ndim(v) else np.full(width, np.nan)
+         for v in values], axis=1).reshape(width, len(values))
+
+
+def one_hot(theta, nodes):
+    """Function to encode an array of n nodes as n_n x n one-hot array, nan
+    nodes become nan columns"""
+    nodes        = np.asarray(nodes, dtype=float)
+    valid        = ~np.isnan(nodes)
+    data         = np.full((theta.n_n, len(nodes)), np.nan)
+    data[:, valid] = 0
+    data[nodes[valid].astype(int) - 1, np.flatnonzero(valid)] = 1
+    return data
+
+
+def prepare_data(theta, beh_data, n_trials):
+    """Function to prepare data for plotting in 2-dim heatmaps, evaluated by
+    array indexing over the first n_trials rows, rows without data become nan
+    columns
 
-    y_labels = define_y_labels()
+    Inputs
+        theta       : task parameter structure with required fields
+            .n_n    : number of nodes
+        beh_data    : behavioral data frame, see th_sim_game
+        n_trials    : number of trials to prepare
 
-    cmaps = define_color_maps()
-    arrow_colors = {"d_t": "lightgrey",
-                    "a_t": "lightgreen"}
+    Outputs
+        data        : dict of component -> n_n x n_trials array
+    """
+    n_nodes = theta.n_n
+    trials  = beh_data.iloc[:n_trials]
+    s1_t    = one_hot(theta, trials["s1_t"].to_numpy(dtype=float))
+    data    = {component: np.full((n_nodes, n_trials), np.nan) for component in model_components}
+
+    data["s1_t"] = s1_t
+    data["s2_t"] = one_hot(theta, trials["s2_t"].to_numpy(dtype=float))
+
+    # Node colors, found treasure as 3
+    data["o_t"] = stack_column(trials["node_colors"], n_nodes)
+    found       = np.flatnonzero(stack_column(trials["o_t"], 2)[0] == 1)        # trials with treasure flag
+    data["o_t"][trials["s2_t"].to_numpy(dtype=float)[found].astype(int) - 1, found] = 3
+
+    data["marg_s1_b_t"] = stack_column(trials["marg_s1_b_t"], n_nodes)
+    data["marg_s2_b_t"] = stack_column(trials["marg_s2_b_t"], n_nodes)
+
+    # plot current position along in a grid
+    data["d_t"] = s1_t
+    data["a_t"] = s1_t
+    return data
+
+
+def get_node_coords(theta, nodes):
+    """Function to return the grid columns (x axis) and rows (y axis) of
+    nodes, i.e. of the row-major reshaped d x d node grid"""
+    rows, cols = np.divmod(np.asarray(nodes, dtype=int) - 1, theta.d)
+    return cols, rows
+
+
+class th_behavior_renderer:
+    def __init__(self, theta, n_t, agg=True, usetex=True):
+        """This function encodes the instantiation method of the agent
+        behavior renderer. The figure layout, i.e. the grid of axes, heatmap
+        images, colorbars, labels, action arrows and drill patches, is
+        created once for up to n_t trial columns. Rendering a data set only
+        updates image data, arrow positions and visibilities in place, such
+        that rendering the figures of many subjects reuses all artists.
+
+        With agg=True the figure is attached to an Agg canvas directly,
+        bypassing pyplot and any GUI backend, for headless rendering.
+        Otherwise the figure is created with pyplot and can be updated
+        on screen by blitting, see blit.
+
+        Inputs
+            theta       : task parameter structure with required fields
+                .d      : dimensionality of the square grid world
+                .n_n    : number of nodes
+            n_t         : number of trial columns
+            agg         : render headless on an Agg canvas
+            usetex      : render labels with LaTeX
+
+        Authors - Belinda Fleischmann, Dirk Ostwald
+        """
+        self.theta      = theta                                                 # task parameters
+        self.n_t        = n_t                                                   # number of trial columns
+        self.agg        = agg                                                   # headless Agg rendering
+        self.rc_params  = {**rc_params, "text.usetex": usetex}                  # figure style
+        self.background = None                                                  # static figure background for blitting
+        dim             = theta.d
+        blank           = np.full((dim, dim), np.nan)                           # empty heatmap
+
+        with matplotlib.rc_context(self.rc_params):
+            if agg:
+                self.fig = Figure()
+                FigureCanvasAgg(self.fig)
+            else:
+                from matplotlib import pyplot                                   # pyplot (GUI backends) only imported if needed
+                self.fig = pyplot.figure()
+            self.axs = self.fig.subplots(                                       # axes are not shared, as all have the same extent
+                len(model_components), n_t + 1, squeeze=False)
+            self.title = self.fig.suptitle("")
+
+            self.images = {}                                                    # component -> list of n_t images
+            self.grids  = []                                                    # node grid line collections
+            self.arrows = {}                                                    # component -> list of n_t step arrows
+            self.drills = {}                                                    # component -> list of n_t drill patches
+            for row, component in enumerate(model_components):
+                self.images[component] = []
+                for trial_col in range(n_t):
+                    ax = self.axs[row, trial_col]
+                    self.images[component].append(ax.imshow(
+                        blank, cmap=cmaps[component],
+                        vmin=variable_ranges[component][0],
+                        vmax=variable_ranges[component][1]))
+                    self.adjust_axis(ax, component)
+
+                # Action arrows and drill patches, hidden until rendered
+                if component in arrow_colors:
+                    self.arrows[component] = [
+                        self.axs[row, trial_col].add_patch(FancyArrow(
+                            0, 0, 0, 0, color=arrow_colors[component], width=0.002,
+                            length_includes_head=True, head_width=0.3,
+                            head_length=0.25, visible=False))
+                        for trial_col in range(n_t)]
+                    self.drills[component] = [
+                        self.axs[row, trial_col].add_patch(Rectangle(
+                            (0, 0), 1, 1, facecolor='lightgrey', fill=True, lw=5,
+                            visible=False))
+                        for trial_col in range(n_t)]
+
+                # Colorbars in the last column
+                self.axs[row, -1].axis("off")
+                if row in [2, 3, 4] and n_t > 0:
+                    divider = make_axes_locatable(self.axs[row, -1])
+                    cax     = divider.append_axes("right", pad=0.0001, size="20%")
+                    cbar    = self.fig.colorbar(
+                        self.images[component][-1], cax, orientation='vertical',
+                        ticks=cmap_ticks[component])
+                    cbar.ax.tick_params(labelsize=6)                            # Set fontsize for colorbar ticks
+                    cax.get_yaxis().set_label_coords(-0.5, 0.5)
+                    cax.xaxis.set_label_position('top')
+                    cax.xaxis.set_ticks_position('top')
+
+    def adjust_axis(self, ax, component):
+        """Function to adjust ticks, grid and labels of an axis. The node grid
+        is drawn as a single line collection above the heatmap rather than as
+        minor tick gridlines, which are expensive to draw for many axes."""
+        dim = self.theta.d
+        ax.set_xticks([])
+        ax.set_yticks([])
+        if ax.get_subplotspec().is_first_col():
+            ax.set_ylabel(y_labels[component], loc="center", rotation="horizontal", labelpad=20)
+        edges = np.arange(-0.5, dim, 1)
+        lines = ([[(e, -0.5), (e, dim - 0.5)] for e in edges]
+                 + [[(-0.5, e), (dim - 0.5, e)] for e in edges])
+        self.grids.append(ax.add_collection(LineCollection(
+            lines, colors='grey', linestyles='-', linewidths=0.1, zorder=2.5), autolim=False))
+
+    def dynamic_artists(self):
+        """Function to return all artists updated by render, in drawing order"""
+        return ([self.title]
+                + [image for images in self.images.values() for image in images]
+                + [drill for drills in self.drills.values() for drill in drills]
+                + self.grids
+                + [arrow for arrows in self.arrows.values() for arrow in arrows])
+
+    def render(self, beh_data, fig_path=None, fig_format="pdf"):
+        """This function updates the figure with a behavioral data set and
+        optionally saves it. Each data row is one trial column by position,
+        such that rows of trials after a found treasure stay blank in their
+        round. Rows beyond n_t are not shown, trial columns beyond the number
+        of rows of the data set are left blank.
+
+        Inputs
+            self        : renderer object
+            beh_data    : behavioral data frame, see th_sim_game
+            fig_path    : path of the figure file without extension, None for no saving
+            fig_format  : figure file format
+
+        Outputs
+            fig         : matplotlib figure
+        """
+        dim      = self.theta.d
+        n_trials = min(len(beh_data), self.n_t)                                 # number of plotable rows, including blank trials
+        data     = prepare_data(self.theta, beh_data, n_trials)
+
+        self.title.set_text(f"Agent {beh_data['agent'].iloc[0]} behavior")
 
-    variable_range = define_variable_ranges()
+        for component in model_components:
+            shown = np.zeros(self.n_t, dtype=bool)                              # images with data, blank images are not drawn
+            shown[:n_trials] = ~np.all(np.isnan(data[component]), axis=0)
+            for trial_col in range(self.n_t):
+                self.images[component][trial_col].set_visible(bool(shown[trial_col]))
+                if shown[trial_col]:
+                    self.images[component][trial_col].set_data(
+                        data[component][:, trial_col].reshape(dim, dim))
+
+        # Action arrows for steps and patches for drills
+        s1_t = beh_data["s1_t"].iloc[:n_trials].to_numpy(dtype=float)
+        for component, arrows in self.arrows.items():
+            d_or_a   = np.full(self.n_t, np.nan)
+            d_or_a[:n_trials] = beh_data[component].iloc[:n_trials].to_numpy(dtype=float)
+            s1_t_all = np.zeros(self.n_t)
+            s1_t_all[:n_trials] = s1_t
+            valid    = np.zeros(self.n_t, dtype=bool)                           # skip, if a_t == nan
+            valid[:n_trials] = beh_data[component].iloc[:n_trials].notna().to_numpy()
+            x_1, y_1 = get_node_coords(self.theta, np.where(valid, s1_t_all, 1))
+            x_2, y_2 = get_node_coords(self.theta, np.where(valid, s1_t_all + np.nan_to_num(d_or_a), 1))
+            for trial_col in range(self.n_t):
+                arrow, drill = arrows[trial_col], self.drills[component][trial_col]
+                drill.set_visible(bool(valid[trial_col] and d_or_a[trial_col] == 0))
+                arrow.set_visible(bool(valid[trial_col] and d_or_a[trial_col] != 0))
+                if drill.get_visible():
+                    drill.set_xy((x_1[trial_col] - 0.5, y_1[trial_col] - 0.5))
+                if arrow.get_visible():
+                    arrow.set_data(x=x_1[trial_col], y=y_1[trial_col],
+                                   dx=x_2[trial_col] - x_1[trial_col],
+                                   dy=y_2[trial_col] - y_1[trial_col])
+
+        if fig_path is not None:
+            if fig_format == "png":                                             # raster output, blit onto the stored layout
+                self.blit()
+                matplotlib.image.imsave(
+                    f"{fig_path}.png", np.asarray(self.fig.canvas.buffer_rgba()))
+            else:                                                               # vector output, full draw
+                with matplotlib.rc_context(self.rc_params):
+                    self.fig.savefig(f"{fig_path}.{fig_format}", format=fig_format)
+        return self.fig
+
+    def blit(self):
+        """This function redraws the updated artists. On the first call the
+        static layout (axes, labels and colorbars) is drawn once and stored,
+        on subsequent calls only the artists changed by render are drawn onto
+        the stored background, on screen or on the Agg canvas."""
+        canvas = self.fig.canvas
+        with matplotlib.rc_context(self.rc_params):
+            if self.background is None:
+                for artist in self.dynamic_artists():
+                    artist.set_animated(True)                                   # exclude from full draws
+                canvas.draw()
+                self.background = canvas.copy_from_bbox(self.fig.bbox)
+            canvas.restore_region(self.background)
+            for artist in self.dynamic_artists():
+                if artist.get_visible():
+                    self.fig.draw_artist(artist)
+            canvas.blit(self.fig.bbox)
+            canvas.flush_events()
+
+    def close(self):
+        """This function releases the figure"""
+        if not self.agg:
+            from matplotlib import pyplot
+            pyplot.close(self.fig)
+
+
+def plot_agent_behavior(paths, theta, beh_data, renderer=None):
+    """Function to plot model variables over trials. For many data sets, pass
+    the renderer returned by the first call to reuse the figure layout.
 
-    cmap_ticks = define_cmap_ticks()
+    Inputs
+        paths       : class with paths variables
+        theta       : task parameter structure with required fields
+            .d      : dimensionality of the square grid world
+            .n_n    : number of nodes
+            .n_h    : number of hiding spots
+            .n_s    : state space cardinality
+        beh_data    : behavioral data frame, see th_sim_game
+        renderer    : th_behavior_renderer object, None to create one
 
-    images = create_images()
+    Outputs
+        renderer    : th_behavior_renderer object
+    """
+    if renderer is None:
+        renderer = th_behavior_renderer(theta, len(beh_data))
 
     fig_fn = (
-        f"agent-{beh_data['agent'][0]}"
+        f"agent-{beh_data['agent'].iloc[0]}"
         f"_{theta.n_n}-nodes"
         f"_{theta.n_h}-hides"
     )
-    fig_path = os.path.join(paths.figures, fig_fn)
-    fig.savefig(f"{fig_path}.pdf",
-                # dpi=200,
-                format='pdf')
+    renderer.render(beh_data, fig_path=os.path.join(paths.figures, fig_fn))
+    return renderer
@@ -0,0 +1,84 @@
+from math import comb                                                           # binomial coefficient
+import numpy as np                                                              # numpy
+import more_itertools as it                                                     # iterables
+from th_sets import th_comb_rank                                                # hiding spot combination ranks
+
+
+class th_inverted_index:
+    def __init__(self, theta):
+        """This function encodes the instantiation method of the treasure hunt
+        inverted index class, which maps each node to the sorted array of
+        hiding spot combinations containing it (posting list). Posting lists
+        are stored both for the lexicographic s3 combination ranks and for
+        the hypotheses (s2, s3), i.e. the state indices within one s1 block of
+        S, such that an unveiled node filters the set of live hypotheses by
+        intersecting or subtracting a single posting list.
+
+        Inputs
+            theta      (obj) : task parameter structure with required fields
+                .n_n   (int) : number of nodes
+                .n_h   (int) : number of hiding spots
+
+        Authors - Belinda Fleischmann, Dirk Ostwald
+        """
+        n_n          = theta.n_n                                                # number of nodes
+        n_h          = theta.n_h                                                # number of hiding spots
+        self.theta   = theta                                                    # task parameters
+        self.n_g     = comb(n_n - 1, n_h - 1)                                   # number of hypotheses per treasure location s2
+        self.n_ident = n_n * self.n_g                                           # number of hypotheses (s2, s3)
+        dtype        = np.int32 if self.n_ident < 2 ** 31 else np.int64         # posting list datatype
+
+        # Hiding spot combinations of the remaining n_n - 1 nodes, if s2 is a hiding spot, in lexicographic order
+        R = np.array(                                                           # (n_n - 1 choose n_h - 1) x (n_h - 1) array
+            list(it.distinct_combinations(range(1, n_n), r=n_h - 1)),
+            dtype=np.int64).reshape(self.n_g, n_h - 1)
+        R_post = [np.flatnonzero(np.any(R == m, axis=1))                        # reduced combination ranks containing node m
+                  for m in range(n_n)]
+
+        self.postings_s3 = {}                                                   # dict with n_n entries of sorted s3 combination ranks
+        self.postings    = {}                                                   # dict with n_n entries of sorted hypothesis indices
+        for n in range(1, n_n + 1):                                             # node iterations
+
+            # s3 combination ranks, the combinations containing n are the reduced combinations with n inserted
+            s3 = np.sort(np.column_stack((R + (R >= n), np.full(self.n_g, n))), axis=1)
+            self.postings_s3[n] = np.sort(th_comb_rank(s3, n_n)).astype(dtype)
+
+            # Hypothesis indices, within each s2 = k block hypotheses are ordered by the reduced combination rank
+            blocks = []
+            for k in range(1, n_n + 1):                                         # treasure location iterations
+                if k == n:                                                      # n is the treasure location, thus a hiding spot
+                    blocks.append(np.arange(self.n_g))
+                else:                                                           # n relabeled to the remaining nodes
+                    blocks.append(R_post[n if n < k else n - 1])
+                blocks[-1] = blocks[-1] + (k - 1) * self.n_g
+            self.postings[n] = np.concatenate(blocks).astype(dtype)
+
+    def block(self, s2):
+        """This function returns the hypothesis index range of treasure
+        location s2
+
+        Inputs
+            s2     (int) : treasure location
+
+        Outputs
+            start  (int) : first hypothesis index with treasure location s2
+            stop   (int) : last hypothesis index with treasure location s2 + 1
+        """
+        return (s2 - 1) * self.n_g, s2 * self.n_g
+
+
+def th_intersect(live, posting):
+    """This function evaluates the positions of live hypotheses contained in
+    a posting list, in O(n_posting log n_live)
+
+    Inputs
+        live     (arr) : sorted array of live hypothesis indices
+        posting  (arr) : sorted posting list
+
+    Outputs
+        pos      (arr) : sorted positions in live of hypotheses contained in posting
+    """
+    pos   = np.searchsorted(live, posting)                                      # candidate positions
+    valid = pos < live.size                                                     # posting entries below the largest live index
+    pos   = pos[valid]
+    return pos[live[pos] == posting[valid]]
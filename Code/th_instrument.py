@@ -0,0 +1,187 @@
+import json                                                                     # JSON serialization
+import os                                                                       # operating system interface
+import threading                                                                # locks of concurrent builds
+import time                                                                     # wall time
+from contextlib import contextmanager                                           # context managers
+from th_helper import humanreadable_time                                        # time formatting
+
+
+class th_instrument:
+    def __init__(self):
+        """This function encodes the instantiation method of the treasure hunt
+        instrumentation class, which collects named timers and counters and
+        reports throttled progress with ETA for long running loops. It is
+        silent by default, i.e. it neither prints nor writes, and only
+        accumulates timer and counter values. If configured, progress is
+        printed at most once per reporting interval and all timers, progress
+        reports and events are written to a JSON-lines trace file.
+
+        The trace file can also be set with the environment variable TH_TRACE,
+        e.g. for batch workers.
+
+        Authors - Belinda Fleischmann, Dirk Ostwald
+        """
+        self.verbose  = False                                                   # print progress reports
+        self.interval = 1.0                                                     # minimal time between progress reports in seconds
+        self.trace    = None                                                    # JSON-lines trace file object
+        self.timers   = {}                                                      # dict of timer name -> [number of calls, total seconds]
+        self.counters = {}                                                      # dict of counter name -> count
+        self.lock     = threading.Lock()                                        # timers, counters and trace lines of worker threads
+        if os.environ.get("TH_TRACE"):
+            self.configure(trace_path=os.environ["TH_TRACE"])
+
+    def configure(self, verbose=None, interval=None, trace_path=None):
+        """This function configures reporting
+
+        Inputs
+            self         (obj) : instrumentation object
+            verbose     (bool) : print throttled progress reports
+            interval     (flt) : minimal time between progress reports in seconds
+            trace_path   (str) : path to JSON-lines trace file (appended to)
+        """
+        if verbose is not None:
+            self.verbose = verbose
+        if interval is not None:
+            self.interval = interval
+        if trace_path is not None:
+            if self.trace is not None:
+                self.trace.close()
+            self.trace = open(trace_path, "a", encoding="utf8")
+
+    def event(self, name, **fields):
+        """This function writes an event with arbitrary fields to the trace
+
+        Inputs
+            self         (obj) : instrumentation object
+            name         (str) : event name
+            **fields    (dict) : JSON serializable event fields
+        """
+        if self.trace is not None:
+            line = json.dumps({"time": time.time(), "event": name, **fields}, default=str) + "\n"
+            with self.lock:                                                     # whole lines from concurrent builds
+                self.trace.write(line)
+                self.trace.flush()
+
+    @contextmanager
+    def timer(self, name, **fields):
+        """This function times a code block and accumulates the wall time
+        under the timer name
+
+        Inputs
+            self         (obj) : instrumentation object
+            name         (str) : timer name
+            **fields    (dict) : additional fields of the trace event
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start, **fields)
+
+    def add_time(self, name, seconds, **fields):
+        """This function accumulates a measured wall time under the timer name
+
+        Inputs
+            self         (obj) : instrumentation object
+            name         (str) : timer name
+            seconds      (flt) : wall time in seconds
+            **fields    (dict) : additional fields of the trace event
+        """
+        with self.lock:
+            timer     = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+        if self.trace is not None:
+            self.event(name, seconds=seconds, **fields)
+
+    def count(self, name, n=1):
+        """This function increments the counter name by n"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def progress(self, name, total):
+        """This function returns a progress object for a loop with total
+        iterations
+
+        Inputs
+            self         (obj) : instrumentation object
+            name         (str) : progress name
+            total        (int) : number of iterations
+
+        Outputs
+            progress     (obj) : th_progress object
+        """
+        return th_progress(self, name, total)
+
+    def summary(self):
+        """This function returns all timer and counter values
+
+        Outputs
+            summary     (dict) : dict with timers {name: {"calls", "seconds"}} and counters {name: count}
+        """
+        return {
+            "timers": {name: {"calls": calls, "seconds": seconds}
+                       for name, (calls, seconds) in self.timers.items()},
+            "counters": dict(self.counters)
+        }
+
+    def reset(self):
+        """This function resets all timers and counters"""
+        with self.lock:                                                         # worker threads may be timing
+            self.timers   = {}
+            self.counters = {}
+
+
+class th_progress:
+    def __init__(self, instrument, name, total):
+        """This function encodes the instantiation method of the progress
+        class. Updates are cheap, the clock is only read every check_every
+        iterations, and reports are emitted at most once per reporting
+        interval, and only if the instrumentation is verbose or traced.
+
+        Inputs
+            instrument   (obj) : th_instrument object
+            name         (str) : progress name
+            total        (int) : number of iterations
+        """
+        self.instrument  = instrument                                           # instrumentation object
+        self.name        = name                                                 # progress name
+        self.total       = total                                                # number of iterations
+        self.done        = 0                                                    # number of completed iterations
+        self.active      = instrument.verbose or instrument.trace is not None   # reporting enabled
+        self.check_every = max(1, total // 1000)                                # iterations between clock reads
+        self.next_check  = self.check_every                                     # iteration count of next clock read
+        self.start       = time.perf_counter()                                  # start time
+        self.last        = self.start                                           # time of last report
+
+    def update(self, n=1):
+        """This function marks n further iterations as completed"""
+        self.done += n
+        if self.active and (self.done >= self.next_check or self.done >= self.total):
+            self.next_check = self.done + self.check_every
+            now = time.perf_counter()
+            if now - self.last >= self.instrument.interval or self.done >= self.total:
+                self.last = now
+                self.report(now)
+
+    def report(self, now):
+        """This function emits a progress report with ETA"""
+        elapsed = now - self.start
+        eta     = elapsed / self.done * (self.total - self.done) if self.done else float("nan")
+        if self.instrument.verbose:
+            print(f"{self.name}: {self.done}/{self.total} "
+                  f"({100 * self.done / max(self.total, 1):.1f} %), "
+                  f"elapsed: {humanreadable_time(elapsed)}, ETA: {humanreadable_time(eta)}")
+        self.instrument.event(
+            self.name, kind="progress", done=self.done, total=self.total,
+            elapsed=elapsed, eta=eta)
+
+    def close(self):
+        """This function marks the loop as finished and records its wall
+        time under the progress name"""
+        self.instrument.add_time(
+            self.name, time.perf_counter() - self.start, kind="done", done=self.done)
+
+
+# Module-wide instrumentation object, silent by default
+instrument = th_instrument()
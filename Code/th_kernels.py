@@ -0,0 +1,289 @@
+"""
+This module provides the inner loops of component building and belief
+updating as kernels with two implementations: explicit loops, which are
+compiled with Numba, if installed, and vectorized NumPy expressions, which
+are used otherwise. Numba is optional; setting the environment variable
+TH_NUMBA=0 selects the NumPy kernels although Numba is installed. Both
+implementations are compared by th_kernel_check, which also runs the
+uncompiled loops, if Numba is not installed, and by tests/test_kernels.py.
+
+Usage (from the Code directory)
+    python th_kernels.py
+
+Authors - Belinda Fleischmann, Dirk Ostwald
+"""
+import os                                                                       # operating system interface
+import numpy as np                                                              # numpy
+
+try:
+    import numba                                                                # optional just-in-time compiler
+except ImportError:
+    numba = None
+
+# Kernel implementation used by default, "numba" or "numpy"
+backend = "numba" if numba is not None and os.environ.get("TH_NUMBA") != "0" else "numpy"
+
+
+def phi_targets_loop(S, a, n_n, d, n_ident, start, stop):
+    """Loop implementation of th_kernel_phi_targets, see there. For each s1
+    block, the block starts are searched for the state s + a, or s, if a
+    moves the agent beyond the grid border."""
+    n_s    = S.shape[0]
+    target = np.empty(stop - start, dtype=np.int64)
+    for i in range(start, stop, n_ident):                                       # s1 blocks
+        s1    = S[i, 0]
+        valid = (1 <= s1 + a <= n_n
+                 and not (a == -1 and (s1 - 1) % d == 0)
+                 and not (a == 1 and s1 % d == 0))
+        new_s1 = s1 + a if valid else s1
+        j      = -1
+        for k in range(0, n_s, n_ident):                                        # candidate target blocks
+            match = S[k, 0] == new_s1
+            for m in range(1, S.shape[1]):
+                match = match and S[k, m] == S[i, m]
+            if match:
+                j = k
+                break
+        for k in range(n_ident):                                                # identity block
+            target[i - start + k] = j + k
+    return target
+
+
+def phi_targets_numpy(S, a, n_n, d, n_ident, start, stop):
+    """NumPy implementation of th_kernel_phi_targets, see there"""
+    s1     = S[::n_ident, 0].astype(np.int64)                                   # s1 per block, sorted
+    blocks = np.arange(start // n_ident, stop // n_ident)                       # blocks of the state range
+    s1_b   = s1[blocks]
+    valid  = ((1 <= s1_b + a) & (s1_b + a <= n_n)
+              & ~((a == -1) & ((s1_b - 1) % d == 0))
+              & ~((a == 1) & (s1_b % d == 0)))
+    target = np.searchsorted(s1, np.where(valid, s1_b + a, s1_b))               # target block per block
+    return np.arange(start, stop, dtype=np.int64) + np.repeat((target - blocks) * n_ident, n_ident)
+
+
+def omega_entries_loop(labels, table):
+    """Loop implementation of th_kernel_omega_entries, see there"""
+    n_o  = table.shape[1]
+    nnz  = 0
+    for i in range(labels.shape[0]):                                            # count nonzero entries
+        for m in range(n_o):
+            if table[labels[i], m] != 0:
+                nnz += 1
+    rows = np.empty(nnz, dtype=np.int64)
+    cols = np.empty(nnz, dtype=np.int64)
+    idx  = 0
+    for i in range(labels.shape[0]):                                            # state iterations
+        for m in range(n_o):                                                    # observation iterations
+            if table[labels[i], m] != 0:
+                rows[idx] = i
+                cols[idx] = m
+                idx += 1
+    return rows, cols
+
+
+def omega_entries_numpy(labels, table):
+    """NumPy implementation of th_kernel_omega_entries, see there"""
+    rows, cols = np.nonzero(table[labels])                                      # row-major, as the loop
+    return rows.astype(np.int64), cols.astype(np.int64)
+
+
+def compact_loop(i_h, p, weights):
+    """Loop implementation of th_kernel_compact, see there"""
+    keep_i = np.empty(i_h.shape[0], dtype=i_h.dtype)
+    keep_p = np.empty(i_h.shape[0], dtype=np.float64)
+    n      = 0
+    total  = 0.0
+    for k in range(i_h.shape[0]):                                               # single pass over the support set
+        w = p[k] * weights[k]
+        if w > 0:
+            keep_i[n] = i_h[k]
+            keep_p[n] = w
+            total    += w
+            n        += 1
+    for k in range(n):
+        keep_p[k] /= total
+    return keep_i[:n], keep_p[:n]
+
+
+def compact_numpy(i_h, p, weights):
+    """NumPy implementation of th_kernel_compact, see there"""
+    posterior = p * weights                                                     # unnormalized posterior
+    keep      = posterior > 0                                                   # hypotheses consistent with observation
+    return i_h[keep], posterior[keep] / posterior[keep].sum()
+
+
+# Kernel implementations per backend, loops compiled on first call
+kernels = {
+    "loop": {"phi_targets": phi_targets_loop,
+             "omega_entries": omega_entries_loop,
+             "compact": compact_loop},
+    "numpy": {"phi_targets": phi_targets_numpy,
+              "omega_entries": omega_entries_numpy,
+              "compact": compact_numpy}
+}
+if numba is not None:
+    kernels["numba"] = {name: numba.njit(cache=True)(kernel) for name, kernel in kernels["loop"].items()}
+
+
+def th_kernel(name, use=None):
+    """This function returns the kernel implementation of a backend
+
+    Inputs
+        name     (str) : kernel name, "phi_targets", "omega_entries" or "compact"
+        use      (str) : backend, "numba", "numpy" or "loop", None for the default backend
+
+    Outputs
+        kernel   (fun) : kernel function
+    """
+    use = backend if use is None else use
+    if use not in kernels:
+        raise ValueError(f"Kernel backend {use} is not available, install numba or use one of {list(kernels)}")
+    return kernels[use][name]
+
+
+def th_kernel_phi_targets(S, a, theta, start=0, stop=None, use=None):
+    """This function evaluates the target state index of each state of the
+    range start, ..., stop - 1 under the state-state transition of action a.
+    The states of each s1 block are mapped onto the states of the s1 + a
+    block in the same order, or onto themselves, if a moves the agent beyond
+    the grid border.
+
+    Inputs
+        S        (arr) : n_s x (2 + n_h) state set array, sorted by s1
+        a        (int) : action value
+        theta    (obj) : task parameter structure with required fields
+            .d   (int) : dimension of the square grid world
+            .n_n (int) : number of nodes
+            .n_s (int) : state space cardinality
+        start    (int) : first state index, a multiple of n_s / n_n
+        stop     (int) : state index after the last state, a multiple of n_s / n_n, None for n_s
+        use      (str) : backend, None for the default backend
+
+    Outputs
+        target   (arr) : (stop - start) x 0 int64 array of target state indices
+    """
+    stop = theta.n_s if stop is None else stop
+    return th_kernel("phi_targets", use)(
+        np.ascontiguousarray(S), int(a), int(theta.n_n), int(theta.d), int(theta.n_s // theta.n_n),
+        int(start), int(stop))
+
+
+def th_kernel_omega_entries(labels, table, use=None):
+    """This function evaluates the row and column indices of the nonzero
+    entries of an observation matrix from the state class labels and the
+    class table, in order of states and observations.
+
+    Inputs
+        labels   (arr) : n_s x 0 int8 array of state classes, see th_omega_labels
+        table    (arr) : 3 x n_o int8 array of observation probabilities per class, see th_omega_class_table
+        use      (str) : backend, None for the default backend
+
+    Outputs
+        rows     (arr) : nnz x 0 int64 array of row indices
+        cols     (arr) : nnz x 0 int64 array of column indices
+    """
+    return th_kernel("omega_entries", use)(
+        np.ascontiguousarray(labels), np.ascontiguousarray(table))
+
+
+def th_kernel_compact(i_h, p, weights, use=None):
+    """This function evaluates the normalized posterior of a support set and
+    compacts it to the hypotheses with nonzero posterior probability.
+
+    Inputs
+        i_h      (arr) : support set
+        p        (arr) : support set probabilities
+        weights  (arr) : support set likelihoods
+        use      (str) : backend, None for the default backend
+
+    Outputs
+        i_h      (arr) : support set (compacted), empty, if no hypothesis is consistent
+        p        (arr) : normalized posterior probabilities
+    """
+    return th_kernel("compact", use)(
+        i_h, np.asarray(p, dtype=np.float64), np.asarray(weights, dtype=np.float64))
+
+
+def th_kernel_states(d, n_h):
+    """This function evaluates the state set of a small task configuration,
+    ordered as by th_sets, without writing components to disk
+
+    Inputs
+        d        (int) : dimension of the square grid world
+        n_h      (int) : number of hiding spots
+
+    Outputs
+        theta    (obj) : task parameter structure with fields .d, .n_n and .n_s
+        S        (arr) : n_s x (2 + n_h) array of state values
+    """
+    from itertools import combinations                                          # subsets of nodes
+    from th_structure import th_structure                                       # structures
+
+    theta     = th_structure()
+    theta.d   = d
+    theta.n_n = d ** 2
+    nodes     = np.arange(1, theta.n_n + 1)
+    S         = np.array([(s1, s2, *s3)
+                          for s1 in nodes
+                          for s3 in combinations(nodes, n_h)
+                          for s2 in s3], dtype=np.int64)
+    S         = S[np.lexsort((S[:, 1], S[:, 0]))]                               # sorted by s1, then s2
+    theta.n_s = S.shape[0]
+    return theta, S
+
+
+def th_kernel_check(configs=((2, 1), (2, 2), (3, 2), (3, 3)), seed=0):
+    """This function checks the equivalence of the kernel backends on the
+    state sets of small task configurations and random support sets. The
+    NumPy kernels are compared with the compiled loops, if Numba is
+    installed, and with the uncompiled loops otherwise.
+
+    Inputs
+        configs  (seq) : sequence of (d, n_h) task configurations
+        seed     (int) : random number generator seed
+
+    Outputs
+        checked  (list) : list of (kernel, d, n_h) tuples checked
+
+    Raises
+        AssertionError  : if the backends differ
+    """
+    from th_omega import th_omega_class_table                                   # class tables
+
+    reference = "numba" if "numba" in kernels else "loop"
+    rng       = np.random.default_rng(seed)
+    O         = np.array([[0, 0], [0, 1], [0, 2], [1, 0], [1, 2]])              # observation set
+    checked   = []
+    for d, n_h in configs:
+        theta, S = th_kernel_states(d, n_h)
+        n_ident  = theta.n_s // theta.n_n
+        for a in [0, -d, 1, d, -1]:
+            target = th_kernel_phi_targets(S, a, theta, use="numpy")
+            assert np.array_equal(target, th_kernel_phi_targets(S, a, theta, use=reference)), ("phi_targets", d, n_h, a)
+            start, stop = n_ident, theta.n_s - n_ident                          # state range of whole s1 blocks
+            assert np.array_equal(target[start:stop], th_kernel_phi_targets(
+                S, a, theta, start, stop, use=reference)), ("phi_targets", d, n_h, a, start, stop)
+        checked.append(("phi_targets", d, n_h))
+
+        s1_is_hide = (S[:, 2:] == S[:, [0]]).any(axis=1)
+        labels     = (s1_is_hide.astype(np.int8) + (S[:, 0] == S[:, 1])).astype(np.int8)
+        for p in [0, 1]:
+            table = th_omega_class_table(O, p)
+            for x, y in zip(th_kernel_omega_entries(labels, table, "numpy"),
+                            th_kernel_omega_entries(labels, table, reference)):
+                assert np.array_equal(x, y), ("omega_entries", d, n_h, p)
+        checked.append(("omega_entries", d, n_h))
+
+        i_h     = np.sort(rng.choice(theta.n_s, size=theta.n_s // 2, replace=False))
+        p       = rng.random(i_h.size)
+        weights = (rng.random(i_h.size) < 0.5).astype(np.float64)
+        for x, y in zip(th_kernel_compact(i_h, p / p.sum(), weights, "numpy"),
+                        th_kernel_compact(i_h, p / p.sum(), weights, reference)):
+            assert np.allclose(x, y, rtol=1e-12, atol=0) and x.shape == y.shape, ("compact", d, n_h)
+        checked.append(("compact", d, n_h))
+    return checked
+
+
+if __name__ == "__main__":
+    checked = th_kernel_check()
+    print(f"{len(checked)} kernel checks passed, default backend: {backend}")
@@ -0,0 +1,186 @@
+"""
+This module implements an anytime Monte Carlo tree search decision function
+for configurations whose exact lookahead, see th_policy, is too expensive.
+The search follows partially observable Monte Carlo planning: each
+simulation samples a hypothesis (s2, s3) from the agent's belief state and
+plays it through the task dynamics of th_task, i.e. the available actions of
+th_task.identify_A_giv_s1, the treasure found on stepping onto s2, and the
+hiding spot status unveiled by drilling. The search tree branches on actions
+and observations, i.e. the node color after drilling, such that its nodes
+are action-observation histories. Actions are selected by upper confidence
+bounds in the tree and uniformly among the step actions in the rollouts
+beyond it. The value of a history is the probability of finding the
+treasure with the remaining actions of the round.
+
+The search is anytime: it returns the action with the most visits at the
+root, when its time budget or rollout budget runs out. After the real
+action and observation, the subtree of the resulting history becomes the
+root of the next search, such that the simulations of previous trials are
+reused. The tree is discarded at the start of each round.
+
+Authors - Belinda Fleischmann, Dirk Ostwald
+"""
+import math                                                                     # square root and logarithm
+import time                                                                     # time budget
+import numpy as np                                                              # numpy
+from th_bitmask import th_s3_masks                                              # hiding spot bitmasks
+
+
+class th_mcts_node:
+    def __init__(self):
+        """This function encodes the instantiation method of the search tree
+        node class, i.e. of an action-observation history
+
+        Authors - Belinda Fleischmann, Dirk Ostwald
+        """
+        self.n        = 0                                                       # number of visits
+        self.n_a      = {}                                                      # number of visits per action
+        self.q_a      = {}                                                      # mean value per action
+        self.children = {}                                                      # dict of (action, observation) -> child node
+
+
+class th_mcts:
+    def __init__(self, theta, A, seconds=0.1, rollouts=None, c=1.0, seed=None):
+        """This function encodes the instantiation method of the Monte Carlo
+        tree search class
+
+        Inputs
+            theta      (obj) : task parameter structure with required fields
+                .d     (int) : dimension of the square grid world
+                .n_n   (int) : number of nodes
+            A          (arr) : 5 x 1 array of action values
+            seconds    (flt) : time budget per decision in seconds, None for no time budget
+            rollouts   (int) : number of simulations per decision, None for no rollout budget
+            c          (flt) : exploration constant of the upper confidence bounds
+            seed       (int) : seed of the search, None for a seed drawn from np.random
+
+        Authors - Belinda Fleischmann, Dirk Ostwald
+        """
+        if seconds is None and rollouts is None:
+            raise ValueError("Monte Carlo tree search requires a time budget or a rollout budget")
+        self.theta    = theta                                                   # task parameters
+        self.seconds  = seconds                                                 # time budget per decision
+        self.rollouts = rollouts                                                # rollout budget per decision
+        self.c        = c                                                       # exploration constant
+        self.rng      = np.random.default_rng(np.random.randint(2 ** 31) if seed is None else seed)
+        self.batch    = 256 if rollouts is None else rollouts                   # number of hypotheses sampled at once
+        self.root     = th_mcts_node()                                          # search tree root, i.e. current history
+
+        # Available actions and target positions per position, as by th_task.identify_A_giv_s1
+        d, n_n        = theta.d, theta.n_n
+        self.actions  = {}
+        self.steps    = {}
+        for s1 in range(1, n_n + 1):
+            steps = [(int(a), s1 + int(a)) for a in A if a != 0
+                     and 1 <= s1 + a <= n_n
+                     and not (a == -1 and (s1 - 1) % d == 0)
+                     and not (a == 1 and s1 % d == 0)]
+            self.steps[s1]   = steps
+            self.actions[s1] = [0] + [a for a, _ in steps]
+
+    def reset(self):
+        """This function discards the search tree, e.g. at the start of a
+        round"""
+        self.root = th_mcts_node()
+
+    def advance(self, a, o):
+        """This function moves the root of the search tree to the history
+        extended by the real action and observation, keeping its subtree
+
+        Inputs
+            a          (int) : action value
+            o          (arr) : 1 x 2 array of observation values
+        """
+        key       = (int(a), int(o[1]) if a == 0 else 0)                        # node color after drilling
+        self.root = self.root.children.get(key) or th_mcts_node()
+
+    def search(self, b, s1, k):
+        """This function searches the tree of the current history within the
+        time and rollout budgets and returns the action with the most visits
+
+        Inputs
+            b          (obj) : belief state with method sample, e.g. th_belief
+            s1         (int) : current position
+            k          (int) : number of remaining actions that can be rewarded
+
+        Outputs
+            a          (int) : action value
+        """
+        deadline   = None if self.seconds is None else time.perf_counter() + self.seconds
+        n          = 0
+        hypotheses = []
+        while ((self.rollouts is None or n < self.rollouts)
+               and (deadline is None or time.perf_counter() < deadline)):
+            if not hypotheses:                                                  # sample a batch of hypotheses
+                h          = b.sample(self.batch, self.rng)
+                hypotheses = list(zip(h[:, 0].tolist(), th_s3_masks(h[:, 1:], self.theta.n_n).tolist()))
+            s2, s3 = hypotheses.pop()
+            self.simulate(self.root, int(s1), s2, s3, k)
+            n += 1
+        if not self.root.n_a:                                                   # budget exhausted before the first simulation
+            return 0
+        return max(self.root.n_a, key=lambda a: (self.root.n_a[a], self.root.q_a[a]))
+
+    def simulate(self, node, s1, s2, s3, k):
+        """This function simulates one history of a sampled hypothesis from a
+        tree node, expands the tree by one node and updates the visited
+        nodes' statistics
+
+        Inputs
+            node       (obj) : search tree node
+            s1         (int) : current position
+            s2         (int) : sampled treasure location
+            s3         (int) : bitmask of the sampled hiding spots
+            k          (int) : number of remaining actions that can be rewarded
+
+        Outputs
+            value      (flt) : 1, if the treasure was found, 0 otherwise
+        """
+        if k == 0:
+            return 0.0
+        actions = self.actions[s1]
+        untried = [a for a in actions if a not in node.n_a]
+        if untried:                                                             # expansion
+            a = untried[int(self.rng.integers(len(untried)))]
+            node.n_a[a], node.q_a[a] = 0, 0.0
+        else:                                                                   # upper confidence bound selection
+            log_n = math.log(node.n)
+            a     = max(actions, key=lambda x: node.q_a[x] + self.c * math.sqrt(log_n / node.n_a[x]))
+        expand = not node.n_a[a]
+
+        if a == 0:                                                              # drill action, node color observed
+            o, target = (2 if s3 >> (s1 - 1) & 1 else 1), s1
+        else:                                                                   # step action
+            target = s1 + a
+            o      = 0
+        if a != 0 and target == s2:                                             # treasure found, the round ends
+            value = 1.0
+        else:
+            child = node.children.get((a, o))
+            if child is None:
+                child = node.children[(a, o)] = th_mcts_node()
+            if expand:
+                value = self.rollout(target, s2, k - 1)
+                child.n += 1
+            else:
+                value = self.simulate(child, target, s2, s3, k - 1)
+
+        node.n     += 1
+        node.n_a[a] += 1
+        node.q_a[a] += (value - node.q_a[a]) / node.n_a[a]                      # incremental mean
+        return value
+
+    def rollout(self, s1, s2, k):
+        """This function evaluates the value of a history beyond the search
+        tree by uniformly random step actions, since drilling does not find
+        the treasure in the current round
+
+        Outputs
+            value      (flt) : 1, if the treasure was found, 0 otherwise
+        """
+        for _ in range(k):
+            steps  = self.steps[s1]
+            s1     = steps[int(self.rng.integers(len(steps)))][1]
+            if s1 == s2:
+                return 1.0
+        return 0.0
@@ -1,216 +1,240 @@
 import numpy as np
 import os
 import scipy.sparse as sp
-from th_imshow import plot_color_map
-from th_helper import humanreadable_time
-import time
+import threading
+from th_bitmask import th_s3_masks, th_is_hiding_spot
+from th_components import th_components                                         # lazy per-action component container
+from th_kernels import th_kernel_omega_entries                                  # optional compiled kernels
+from th_checkpoint import th_checkpoint_build, th_checkpoint_chunk, th_checkpoint_clear  # checkpointed chunked evaluation
 
 
-def th_omega(S, O, theta, paths):
-    """This function evaluates the action-dependent and state-Scenarioal
+# Labels of the action-dependent Omega matrices; used for saving or loading matrices from disk
+matrix_names = [
+    "Omega_drill",
+    "Omega_step"
+]
+
+
+def th_omega(S, O, theta, paths, representation="csc"):
+    """This function returns the action-dependent and state-conditional
     observation probability distribution of a Bayesian agent for the treasure
-    hunt task.
+    hunt task as a lazy container, i.e. Omega[p] is loaded from disk, or
+    evaluated and saved to disk, on first access only.
 
     Inputs:
         theta    (obj) : task parameter structure with required fields
             .d   (int) : dimension of square grid world
+            .n_n (int) : number of nodes
             .n_s (int) : state space cardinality
             .n_o (int) : observation space cardinality
         S        (arr) : n_s x 1 + n_h array
         O        (arr) : n_n x 2 array of observation values
         paths    (obj) : paths object storing directory path variables
+        representation (str/list) : matrix representation, or list of 2 representations, see th_plan
+            "csc"      : compressed sparse column matrix, saved to and loaded from disk
+            "dense"    : n_s x n_o int8 array, evaluated from the csc matrix
+            "class"    : th_omega_table object, state class labels shared by both matrices
 
     Outputs:
-        Omega    (dic) : dict with 2 entries of n_s x n_o sparse arrays of observation probability
+        Omega    (obj) : th_components object with 2 entries of n_s x n_o sparse arrays of observation probability
 
     """
-    # Task parameters and set cardinalities
-    d       = theta.d                                                           # dimension of the square grid world
-    n_s     = theta.n_s                                                         # state space cardinality (number of states)
-    n_o     = theta.n_o                                                         # observation space cardinality (number of observations)
-    n_a     = 2                                                                 # compressed action space cardinality (drill/step)
+    shared = {}                                                                 # state class labels, shared by both matrices
+    lock   = threading.Lock()                                                   # labels evaluated once by concurrent builds
+
+    def build(p):
+        rep = representation if isinstance(representation, str) else representation[p]
+        if rep == "class":
+            with lock:
+                if "labels" not in shared:
+                    shared["labels"] = th_omega_labels(S, theta, paths)
+            return th_omega_table(shared["labels"], th_omega_class_table(O, p))
+        if rep == "dense":
+            return th_omega_a(S, O, p, theta, paths).toarray()
+        return th_omega_a(S, O, p, theta, paths)
+
+    return th_components(names=matrix_names, build=build,
+                         persisted=lambda p: True)                              # matrices or state class labels are saved
+
+
+def th_omega_labels(S, theta, paths):
+    """This function evaluates the observation-relevant class of each state,
+    i.e. whether the agent stands on a non-hiding spot (0), on a hiding spot
+    other than the treasure location (1), or on the treasure location (2).
+    Omega[p][i, :] only depends on the class of state i. If the
+    Omega_class.npy file exists, the labels are loaded from disk, otherwise
+    evaluated in one vectorized pass and saved to disk.
+
+    Inputs:
+        theta    (obj) : task parameter structure with required fields
+            .n_n (int) : number of nodes
+        S        (arr) : n_s x 1 + n_h array
+        paths    (obj) : paths object storing directory path variables
 
-    # Action set
-    A = [0, 1]                                                                  # compressed action space (drill/step)
+    Outputs:
+        labels   (arr) : n_s x 0 int8 array of state class labels
 
-    # Initialize dictionary of observation probability distribution matrices
-    Omega = {}
-    for p in range(n_a):                                                        # iterate action indices
-        Omega[p] = sp.csc_matrix(
-            (n_s, n_o),                                                         # shape of Omega_a, i.e. Omega giv. a
-            dtype=np.int8                                                       # smallest possible datatype: int8
-        )
+    Saves to disk, if not existing
+        Omega_class.npy : n_s x 0 int8 array of state class labels
+    """
+    path = os.path.join(paths.components, "Omega_class.npy")
+    if os.path.exists(path):
+        return np.load(path)
+
+    s1_is_hide = th_is_hiding_spot(                                             # s[0] in s[2:] for all states
+        th_s3_masks(S[:, 2:], theta.n_n), S[:, 0])
+    labels     = s1_is_hide.astype(np.int8) + (S[:, 0] == S[:, 1])              # treasure locations are hiding spots
+    paths.save_arrays(sparse=False, file_name="Omega_class", array=labels)
+    return labels
+
+
+def th_omega_class_table(O, p):
+    """This function evaluates the 3 x n_o table of observation probabilities
+    per state class for the compressed action index p (0: drill, 1: step),
+    i.e. the scenarios of the Tables 1 and 2 in Overleaf. After drill
+    actions, the unveiled node color is observed without treasure, grey
+    (1) on a non-hiding spot and blue (2) on a hiding spot, and no drill
+    observation is possible on the treasure location. After step actions,
+    the treasure flag is observed with the node color black (0), or grey
+    (1) on a non-hiding spot and blue (2) on a hiding spot, respectively
+
+    Inputs:
+        O        (arr) : n_o x 2 array of observation values
+        p        (int) : compressed action index
+
+    Outputs:
+        table    (arr) : 3 x n_o int8 array, rows are state classes, see th_omega_labels
+    """
+    is_hide  = np.array([False, True, True])[:, None]                           # class stands on a hiding spot
+    on_treas = np.array([False, False, True])[:, None]                          # class stands on the treasure location
+    flag     = O[None, :, 0]                                                    # treasure flags o[0]
+    color    = O[None, :, 1]                                                    # node colors o[1]
+    unveiled = np.where(is_hide, 2, 1)                                          # blue hiding spot, grey non-hiding spot
+    if p == 0:                                                                  # drill: unveiled node color, no drill on the treasure location
+        table = ~on_treas & (flag == 0) & (color == unveiled)
+    else:                                                                       # step: treasure flag, black or unveiled node color
+        table = (flag == on_treas) & ((color == 0) | (color == unveiled))
+    return table.astype(np.int8)
+
+
+class th_omega_table:
+    def __init__(self, labels, table):
+        """This function encodes the instantiation method of the state class
+        observation matrix class, i.e. of an n_s x n_o matrix with rows
+        Omega[i, :] = table[labels[i], :], stored as n_s int8 class labels
+        and a 3 x n_o table.
+
+        Inputs
+            labels   (arr) : n_s x 0 int8 array of state class labels
+            table    (arr) : 3 x n_o int8 array of observation probabilities per state class
+        """
+        self.labels = labels                                                    # state class labels
+        self.table  = table                                                     # observation probabilities per state class
+        self.shape  = (labels.size, table.shape[1])                             # matrix shape
+        self.dtype  = table.dtype                                               # matrix entry datatype
+        self.nnz    = int(np.bincount(labels, minlength=3) @ (table != 0).sum(axis=1))  # number of nonzero entries
+
+    def __getitem__(self, key):
+        """Entry access Omega[rows, cols], e.g. rows Omega[i, :] and
+        likelihood vectors Omega[rows, i_o], as numpy arrays"""
+        rows, cols = key if isinstance(key, tuple) else (key, slice(None))
+        return self.table[self.labels[rows], cols]
+
+    def tocsc(self):
+        """Materialization as compressed sparse column matrix"""
+        return sp.csc_matrix(self.toarray())
+
+    def toarray(self):
+        """Materialization as dense array"""
+        return self.table[self.labels]
+
+    def todense(self):
+        """Materialization as dense matrix"""
+        return np.asmatrix(self.toarray())
+
+
+def th_omega_a(S, O, p, theta, paths, chunk_states=None):
+    """This function evaluates the state-conditional observation probability
+    distribution of a Bayesian agent for the treasure hunt task for the
+    compressed action index p (0: drill, 1: step).
+    If the Omega_<label>.npz file exists, Omega[p] is loaded from disk,
+    otherwise evaluated and saved to disk. The evaluation proceeds in chunks
+    of whole s1 blocks, which are checkpointed in
+    Components/<config>/Omega_<label>.chunks, such that an interrupted
+    evaluation resumes from the completed chunks.
 
-    # Define list of labels for the action-dependent Omega matrices; used for saving or loading matrices from disk
-    matrix_names = [
-        "Omega_drill",
-        "Omega_step"
-    ]
+    Inputs:
+        theta    (obj) : task parameter structure with required fields
+            .n_n (int) : number of nodes
+            .n_s (int) : state space cardinality
+            .n_o (int) : observation space cardinality
+        S        (arr) : n_s x 1 + n_h array
+        O        (arr) : n_n x 2 array of observation values
+        p        (int) : compressed action index
+        paths    (obj) : paths object storing directory path variables
+        chunk_states (int) : approximate number of states per checkpointed chunk, None for th_checkpoint.CHUNK_STATES
+
+    Outputs:
+        Omega_p  (arr) : n_s x n_o sparse array of observation probability given compressed action p
+
+    Saves to disk, if not existing
+        Omega_<label>.npz : n_s x n_o sparse array of observation probability given compressed action p
+
+    """
+    # Task parameters and set cardinalities
+    n_s     = theta.n_s                                                         # state space cardinality (number of states)
+    n_o     = theta.n_o                                                         # observation space cardinality (number of observations)
 
     # -----------------------------------------------------------------------------------------------------
     # Compute or load action-dependent observation probability distribution matrices
     # -----------------------------------------------------------------------------------------------------
-
-    for p in range(n_a):                                                        # a_t iterations
-
-        Omega_matrix_name = matrix_names[p]                                     # Get action-specific Matrix label string for path variable
-        a                 = A[p]                                                # action a \in A (compressed)
-
-        # Compute Omega[p] if not existing on disk
-        if not os.path.exists(os.path.join(paths.components, f"{Omega_matrix_name}.npz")):
-
-            # Initialize arrays to store row and col indices, that indicate value 1 entries in Phi[p]; needed to create sparse matrices
-            if a == 0:
-                n_nonzeros = n_s                                                # number of nonzero values in Omega[p]
-            else:
-                n_nonzeros = n_s * 2
-            rows = np.full((n_nonzeros), np.nan)                                # array to store row indices
-            cols = np.full((n_nonzeros), np.nan)                                # array to store col indices
-
-            print(f"Starting evaluation of Omega[{p}]..., matrix_label: {Omega_matrix_name}")
-
-            idx = 0
-
-            for i in range(n_s):                                                # state iterations
-
-                start = time.time()
-                for m in range(n_o):                                            # observation iterations
-
-                    s = S[i, :]                                                 # state s \in S
-                    o = O[m, :]                                                 # observation o \in O
-
-                    # -------After DRILL actions: ------------------------------# siehe Table 1 in Overleaf
-                    if a == 0:                                                  # drill actions (a_t = 0)
-
-                        # # Scenario "Unveiled Non-Hiding Spot"   CORRESP VARS.:
-                        # ------------------------------------------------------
-                        # if new position...                               s[0]
-                        # ...(1) IS NOT treasure location                  s[1]
-                        # ...(2) IS NOT hiding spot,                       s[2:]
-                        # all observation, for which...
-                        # ...(3) tr_flag == 0,                             o[0]
-                        # ...(4) and node color == 1 (grey),               o[1]
-                        if (                                                    # Scenario "Unveiled Non-Hiding Spot":
-                                s[0] != s[1]                                    # (1) new position s[0] IS NOT treasure location s[1]
-                                and s[0] not in s[2:]                           # (2) new position s[0] IS NOT a hiding spot s[2:]
-                                and o[0] == 0                                   # (3) treasure flag o[0] is 0
-                                and o[1] == 1                                   # (4) node color o[1] is grey (1)
-                        ):
-                            rows[idx] = i                                       # possible observation's row index for Omega
-                            cols[idx] = m                                       # possible observation's col index for Omega
-                            idx += 1
-
-                        # Scenario "Unveiled Hiding Spot":        CORRESP VARS.:
-                        # ------------------------------------------------------
-                        # if new position...                               s[0]
-                        # ...(1) IS NOT treasure location                  s[1]
-                        # ...(2) IS hiding spot,                           s[2:]
-                        # all observation, for which...
-                        # ...(3) tr_flag == 0,                             o[0]
-                        # ...(4) and node color == 2 (blue),               o[1]
-                        if (                                                    # Scenario "Unveiled Hiding Spot"
-                                s[0] != s[1]                                    # (1) new position s[0] IS NOT treasure location s[1]
-                                and s[0] in s[2:]                               # (2) new position s[0] IS a hiding spot s[2:]
-                                and o[0] == 0                                   # (3) treasure flag o[0] is 0
-                                and o[1] == 2                                   # (4) node color o[1] is blue (2)
-                        ):
-                            rows[idx] = i                                       # possible observation's row index for Omega
-                            cols[idx] = m                                       # possible observation's col index for Omega
-                            idx += 1
-
-                        # All other observaton probabs remain 0 as initiated.   # Impossible Scenarios
-
-                # -------After STEP actions: -----------------------------------# siehe Table 2 in Overleaf
-                    else:                                                       # step actions (a_t = 1)
-
-                        # Scenario "No tr, stands on none-Hide":  CORRESP VARS.:
-                        # ------------------------------------------------------
-                        # if new position...                               s[0]
-                        # ...(1) IS NOT treasure location                  s[1]
-                        # ...(2) IS NOT hiding spot,                       s[2:]
-                        # all observation, for which...
-                        # ...(3) tr_flag == 0,                             o[0]
-                        # ...(4) and node color in [0, 1](black or grey),  o[1]
-                        if (                                                    # Scenario "No treasure, stands on None-Hiding Spot"
-                                s[0] != s[1]                                    # (1) new position s[0] IS NOT treasure location s[1]
-                                and s[0] not in s[2:]                           # (2) new position s[0] IS NOT a hiding spot s[2:]
-                                and o[0] == 0                                   # (3) treasure flag o[0] is 0
-                                and o[1] in [0, 1]                              # (4) node color o[1] is black (0) or gray (1)
-                        ):
-                            rows[idx] = i                                       # possible observation's row index for Omega
-                            cols[idx] = m                                       # possible observation's col index for Omega
-                            idx += 1
-
-                        # Scenario "No treasure, stands on Hide": CORRESP VARS.:
-                        # ------------------------------------------------------
-                        # if new position...                               s[0]
-                        # ...(1) IS NOT treasure location                  s[1]
-                        # ...(2) IS hiding spot,                           s[2:]
-                        # all observation, for which...
-                        # ...(3) tr_flag == 0,                             o[0]
-                        # ...(4) and node color in [0, 1](black or blue),  o[1]
-
-                        if (                                                    # Scenario "No treasure, stands Hiding Spot"
-                                s[0] != s[1]                                    # (1) new position s[0] IS NOT treasure location s[1]
-                                and s[0] in s[2:]                               # (2) new position s[0] IS a hiding spot s[2:]
-                                and o[0] == 0                                   # (3) treasure flag o[0] is 0
-                                and o[1] in [0, 2]                              # (4) node color o[1] is black (0) or blue (2)
-                        ):
-                            rows[idx] = i                                       # possible observation's row index for Omega
-                            cols[idx] = m                                       # possible observation's col index for Omega
-                            idx += 1
-
-                        # Scenario "Treasure, stands on Hide":    CORRESP VARS.:
-                        # ------------------------------------------------------
-                        # if new position...                               s[0]
-                        # ...(1) IS treasure location                      s[1]
-                        # ...(2) IS hiding spot,                           s[2:]
-                        # all observation, for which...
-                        # ...(3) tr_flag == 1,                             o[0]
-                        # ...(4) and node color in [0, 1](black or blue),  o[1]
-
-                        if (                                                    # Scenario "Treasure found, stands Hiding Spot"
-                                s[0] == s[1]                                    # (1) new position s[0] IS treasure location s[1]
-                                and s[0] in s[2:]                               # (2) new position s[0] IS a hiding spot s[2:]
-                                and o[0] == 1                                   # (3) treasure flag o[0] is 1
-                                and o[1] in [0, 2]                              # (4) node color o[1] is black (0) or blue (2)
-                        ):
-                            rows[idx] = i                                       # possible observation's row index for Omega
-                            cols[idx] = m                                       # possible observation's col index for Omega
-                            idx += 1
-
-                        # All other observaton probabs remain 0 as initiated.   # Impossible Scenarios
-
-                end = time.time()
-                print(f"Finished one state iteration, for , s = {s} i: {i}, idx: {idx}, "
-                      f"time needed: {humanreadable_time(end-start)}")
-
-            # Create action-dependent Pmega[p] as sparse matrix
-            Omega[p] = sp.csc_matrix(
-                ([1] * n_nonzeros,                                              # data values
-                 (rows, cols)),                                                 # row and column indices, for data values
-                shape=(n_s, n_o),                                               # shape of matrix
-                dtype=np.int8                                                   # datatype
-            )
-
-            # Save Omega[p] to disk
-            paths.save_arrays(
-                sparse=True,
-                file_name=Omega_matrix_name,
-                array=Omega[p],
-            )  # TODO: robust coden
-
-        # Load Omega[p] from disk, if existing
-        else:
+    Omega_matrix_name = matrix_names[p]                                         # Get action-specific Matrix label string for path variable
+
+    # Compute Omega[p] if not existing on disk
+    if not os.path.exists(os.path.join(paths.components, f"{Omega_matrix_name}.npz")):
+
+        table = th_omega_class_table(O, p)                                      # observation probabilities per state class
+
+        def build(start, stop):
+            """Row and col indices of the value 1 entries of the states start, ..., stop - 1"""
+            S_chunk    = S[start:stop]
+            s1_is_hide = th_is_hiding_spot(                                     # s[0] in s[2:], evaluated in one bitwise operation
+                th_s3_masks(S_chunk[:, 2:], theta.n_n), S_chunk[:, 0])
+            labels     = (s1_is_hide.astype(np.int8)                            # state classes (0: non-hiding spot, 1: hiding spot, 2: treasure location)
+                          + (S_chunk[:, 0] == S_chunk[:, 1])).astype(np.int8)
+            rows, cols = th_kernel_omega_entries(labels, table)                 # in order of states and observations
+            return {"rows": rows + start, "cols": cols}
+
+        checkpoints = os.path.join(paths.components, f"{Omega_matrix_name}.chunks")
+        chunks = th_checkpoint_build(
+            checkpoints, n_s, th_checkpoint_chunk(n_s // theta.n_n, chunk_states), build,
+            name=f"th_omega.{Omega_matrix_name}", meta={"p": int(p)},
+            target=os.path.join(paths.components, f"{Omega_matrix_name}.npz"))
+        if chunks is None:                                                      # saved by another process while waiting for the lock
             with open(os.path.join(paths.components, f"{Omega_matrix_name}.npz"), "rb") as file:
-                Omega[p] = sp.load_npz(file)
-
-    # Plot Omega[p]s, only if grid is of small dimension d = 2
-    if d == 2:
-        plot_color_map(
-            paths=paths,
-            Omega_drill=Omega[0].todense(),
-            Omega_step=Omega[1].todense(),
+                return sp.load_npz(file)
+        rows   = np.concatenate([chunk["rows"] for chunk in chunks])            # row indices
+        cols   = np.concatenate([chunk["cols"] for chunk in chunks])            # col indices
+
+        # Create action-dependent Pmega[p] as sparse matrix
+        Omega_p = sp.csc_matrix(
+            (np.ones(len(rows), dtype=np.int8),                                 # data values, states with s[0] == s[1] have no drill observations
+             (rows, cols)),                                                     # row and column indices, for data values
+            shape=(n_s, n_o),                                                   # shape of matrix
+            dtype=np.int8                                                       # datatype
         )
 
-    return Omega
+        # Save Omega[p] to disk
+        paths.save_arrays(
+            sparse=True,
+            file_name=Omega_matrix_name,
+            array=Omega_p,
+        )  # TODO: robust coden
+        th_checkpoint_clear(checkpoints)                                        # chunks are no longer needed
+
+    # Load Omega[p] from disk, if existing
+    else:
+        with open(os.path.join(paths.components, f"{Omega_matrix_name}.npz"), "rb") as file:
+            Omega_p = sp.load_npz(file)
+
+    return Omega_p
@@ -1,4 +1,7 @@
 import os
+import socket                                                                   # host name
+import numpy as np                                                              # numpy
+import scipy.sparse as sp                                                       # sparse matrices
 
 
 class th_paths():
@@ -45,9 +48,29 @@ class th_paths():
             /Figures directory        : to store figures
             /Data directory           : to store simulated data
         """
-        if not os.path.exists(self.components):
-            os.makedirs(self.components)                                        # Make /Components
-        if not os.path.exists(self.figures):
-            os.makedirs(self.figures)                                           # Make /Figures
-        if not os.path.exists(self.data):
-            os.makedirs(self.data)                                              # Make /Data
+        os.makedirs(self.components, exist_ok=True)                             # Make /Components
+        os.makedirs(self.figures, exist_ok=True)                                # Make /Figures
+        os.makedirs(self.data, exist_ok=True)                                   # Make /Data
+
+    def save_arrays(self, sparse, file_name, array):
+        """Function to save model component arrays to the components directory
+
+        Inputs
+            self            (obj) : paths object
+                .components (str) : paths to components directory
+            sparse         (bool) : if True, save as .npz sparse matrix, else as .npy array
+            file_name       (str) : file name without extension
+            array           (arr) : array or sparse matrix to be saved
+
+        Saves to disk
+            <file_name>.npz/.npy  : component array in /Components, written atomically
+        """
+        file_path = os.path.join(self.components, file_name)                    # path to component file
+        extension = "npz" if sparse else "npy"
+        tmp_path  = f"{file_path}.{socket.gethostname()}-{os.getpid()}.tmp"  # processes of all hosts never read partial files
+        with open(tmp_path, "wb") as file:
+            if sparse:
+                sp.save_npz(file, array)                                        # save sparse matrix
+            else:
+                np.save(file, array)                                            # save array
+        os.replace(tmp_path, f"{file_path}.{extension}")                        # atomic replacement
@@ -0,0 +1,240 @@
+from math import comb                                                           # binomial coefficient (exact integer)
+import itertools                                                                # iterables
+import os                                                                       # operating system interface
+import numpy as np                                                              # numpy
+from th_structure import th_structure                                           # structures
+
+
+# Available matrix representations per component family
+REPRESENTATIONS = {
+    "Phi": ["csc", "dense", "implicit"],
+    "Omega": ["csc", "dense", "class"]
+}
+
+# Build time per work unit in seconds, see th_plan_rates for calibration
+RATES = {
+    "S": 8e-6,                                                                  # per state (th_sets loops)
+    "Phi.csc": 1.2e-6,                                                          # per state (th_phi_a, th_kernels), including saving
+    "Phi.implicit": 3e-8,                                                       # per state (th_phi_implicit)
+    "Omega.csc": 1.5e-6,                                                        # per state (th_omega_a, th_kernels), including saving
+    "Omega.class": 7e-8,                                                        # per state (th_omega_labels)
+    "dense": 1e-9                                                               # per byte of densified matrices
+}
+
+
+def th_plan_sizes(theta):
+    """This function evaluates the exact integer set cardinalities of a task
+    configuration
+
+    Inputs
+        theta    (obj) : task parameter structure with required fields
+            .n_n (int) : number of nodes
+            .n_h (int) : number of hiding spots
+
+    Outputs
+        n_s3     (int) : number of unique hiding spot combination possibilities
+        n_s      (int) : state space cardinality
+        n_ident  (int) : number of states per s1 block, i.e. hypotheses (s2, s3)
+    """
+    n_s3    = comb(theta.n_n, theta.n_h)                                        # number of unique hiding spot combination possibilities
+    n_ident = n_s3 * theta.n_h                                                  # number of states per s1 block
+    n_s     = n_ident * theta.n_n                                               # state space cardinality
+    return n_s3, n_s, n_ident
+
+
+def th_plan_estimates(theta, rates=None):
+    """This function predicts the memory and build time of S and of each
+    Phi and Omega matrix under each representation
+
+    Inputs
+        theta    (obj) : task parameter structure with required fields
+            .n_n (int) : number of nodes
+            .n_h (int) : number of hiding spots
+        rates   (dict) : build time per work unit, defaults to RATES
+
+    Outputs
+        est     (dict) : dict of component -> representation -> dict with fields
+            bytes      (int) : resident size in bytes
+            peak_bytes (int) : additional bytes allocated temporarily while building
+            seconds    (flt) : predicted build time in seconds
+    """
+    rates            = RATES if rates is None else {**RATES, **rates}
+    n_n, n_h, n_o    = theta.n_n, theta.n_h, 5                                  # number of nodes, hiding spots and observations
+    n_s3, n_s, _     = th_plan_sizes(theta)                                     # set cardinalities
+    idx              = 4 if n_s < 2 ** 31 else 8                                # sparse index datatype size in bytes
+    est              = {}
+
+    # State set, n_s x (2 + n_h) int8 array, th_sets holds an unsorted copy while sorting
+    est["S"] = {"dense": {"bytes": n_s * (2 + n_h),
+                          "peak_bytes": n_s * (2 + n_h),
+                          "seconds": n_s * rates["S"]}}
+
+    # State-state transition matrices, n_s nonzero entries each
+    csc = {"bytes": n_s * (1 + idx) + (n_s + 1) * idx,
+           "peak_bytes": n_s * (16 + 1 + 2 * idx),                              # int64 rows and cols, coo conversion
+           "seconds": n_s * rates["Phi.csc"]}
+    phi = {"csc": csc,
+           "dense": {"bytes": n_s ** 2,
+                     "peak_bytes": csc["bytes"] + csc["peak_bytes"],
+                     "seconds": csc["seconds"] + n_s ** 2 * rates["dense"]},
+           "implicit": {"bytes": n_s * idx,
+                        "peak_bytes": n_s * 8,
+                        "seconds": n_s * rates["Phi.implicit"]}}
+    for name in ["Phi_drill", "Phi_minus_dim", "Phi_plus_one", "Phi_plus_dim", "Phi_minus_one"]:
+        est[name] = phi
+
+    # Observation matrices, drill observations only if not on the treasure, two observations after steps
+    for name, nnz in [("Omega_drill", n_s - n_s // n_n), ("Omega_step", 2 * n_s)]:
+        csc = {"bytes": nnz * (1 + idx) + (n_o + 1) * idx,
+               "peak_bytes": 2 * nnz * 8 + nnz * (1 + 2 * idx),                 # int64 rows and cols, coo conversion
+               "seconds": n_s * rates["Omega.csc"]}
+        est[name] = {"csc": csc,
+                     "dense": {"bytes": n_s * n_o,
+                               "peak_bytes": csc["bytes"] + csc["peak_bytes"],
+                               "seconds": csc["seconds"] + n_s * n_o * rates["dense"]}}
+
+    # State class labels, evaluated once and shared by both observation matrices, and 3 x n_o tables
+    est["Omega_drill"]["class"] = {"bytes": n_s + 3 * n_o,
+                                   "peak_bytes": n_s * (8 + 8 + 3),             # bitmasks, hiding spot bits, booleans
+                                   "seconds": n_s * rates["Omega.class"]}
+    est["Omega_step"]["class"]  = {"bytes": 3 * n_o, "peak_bytes": 0, "seconds": 0.0}
+    return est
+
+
+def th_plan(theta, budget_bytes=None, rates=None):
+    """This function plans the representations of the treasure hunt model
+    components of a task configuration. All combinations of Phi and Omega
+    representations are evaluated, and the combination with the smallest
+    predicted build time is selected among those whose resident memory,
+    plus the largest temporary build allocation, fits the memory budget.
+
+    Inputs
+        theta         (obj) : task parameter structure with required fields
+            .n_n      (int) : number of nodes
+            .n_h      (int) : number of hiding spots
+        budget_bytes  (int) : memory budget in bytes, None for no limit
+        rates        (dict) : build time per work unit, defaults to RATES
+
+    Outputs
+        plan              (obj) : plan structure with fields
+            .n_s3         (int) : number of unique hiding spot combination possibilities
+            .n_s          (int) : state space cardinality
+            .n_ident      (int) : number of states per s1 block
+            .estimates   (dict) : see th_plan_estimates
+            .representation (dict) : selected representation per family {"Phi": ..., "Omega": ...}
+            .bytes        (int) : predicted resident bytes of the selected plan
+            .peak_bytes   (int) : predicted peak bytes of the selected plan
+            .seconds      (flt) : predicted build time of the selected plan
+            .budget_bytes (int) : memory budget in bytes
+            .feasible    (bool) : whether any combination fits the memory budget
+
+    Authors - Belinda Fleischmann, Dirk Ostwald
+    """
+    plan                             = th_structure()                           # plan structure initialization
+    plan.n_s3, plan.n_s, plan.n_ident = th_plan_sizes(theta)                    # exact set cardinalities
+    plan.estimates                   = th_plan_estimates(theta, rates)          # per component and representation estimates
+    plan.budget_bytes                = budget_bytes                             # memory budget
+
+    def total(choice):
+        """Predicted resident bytes, peak bytes and seconds of a representation choice"""
+        chosen = [(name, e["dense"] if name == "S" else e[choice[name.split("_")[0]]])
+                  for name, e in plan.estimates.items()]
+        resident = sum(c["bytes"] for _, c in chosen)
+        peak     = resident + max(c["peak_bytes"] for _, c in chosen)
+        seconds  = sum(c["seconds"] for _, c in chosen)
+        return resident, peak, seconds
+
+    candidates = []
+    for reps in itertools.product(*REPRESENTATIONS.values()):                   # representation combinations
+        choice                  = dict(zip(REPRESENTATIONS.keys(), reps))
+        resident, peak, seconds = total(choice)
+        if budget_bytes is None or peak <= budget_bytes:
+            candidates.append((seconds, peak, choice))
+
+    plan.feasible = len(candidates) > 0
+    if not plan.feasible:                                                       # report the smallest combination
+        candidates = [(total(dict(zip(REPRESENTATIONS.keys(), reps)))[1], 0,
+                       dict(zip(REPRESENTATIONS.keys(), reps)))
+                      for reps in itertools.product(*REPRESENTATIONS.values())]
+    plan.representation = min(candidates, key=lambda c: (c[0], c[1]))[2]
+    plan.bytes, plan.peak_bytes, plan.seconds = total(plan.representation)
+    return plan
+
+
+def th_plan_workers(plan, cpus=None):
+    """This function evaluates the number of concurrent component builds of
+    a plan, see th_components_build, i.e. the largest number of Phi and
+    Omega matrices whose temporary build allocations fit into the memory
+    budget beyond the resident components, limited by the number of CPUs
+
+    Inputs
+        plan      (obj) : plan structure, see th_plan
+        cpus      (int) : number of CPUs, None for os.cpu_count()
+
+    Outputs
+        workers   (int) : number of concurrent builds, at least one
+    """
+    cpus  = (os.cpu_count() or 1) if cpus is None else cpus
+    peaks = sorted((e[plan.representation[name.split("_")[0]]]["peak_bytes"]    # temporary allocations per matrix
+                    for name, e in plan.estimates.items() if name != "S"), reverse=True)
+    if plan.budget_bytes is None:
+        return max(1, min(cpus, len(peaks)))
+    free    = plan.budget_bytes - plan.bytes                                    # memory beyond the resident components
+    workers = 1
+    while workers < min(cpus, len(peaks)) and sum(peaks[:workers + 1]) <= free:
+        workers += 1
+    return workers
+
+
+def th_plan_report(plan):
+    """This function formats a plan as a human readable table
+
+    Inputs
+        plan      (obj) : plan structure, see th_plan
+
+    Outputs
+        report    (str) : plan report
+    """
+    def hr_bytes(n):
+        for unit in ["B", "KiB", "MiB", "GiB", "TiB"]:
+            if n < 1024 or unit == "TiB":
+                return f"{n:.1f} {unit}"
+            n /= 1024
+
+    lines = [f"n_s3 = {plan.n_s3}, n_s = {plan.n_s}, n_s / n_n = {plan.n_ident}"]
+    for name, estimates in plan.estimates.items():
+        family = "S" if name == "S" else name.split("_")[0]
+        for rep, e in estimates.items():
+            chosen = "*" if family == "S" or plan.representation[family] == rep else " "
+            lines.append(f" {chosen} {name:<14} {rep:<9} {hr_bytes(e['bytes']):>12}"
+                         f" (+{hr_bytes(e['peak_bytes']):>11} build) {e['seconds']:12.2f} sec.")
+    budget = "none" if plan.budget_bytes is None else hr_bytes(plan.budget_bytes)
+    lines.append(f"Selected {plan.representation}: {hr_bytes(plan.bytes)} resident, "
+                 f"{hr_bytes(plan.peak_bytes)} peak, {plan.seconds:.2f} sec., budget: {budget}"
+                 + ("" if plan.feasible else " -- INFEASIBLE"))
+    return "\n".join(lines)
+
+
+def th_plan_rates(results):
+    """This function calibrates build time rates from th_bench results of
+    csc component builds
+
+    Inputs
+        results  (list) : list of th_bench result dicts
+
+    Outputs
+        rates    (dict) : build time per work unit, see RATES
+    """
+    units = {
+        "th_sets": ("S", lambda theta, n_s: n_s),
+        "th_phi": ("Phi.csc", lambda theta, n_s: 5 * n_s),
+        "th_omega": ("Omega.csc", lambda theta, n_s: 2 * n_s)
+    }
+    samples = {}
+    for r in results:
+        if r["stage"] in units and r["status"] == "ok" and r["seconds"] > 0.1:
+            theta              = th_structure()
+            theta.n_n, theta.n_h = r["d"] ** 2, r["n_h"]
+            key, unit          = units[r["stage"]]
+            samples.setdefault(key, []).append(r["seconds"] / unit(theta, r["n_s"]))
+    return {key: float(np.median(values)) for key, values in samples.items()}
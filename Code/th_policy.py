@@ -0,0 +1,284 @@
+"""
+This module evaluates a Bayes-optimal policy of small task configurations,
+e.g. d = 2 and d = 3, by value iteration over the agent's information states
+and serializes it as a lookup table, from which a policy agent decides in
+constant time.
+
+Within a round, the posterior over the hypotheses (s2, s3) is uniform over
+the hypotheses consistent with the known hiding spot status of the nodes
+and with the nodes visited in the round, which are not the treasure
+location. The information state
+
+    (k, s1, hide, empty, visited)
+
+thus determines the posterior, where k is the number of remaining actions
+that can be rewarded, s1 the current position, hide and empty the bitmasks
+of the nodes known to be hiding spots (blue nodes and previous treasure
+locations) and non-hiding spots (grey nodes), and visited the bitmask of
+the nodes visited in the round. Empty nodes are never the treasure location,
+such that visited is canonicalized to the non-empty nodes. The posterior
+counts of the hypotheses are binomial coefficients of the number of nodes of
+unknown status, such that no hypotheses are enumerated.
+
+The value of an information state is the maximal probability of finding the
+treasure with the k remaining actions. It is evaluated by backward
+induction over k, i.e. value iteration over the finite horizon, on the
+information states reachable from the round start states. Ties are broken
+in favor of the first action of A, i.e. drilling. The policy is optimal in
+the first round and in rounds following a round in which the treasure was
+found. After a round without treasure, the treasure location of that round
+was among the unvisited hiding spots, such that the posterior over s3 is no
+longer uniform and the policy is a uniform-posterior approximation.
+
+The table holds the information states reachable under the policy from all
+start states of the n_c rounds of a game, encoded as int64 keys by
+th_policy_key. It is saved to Components/<config>/policy_rounds-<n_c>_trials-<n_t>.npz.
+
+Usage (from the Code directory)
+    python th_policy.py [--dim 3] [--hide 2] [--rounds 1] [--trials 12]
+
+Authors - Belinda Fleischmann, Dirk Ostwald
+"""
+import argparse                                                                 # command line arguments
+import os                                                                       # operating system interface
+import socket                                                                   # host name
+from functools import lru_cache                                                 # memoization of values
+from math import comb                                                           # binomial coefficient (exact integer)
+import numpy as np                                                              # numpy
+from th_instrument import instrument                                            # timers, counters and progress reports
+from th_structure import th_structure                                           # structures
+
+
+def th_policy_key(theta, k, s1, hide, empty, visited):
+    """This function encodes an information state as an integer key
+
+    Inputs
+        theta    (obj) : task parameter structure with required fields
+            .n_n (int) : number of nodes
+        k        (int) : number of remaining actions that can be rewarded
+        s1       (int) : current position
+        hide     (int) : bitmask of the nodes known to be hiding spots
+        empty    (int) : bitmask of the nodes known to be non-hiding spots
+        visited  (int) : bitmask of the nodes visited in the current round
+
+    Outputs
+        key      (int) : information state key
+    """
+    n = theta.n_n
+    return ((((k * n + s1 - 1) << n | hide) << n | empty) << n) | (visited & ~empty)
+
+
+def th_policy_counts(theta, hide, empty, visited):
+    """This function evaluates the number of hypotheses (s2, s3) consistent
+    with an information state per treasure location
+
+    Inputs
+        theta    (obj) : task parameter structure with required fields
+            .n_n (int) : number of nodes
+            .n_h (int) : number of hiding spots
+        hide     (int) : bitmask of the nodes known to be hiding spots
+        empty    (int) : bitmask of the nodes known to be non-hiding spots
+        visited  (int) : bitmask of the nodes visited in the current round
+
+    Outputs
+        n_hide   (int) : number of hypotheses per unvisited known hiding spot
+        n_unknown (int): number of hypotheses per unvisited node of unknown status
+        total    (int) : number of consistent hypotheses
+    """
+    full      = (1 << theta.n_n) - 1                                            # all nodes
+    u         = theta.n_n - hide.bit_count() - empty.bit_count()                # number of nodes of unknown status
+    r         = theta.n_h - hide.bit_count()                                    # number of unknown hiding spots
+    n_hide    = comb(u, r) if r >= 0 else 0                                     # s3 combinations containing a known hiding spot
+    n_unknown = comb(u - 1, r - 1) if r >= 1 and u >= 1 else 0                  # s3 combinations containing a given unknown node
+    total     = ((hide & ~visited).bit_count() * n_hide
+                 + (full & ~(hide | empty | visited)).bit_count() * n_unknown)
+    return n_hide, n_unknown, total
+
+
+def th_policy_solve(theta, A):
+    """This function evaluates the values and optimal actions of the
+    information states by backward induction over the number of remaining
+    actions, see the module docstring
+
+    Inputs
+        theta    (obj) : task parameter structure with required fields
+            .d   (int) : dimension of the square grid world
+            .n_n (int) : number of nodes
+            .n_h (int) : number of hiding spots
+        A        (arr) : 5 x 1 array of action values, in order of tie-breaking
+
+    Outputs
+        value    (fun) : function value(k, s1, hide, empty, visited) returning the tuple (probability, action)
+    """
+    d, n_n = theta.d, theta.n_n
+    A      = [int(a) for a in A]
+
+    def targets(s1):
+        """Available step actions and target positions of a position, as by
+        th_task.identify_A_giv_s1"""
+        out = []
+        for a in A:
+            if a == 0:
+                continue
+            new_s1 = s1 + a
+            if (1 <= new_s1 <= n_n and not (a == -1 and (s1 - 1) % d == 0)
+                    and not (a == 1 and s1 % d == 0)):
+                out.append((a, new_s1))
+        return out
+    steps = {s1: dict(targets(s1)) for s1 in range(1, n_n + 1)}
+
+    @lru_cache(maxsize=None)
+    def value(k, s1, hide, empty, visited):
+        """Maximal probability of finding the treasure with k actions and the
+        first optimal action"""
+        if k == 0:
+            return 0.0, A[0]
+        n_hide, n_unknown, total = th_policy_counts(theta, hide, empty, visited)
+        if total == 0:                                                          # inconsistent information state
+            return 0.0, A[0]
+        best, best_a = -1.0, A[0]
+        bit = 1 << (s1 - 1)
+        for a in A:
+            if a == 0:                                                          # drill action
+                if (hide | empty) & bit:                                        # status known, the action is void
+                    q = value(k - 1, s1, hide, empty, visited)[0]
+                else:
+                    p = th_policy_counts(theta, hide | bit, empty, visited)[2] / total
+                    q = ((p * value(k - 1, s1, hide | bit, empty, visited)[0] if p > 0 else 0.0)
+                         + ((1 - p) * value(k - 1, s1, hide, empty | bit, visited & ~bit)[0] if p < 1 else 0.0))
+            else:                                                               # step action
+                target = steps[s1].get(a)
+                if target is None:                                              # beyond the grid border
+                    continue
+                new = 1 << (target - 1)
+                if visited & new or empty & new:                                # not the treasure location
+                    p = 0.0
+                else:
+                    p = (n_hide if hide & new else n_unknown) / total           # treasure found
+                q = p + ((1 - p) * value(k - 1, target, hide, empty, (visited | new) & ~empty)[0] if p < 1 else 0.0)
+            if q > best + 1e-12:
+                best, best_a = q, a
+        return best, best_a
+
+    return value
+
+
+def th_policy_table(theta, A):
+    """This function evaluates the policy table of the information states
+    reachable under the optimal policy from the start states of all rounds
+
+    Inputs
+        theta    (obj) : task parameter structure with required fields
+            .d   (int) : dimension of the square grid world
+            .n_n (int) : number of nodes
+            .n_h (int) : number of hiding spots
+            .n_c (int) : number of rounds per game
+            .n_t (int) : maximal number of actions per round
+        A        (arr) : 5 x 1 array of action values
+
+    Outputs
+        keys     (arr) : n x 0 sorted int64 array of information state keys, see th_policy_key
+        actions  (arr) : n x 0 int8 array of optimal actions
+        values   (arr) : n x 0 float64 array of probabilities of finding the treasure in the round
+    """
+    value  = th_policy_solve(theta, A)
+    k_0    = theta.n_t - 1                                                      # the observation after the last action is not evaluated
+    table  = {}
+    starts = {(s1, 0, 0, 1 << (s1 - 1)) for s1 in range(1, theta.n_n + 1)}      # game start states
+    with instrument.timer("th_policy_table"):
+        for _ in range(theta.n_c):                                              # round iterations
+            layer, ends = starts, set()
+            for k in range(k_0, -1, -1):                                        # follow the policy
+                following = set()
+                for s1, hide, empty, visited in layer:
+                    q, a = value(k, s1, hide, empty, visited)
+                    table[th_policy_key(theta, k, s1, hide, empty, visited)] = (a, q)
+                    bit = 1 << (s1 - 1)
+                    if k == 0:                                                  # the last action is taken, but not rewarded
+                        visited = 0                                             # treasure location unobserved
+                    if a == 0 and not (hide | empty) & bit:                     # drill action
+                        successors = [(s1, hide | bit, empty, visited), (s1, hide, empty | bit, visited & ~bit)]
+                    elif a == 0:                                                # void drill action
+                        successors = [(s1, hide, empty, visited)]
+                    else:                                                       # step action
+                        target = s1 + a
+                        new    = 1 << (target - 1)
+                        n_hide, n_unknown, _ = th_policy_counts(theta, hide, empty, visited)
+                        if k > 0 and not (visited | empty) & new and (n_hide if hide & new else n_unknown) > 0:
+                            ends.add((target, hide | new, empty))               # treasure found, target is a hiding spot
+                        successors = [(target, hide, empty, (visited | new) & ~empty)]
+                    for successor in successors:
+                        if th_policy_counts(theta, *successor[1:])[2] == 0:     # no consistent hypothesis
+                            continue
+                        if k > 0:
+                            following.add(successor)
+                        else:
+                            ends.add(successor[:3])                             # round ends without treasure
+                layer = following
+            starts = {(s1, hide, empty, (1 << (s1 - 1)) & ~empty) for s1, hide, empty in ends}
+        instrument.count("th_policy_table.states", value.cache_info().currsize)
+
+    keys    = np.array(sorted(table), dtype=np.int64)
+    actions = np.array([table[key][0] for key in keys.tolist()], dtype=np.int8)
+    values  = np.array([table[key][1] for key in keys.tolist()], dtype=np.float64)
+    return keys, actions, values
+
+
+def th_policy(theta, A, directory):
+    """This function loads the policy table of a task configuration, or
+    evaluates and saves it, if it does not exist
+
+    Inputs
+        theta    (obj) : task parameter structure, see th_policy_table
+        A        (arr) : 5 x 1 array of action values
+        directory (str): component directory, e.g. Components/dim-<d>_hide-<n_h>
+
+    Outputs
+        policy   (obj) : policy structure with fields
+            .table (dict) : dict of information state key -> optimal action
+            .d     (int)  : dimension of the square grid world
+            .n_h   (int)  : number of hiding spots
+            .n_c   (int)  : number of rounds per game
+            .n_t   (int)  : maximal number of actions per round
+    """
+    path = os.path.join(directory, f"policy_rounds-{theta.n_c}_trials-{theta.n_t}.npz")
+    if not os.path.exists(path):
+        keys, actions, values = th_policy_table(theta, A)
+        tmp_path = f"{path}.{socket.gethostname()}-{os.getpid()}.tmp"           # per process, as by th_queue.th_queue_write
+        with open(tmp_path, "wb") as file:
+            np.savez_compressed(file, keys=keys, actions=actions, values=values)
+        os.replace(tmp_path, path)                                              # atomic, if built by concurrent processes
+    policy       = th_structure()                                               # configuration the table was evaluated for
+    policy.d     = theta.d
+    policy.n_h   = theta.n_h
+    policy.n_c   = theta.n_c
+    policy.n_t   = theta.n_t
+    with np.load(path) as npz:
+        policy.table = dict(zip(npz["keys"].tolist(), npz["actions"].tolist()))
+    return policy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Optimal policy table of a small task configuration")
+    parser.add_argument("--dim", type=int, default=3, help="dimension of the square grid world")
+    parser.add_argument("--hide", type=int, default=2, help="number of hiding spots")
+    parser.add_argument("--rounds", type=int, default=1, help="number of rounds per game")
+    parser.add_argument("--trials", type=int, default=12, help="maximal number of actions per round")
+    args = parser.parse_args(argv)
+
+    theta     = th_structure()                                                  # task parameter structure initialization
+    theta.d   = args.dim                                                        # dimension of the square grid world
+    theta.n_n = theta.d ** 2                                                    # number of grid world cells/nodes
+    theta.n_h = args.hide                                                       # number of treasure hiding spots
+    theta.n_c = args.rounds                                                     # number of rounds per game
+    theta.n_t = args.trials                                                     # maximal number of actions per round
+    directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "Components", f"dim-{theta.d}_hide-{theta.n_h}")
+    os.makedirs(directory, exist_ok=True)
+    A         = np.array([0, -theta.d, 1, theta.d, -1])                         # actions, as by th_sets
+    policy    = th_policy(theta, A, directory)
+    print(f"{len(policy.table)} information states in the policy table of dim-{theta.d}_hide-{theta.n_h}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+This Python script distributes treasure hunt game simulations across worker
+processes on one or several hosts that share a file system, without a
+scheduler. Jobs are JSON files in a queue directory with the subdirectories
+
+    pending/<job>.json            : submitted jobs
+    claimed/<job>@<worker>.json   : jobs being simulated by a worker
+    done/<job>.json               : simulated jobs
+    failed/<job>.json             : jobs whose simulation raised an error
+
+A worker claims a job by renaming it from pending/ to claimed/, which
+succeeds for exactly one worker, and touches the claimed file as a heartbeat
+while simulating. Claimed files whose heartbeat is older than a timeout
+belong to stalled workers and are renamed back to pending/ by any worker.
+The behavioral data of each job are written atomically to the Data layout
+of th_sim, i.e. Data/<label>_dim-<d>_hide-<n_h>/sub-<subject>/beh/. Since
+jobs are seeded, a job simulated twice after a reclaim yields the same
+file. The hosts' clocks are assumed to be synchronized to well within the
+timeout.
+
+Usage (from the repository root)
+    python Code/th_queue.py submit --queue Queue --dim 3 --hide 2 --subjects 100 [--label queue] [--agent C1]
+    python Code/th_queue.py work --queue Queue [--data Data] [--heartbeat 10] [--timeout 60]
+    python Code/th_queue.py status --queue Queue
+
+Authors - Belinda Fleischmann, Dirk Ostwald
+"""
+import argparse                                                                 # command line arguments
+import json                                                                     # JSON serialization
+import os                                                                       # operating system interface
+import socket                                                                   # host name
+import threading                                                                # heartbeat thread
+import time                                                                     # wall time
+import traceback                                                                # error reports
+import numpy as np                                                              # numpy
+from th_structure import th_structure                                           # structures
+from th_paths import th_paths                                                   # path variables
+from th_cards import th_cards                                                   # task sets' cardinalities
+from th_plan import th_plan                                                     # component representation planner
+from th_sets import th_sets                                                     # task/agent model sets generator
+from th_phi import th_phi                                                       # action-dependent state-state transition probability matrices
+from th_omega import th_omega                                                   # action-dependent state conditional observation probability matrices
+from th_index import th_inverted_index                                          # node to hypotheses inverted index
+from th_sim_game import th_sim_game                                             # game simulation routine
+
+
+# Queue subdirectories
+QUEUE_DIRS = ["pending", "claimed", "done", "failed"]
+
+# Task components of this worker process, keyed by (d, n_h, n_c, n_t)
+configs = {}
+
+
+def th_queue_write(path, text):
+    """This function writes a text file atomically, i.e. readers see either
+    no file or the complete file"""
+    tmp_path = f"{path}.{socket.gethostname()}-{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf8") as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+def th_queue_init(queue_dir):
+    """This function creates the queue subdirectories, if not existing"""
+    for name in QUEUE_DIRS:
+        os.makedirs(os.path.join(queue_dir, name), exist_ok=True)
+
+
+def th_queue_jobs(d, n_h, n_subjects, label="queue", agent="C1", n_c=1, n_t=12, seed=0):
+    """This function evaluates the simulation jobs of a campaign, one job per
+    subject
+
+    Inputs
+        d           (int) : dimensionality of the square grid world
+        n_h         (int) : number of hiding spots
+        n_subjects  (int) : number of subjects
+        label       (str) : output directory label
+        agent       (str) : agent label
+        n_c         (int) : number of rounds per game
+        n_t         (int) : maximal number of actions per round
+        seed        (int) : random seed of the first subject, subject i is seeded with seed + i
+
+    Outputs
+        jobs       (list) : list of job dicts with the input fields and
+            id      (str) : job name <label>_dim-<d>_hide-<n_h>_sub-<subject>
+            subject (str) : subject label
+            p       (int) : participant index
+    """
+    jobs = []
+    for i in range(n_subjects):
+        subject = f"{agent}n{i + 1:05d}"                                        # alphanumeric subject label
+        jobs.append({"id": f"{label}_dim-{d}_hide-{n_h}_sub-{subject}", "label": label,
+                     "d": d, "n_h": n_h, "n_c": n_c, "n_t": n_t, "agent": agent,
+                     "subject": subject, "p": i + 1, "seed": seed + i})
+    return jobs
+
+
+def th_queue_submit(queue_dir, jobs):
+    """This function submits jobs to the queue. Jobs that are pending,
+    claimed or done are not submitted again.
+
+    Inputs
+        queue_dir   (str) : path to queue directory
+        jobs       (list) : list of job dicts, see th_queue_jobs
+
+    Outputs
+        n_submitted (int) : number of submitted jobs
+    """
+    th_queue_init(queue_dir)
+    known = {name.split("@")[0].removesuffix(".json")
+             for sub in ["pending", "claimed", "done"]
+             for name in os.listdir(os.path.join(queue_dir, sub))}
+    n_submitted = 0
+    for job in jobs:
+        if job["id"] not in known:
+            th_queue_write(os.path.join(queue_dir, "pending", f"{job['id']}.json"), json.dumps(job))
+            n_submitted += 1
+    return n_submitted
+
+
+def th_queue_claim(queue_dir, worker):
+    """This function claims a pending job by renaming it to the claimed
+    directory. Renaming is atomic, such that each job is claimed by exactly
+    one worker.
+
+    Inputs
+        queue_dir   (str) : path to queue directory
+        worker      (str) : worker name
+
+    Outputs
+        job        (dict) : claimed job, None if no job is pending
+        path        (str) : path to the claimed job file
+    """
+    pending = os.path.join(queue_dir, "pending")
+    for name in sorted(os.listdir(pending)):
+        if not name.endswith(".json"):                                          # temporary files of submitting processes
+            continue
+        path = os.path.join(queue_dir, "claimed", f"{name.removesuffix('.json')}@{worker}.json")
+        try:
+            os.rename(os.path.join(pending, name), path)
+        except FileNotFoundError:                                               # claimed by another worker
+            continue
+        os.utime(path)                                                          # first heartbeat, renaming keeps the modification time
+        with open(path, encoding="utf8") as file:
+            return json.load(file), path
+    return None, None
+
+
+def th_queue_reclaim(queue_dir, timeout):
+    """This function returns the jobs of stalled workers, i.e. claimed jobs
+    whose heartbeat is older than the timeout, to the pending directory
+
+    Inputs
+        queue_dir   (str) : path to queue directory
+        timeout     (flt) : heartbeat timeout in seconds
+
+    Outputs
+        reclaimed  (list) : names of the reclaimed jobs
+    """
+    claimed   = os.path.join(queue_dir, "claimed")
+    reclaimed = []
+    now       = time.time()
+    for name in os.listdir(claimed):
+        path = os.path.join(claimed, name)
+        try:
+            stalled = now - os.stat(path).st_mtime > timeout
+            if stalled:
+                job_name = name.split("@")[0]
+                os.rename(path, os.path.join(queue_dir, "pending", f"{job_name}.json"))
+                reclaimed.append(job_name)
+        except FileNotFoundError:                                               # finished or reclaimed by another worker
+            continue
+    return reclaimed
+
+
+class th_queue_heartbeat:
+    def __init__(self, path, interval):
+        """This function encodes the instantiation method of the heartbeat
+        class. A background thread touches the claimed job file every
+        interval seconds, until stopped. If the file was reclaimed by another
+        worker, the heartbeat stops and is marked as lost.
+
+        Inputs
+            path       (str) : path to the claimed job file
+            interval   (flt) : heartbeat interval in seconds
+        """
+        self.path     = path                                                    # claimed job file
+        self.interval = interval                                                # heartbeat interval
+        self.lost     = False                                                   # job reclaimed by another worker
+        self.stopped  = threading.Event()
+        self.thread   = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """Heartbeat loop"""
+        while not self.stopped.wait(self.interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                self.lost = True
+                return
+
+    def stop(self):
+        """This function stops the heartbeat thread"""
+        self.stopped.set()
+        self.thread.join()
+
+
+def th_queue_components(job):
+    """This function returns the task parameters and components of a job's
+    configuration, built or loaded once per worker process
+
+    Inputs
+        job       (dict) : job, see th_queue_jobs
+
+    Outputs
+        theta      (obj) : task parameter structure
+        t_init     (obj) : task initialization structure
+        index      (obj) : node to hypotheses inverted index
+    """
+    key = (job["d"], job["n_h"], job["n_c"], job["n_t"])
+    if key not in configs:
+        theta         = th_structure()                                          # task parameter structure initialization
+        theta.d       = job["d"]                                                # dimension of the square grid world
+        theta.n_n     = theta.d ** 2                                            # number of grid world cells/nodes
+        theta.n_h     = job["n_h"]                                              # number of treasure hiding spots
+        theta.d_s     = 2 + theta.n_h                                           # state vector dimension
+        theta.n_c     = job["n_c"]                                              # number of rounds per game
+        theta.n_t     = job["n_t"]                                              # maximal number of actions per round
+        theta         = th_cards(theta)                                         # task sets' cardinalities
+        theta.tau     = np.nan                                                  # post-decision noise parameter
+        theta.lambda_ = np.nan                                                  # weighting parameter for agent A3
+
+        plan          = th_plan(theta)                                          # component representation plan
+        paths         = th_paths(theta, out_directory_label=job["label"])       # components are shared, written atomically
+        th_sets(theta, paths)
+        t_init        = th_structure()                                          # task initialization structure
+        t_init.theta  = theta
+        t_init.S      = np.load(os.path.join(paths.components, "S.npy"))
+        t_init.O      = np.load(os.path.join(paths.components, "O.npy"))
+        t_init.A      = np.load(os.path.join(paths.components, "A.npy"))
+        t_init.R      = np.load(os.path.join(paths.components, "R.npy"))
+        t_init.Phi    = th_phi(t_init.S, t_init.A, theta, paths, plan.representation["Phi"])
+        t_init.Omega  = th_omega(t_init.S, t_init.O, theta, paths, plan.representation["Omega"])
+        configs[key]  = (theta, t_init, th_inverted_index(theta))
+    return configs[key]
+
+
+def th_queue_run(job, data_dir="Data"):
+    """This function simulates the game of a job and writes the behavioral
+    data to Data/<label>_dim-<d>_hide-<n_h>/sub-<subject>/beh/sub-<subject>_beh.tsv
+
+    Inputs
+        job       (dict) : job, see th_queue_jobs
+        data_dir   (str) : path to Data directory
+
+    Outputs
+        data_path  (str) : path to the behavioral data file
+    """
+    theta, t_init, index = th_queue_components(job)
+
+    a_init        = th_structure()                                              # agent initialization structure
+    a_init.a_name = job["agent"]                                                # agent label
+    a_init.Omega  = t_init.Omega                                                # action-dependent state conditional observation probability matrices
+    a_init.index  = index                                                       # node to hypotheses inverted index
+    m_init        = th_structure()                                              # behavioral model initialization structure
+    m_init.theta  = theta
+
+    sim           = th_structure()                                              # game simulation structure initialization
+    sim.p         = job["p"]                                                    # participant index
+    sim.g         = 1                                                           # game index
+    sim.mode      = "simulation"                                                # simulation mode
+    sim.theta     = theta
+    sim.t_init    = t_init
+    sim.a_init    = a_init
+    sim.m_init    = m_init
+    np.random.seed(job["seed"])                                                 # reproducible, if simulated twice
+    sim           = th_sim_game(sim)
+
+    config    = f"{job['label']}_dim-{job['d']}_hide-{job['n_h']}"
+    sub_dir   = os.path.join(data_dir, config, f"sub-{job['subject']}", "beh")  # Data layout of th_sim
+    os.makedirs(sub_dir, exist_ok=True)
+    data_path = os.path.join(sub_dir, f"sub-{job['subject']}_beh.tsv")
+    th_queue_write(data_path, sim.data.to_csv(sep="\t", na_rep="nan", index=False))
+    return data_path
+
+
+def th_queue_work(queue_dir, data_dir="Data", worker=None, heartbeat=10.0, timeout=60.0,
+                  max_jobs=None, poll=1.0):
+    """This function runs a worker: it reclaims the jobs of stalled workers,
+    claims and simulates pending jobs with a heartbeat, and moves them to
+    the done or failed directory. It returns when no job is pending or
+    claimed, or after max_jobs jobs.
+
+    Inputs
+        queue_dir   (str) : path to queue directory
+        data_dir    (str) : path to Data directory
+        worker      (str) : worker name, None for <host>-<pid>
+        heartbeat   (flt) : heartbeat interval in seconds
+        timeout     (flt) : heartbeat timeout in seconds, after which jobs are reclaimed
+        max_jobs    (int) : maximal number of jobs, None for no limit
+        poll        (flt) : waiting time in seconds, if jobs are claimed by other workers only
+
+    Outputs
+        counts     (dict) : number of done, failed, lost and reclaimed jobs of this worker
+    """
+    worker = f"{socket.gethostname()}-{os.getpid()}" if worker is None else worker
+    counts = {"done": 0, "failed": 0, "lost": 0, "reclaimed": 0}
+    th_queue_init(queue_dir)
+    while max_jobs is None or counts["done"] + counts["failed"] < max_jobs:
+        counts["reclaimed"] += len(th_queue_reclaim(queue_dir, timeout))
+        job, path = th_queue_claim(queue_dir, worker)
+        if job is None:
+            if not os.listdir(os.path.join(queue_dir, "claimed")):              # campaign finished
+                break
+            time.sleep(poll)                                                    # claimed jobs may stall and be reclaimed
+            continue
+
+        beat = th_queue_heartbeat(path, heartbeat)
+        try:
+            th_queue_run(job, data_dir)
+            outcome = "done"
+        except Exception:                                                       # record the error, continue with the next job
+            job["error"] = traceback.format_exc()
+            th_queue_write(path, json.dumps(job))
+            outcome = "failed"
+        finally:
+            beat.stop()
+
+        try:
+            os.rename(path, os.path.join(queue_dir, outcome, f"{job['id']}.json"))
+            counts[outcome] += 1
+        except FileNotFoundError:                                               # reclaimed meanwhile, simulated again by another worker
+            counts["lost"] += 1
+    return counts
+
+
+def th_queue_status(queue_dir):
+    """This function counts the jobs per queue directory"""
+    return {name: sum(entry.endswith(".json") for entry in os.listdir(os.path.join(queue_dir, name)))
+            for name in QUEUE_DIRS if os.path.isdir(os.path.join(queue_dir, name))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="File-based work queue for treasure hunt game simulations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="submit one job per subject")
+    submit.add_argument("--queue", default="Queue", help="queue directory")
+    submit.add_argument("--dim", type=int, required=True, help="dimension of the square grid world")
+    submit.add_argument("--hide", type=int, required=True, help="number of hiding spots")
+    submit.add_argument("--subjects", type=int, required=True, help="number of subjects")
+    submit.add_argument("--label", default="queue", help="output directory label")
+    submit.add_argument("--agent", default="C1", help="agent label")
+    submit.add_argument("--rounds", type=int, default=1, help="number of rounds per game")
+    submit.add_argument("--trials", type=int, default=12, help="maximal number of actions per round")
+    submit.add_argument("--seed", type=int, default=0, help="random seed of the first subject")
+    work = commands.add_parser("work", help="run a worker until the queue is empty")
+    work.add_argument("--queue", default="Queue", help="queue directory")
+    work.add_argument("--data", default="Data", help="Data directory")
+    work.add_argument("--heartbeat", type=float, default=10.0, help="heartbeat interval in seconds")
+    work.add_argument("--timeout", type=float, default=60.0, help="heartbeat timeout in seconds")
+    work.add_argument("--max-jobs", type=int, default=None, help="maximal number of jobs")
+    status = commands.add_parser("status", help="count jobs per queue directory")
+    status.add_argument("--queue", default="Queue", help="queue directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "submit":
+        jobs = th_queue_jobs(args.dim, args.hide, args.subjects, args.label, args.agent,
+                             args.rounds, args.trials, args.seed)
+        print(f"{th_queue_submit(args.queue, jobs)} of {len(jobs)} jobs submitted to {args.queue}")
+    elif args.command == "work":
+        start  = time.perf_counter()
+        counts = th_queue_work(args.queue, args.data, heartbeat=args.heartbeat,
+                               timeout=args.timeout, max_jobs=args.max_jobs)
+        print(f"{counts} in {time.perf_counter() - start:.1f} s")
+    else:
+        print(th_queue_status(args.queue))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+from math import comb                                                           # binomial coefficient
 import numpy as np                                                              # numpy
 import more_itertools as it                                                     # iterables
 
@@ -58,7 +59,7 @@ def th_sets(theta, paths):
                 S[idx:idx + S_s2.shape[0], :] = S_s2                            # sorted state value array update
                 idx = idx + S_s2.shape[0]                                       # row index update
 
-        np.save(os.path.join(paths.components, "S"), S)                         # save to disc
+        paths.save_arrays(sparse=False, file_name="S", array=S)                 # save to disc
 
     # Observation set
     O = np.array(
@@ -70,12 +71,77 @@ def th_sets(theta, paths):
          [1, 2]),                                                               # treasure on blue
         dtype=int)
 
-    np.save(os.path.join(paths.components, "O"), O)                             # save to disk
+    paths.save_arrays(sparse=False, file_name="O", array=O)                     # save to disk
 
     # Action set
     A = np.array([0, -d, 1, d, -1])                                             # actions (drill, north, east, south, west)
-    np.save(os.path.join(paths.components, "A"), A)                             # save to disk
+    paths.save_arrays(sparse=False, file_name="A", array=A)                     # save to disk
 
     # Reward set
     R = np.array([0, 1])                                                        # reward (no treasure, treasure)
-    np.save(os.path.join(paths.components, "R"), R)
+    paths.save_arrays(sparse=False, file_name="R", array=R)
+
+
+def th_comb_rank(C, n):
+    """This function evaluates the lexicographic ranks of hiding spot
+    combinations, i.e. their row indices in the sequence of distinct
+    combinations of n_h selections of the set of nodes used in th_sets
+
+    Inputs
+        C        (arr) : m x k array of ascendingly sorted combinations of nodes {1, ..., n}
+        n        (int) : number of nodes the combinations are drawn from
+
+    Outputs
+        rank     (arr) : m x 0 array of lexicographic combination ranks in {0, ..., n choose k - 1}
+
+    Authors - Belinda Fleischmann, Dirk Ostwald
+    """
+    C     = np.atleast_2d(np.asarray(C, dtype=np.int64))                        # combinations as integer array
+    k     = C.shape[1]                                                          # combination size
+    binom = np.array(                                                           # exact binomial coefficient lookup table
+        [[comb(a, b) for b in range(k + 2)] for a in range(n + 1)],
+        dtype=np.int64)
+    i     = np.arange(1, k + 1)                                                 # combination element positions
+    rank  = comb(n, k) - 1 - binom[n - C, k - i + 1].sum(axis=1)                # lexicographic rank
+    return rank
+
+
+def th_state_index(s, theta):
+    """This function evaluates the row indices of state values in the state
+    set S generated by th_sets, without searching S
+
+    Inputs
+        s        (arr) : m x (2 + n_h) array of state values [s1, s2, s3], s3 sorted ascendingly
+        theta    (obj) : task parameter structure with required fields
+            .n_n (int) : number of nodes
+            .n_h (int) : number of hiding spots
+
+    Outputs
+        i_s      (arr) : m x 0 array of state indices
+
+    Note
+        S is sorted by s1, then s2, and finally by the lexicographic rank of
+        s3 among all hiding spot combinations containing s2. Removing s2 from
+        these combinations preserves their lexicographic order, so that the
+        latter rank is the rank of s3 without s2 among the (n_n - 1 choose
+        n_h - 1) combinations of the remaining nodes.
+
+    Authors - Belinda Fleischmann, Dirk Ostwald
+    """
+    n_n     = theta.n_n                                                         # number of nodes
+    n_h     = theta.n_h                                                         # number of hiding spots
+    s       = np.atleast_2d(np.asarray(s, dtype=np.int64))                      # state values as integer array
+    s1      = s[:, 0]                                                           # current positions
+    s2      = s[:, 1]                                                           # treasure locations
+    s3      = s[:, 2:]                                                          # hiding spots
+    n_g     = comb(n_n - 1, n_h - 1)                                            # number of states per (s1, s2) block
+    n_ident = n_n * n_g                                                         # number of states per s1 block
+
+    if n_h > 1:
+        s3_wo_s2 = s3[s3 != s2[:, None]].reshape(-1, n_h - 1)                   # hiding spots without treasure location
+        s3_wo_s2 = s3_wo_s2 - (s3_wo_s2 > s2[:, None])                          # relabel nodes above s2 to {1, ..., n_n - 1}
+        rank = th_comb_rank(s3_wo_s2, n_n - 1)                                  # rank among combinations containing s2
+    else:
+        rank = np.zeros(s.shape[0], dtype=np.int64)                             # s3 == s2 for a single hiding spot
+
+    return (s1 - 1) * n_ident + (s2 - 1) * n_g + rank
@@ -1,6 +1,8 @@
 """
 This Python script simulates the observation of a task-agent interaction on
-a single game of the treasure hunt task.
+a single game of the treasure hunt task. With the environment variable
+TH_HEADLESS set, no figures are plotted and no plotting libraries are
+imported.
 
 Authors - Belinda Fleischmann, Dirk Ostwald
 """
@@ -9,11 +11,14 @@ import os
 from th_structure import th_structure                                           # structures
 from th_paths import th_paths                                                   # path variables
 from th_cards import th_cards                                                   # task sets' cardinalities
+from th_plan import th_plan, th_plan_report, th_plan_workers                    # component representation planner
 from th_sets import th_sets                                                     # task/agent model sets generator
 from th_phi import th_phi                                                       # action-dependent state-state transition probability matrices
 from th_omega import th_omega                                                   # action-dependent state conditional observation probability matrices
+from th_components import th_components_build                                   # concurrent component builds
+from th_index import th_inverted_index                                          # node to hypotheses inverted index
 from th_sim_game import th_sim_game                                             # game simulation routine
-from th_imshow import plot_agent_behavior                                       # plot function
+from th_instrument import instrument                                            # timers, counters and progress reports
 
 
 # Task parameters
@@ -25,11 +30,19 @@ theta.d_s       = 2 + theta.n_h
 theta.n_c       = 1                                                             # number of rounds per game
 theta.n_t       = 12                                                            # maximal number of actions per round
 theta           = th_cards(theta)                                               # task sets' cardinalities
+plot            = os.environ.get("TH_HEADLESS") is None                         # plot figures, unless run headless
 
 # Model parameters  # TODO: [FRAGE] Macht es hier Sinn? Oder eher parameter spaces definieren?
 theta.tau       = np.nan                                                        # post-decision noise parameter
 theta.lambda_   = np.nan                                                        # weighting parameter for agent A3
 
+# Plan component representations within the memory budget before allocating
+plan            = th_plan(theta, budget_bytes=16 * 2 ** 30)                     # component representation plan
+if instrument.verbose or not plan.feasible:                                     # silent by default
+    print(th_plan_report(plan))
+if not plan.feasible:
+    raise MemoryError(f"Components of d = {theta.d}, n_h = {theta.n_h} exceed the memory budget")
+
 # Define path to model components
 paths = th_paths(theta, out_directory_label="test")                             # object to store path variables
 
@@ -40,9 +53,22 @@ O               = np.load(os.path.join(paths.components, "O.npy"))
 A               = np.load(os.path.join(paths.components, "A.npy"))              # action set
 R               = np.load(os.path.join(paths.components, "A.npy"))              # reward set
 
-# Stochastic matrices
-Phi             = th_phi(S, A, theta, paths)                                    # action-dependent state-state transition probability matrices
-Omega           = th_omega(S, O, theta, paths)                                  # action-dependent state conditional observation probability matrices
+# Stochastic matrices, built or loaded concurrently within the memory budget
+Phi             = th_phi(S, A, theta, paths, plan.representation["Phi"])        # action-dependent state-state transition probability matrices
+Omega           = th_omega(S, O, theta, paths, plan.representation["Omega"])    # action-dependent state conditional observation probability matrices
+th_components_build([Phi, Omega], workers=th_plan_workers(plan))                # all per-action matrices on a thread pool
+
+# Plot Phi and Omega, entrywise for small grids of dimension d = 2, as density images of the nonzero entries otherwise
+if plot and theta.d == 2:
+    from th_imshow import plot_color_map                                        # plotting libraries only imported if plotting
+    plot_color_map(                                                             # plot action specific Phi and Omega matrices
+        paths=paths,
+        **{name: matrix.todense() for name, matrix in Phi.named().items()},
+        **{name: matrix.todense() for name, matrix in Omega.named().items()}
+    )
+elif plot:
+    from th_imshow import plot_density_map                                      # plotting libraries only imported if plotting
+    plot_density_map(paths=paths, **Phi.named(), **Omega.named())               # plot without densifying
 
 # Task initialization structure
 t_init          = th_structure()                                                # task initialization structure
@@ -58,6 +84,7 @@ t_init.Omega    = Omega
 a_init          = th_structure()                                                # task initialization structure
 a_init.a_name   = "C1"                                                          # agent label
 a_init.Omega    = Omega                                                         # action-dependent state conditional observation probability matrices
+a_init.index    = th_inverted_index(theta)                                      # node to hypotheses inverted index for belief state filtering
 
 # Behavioral model initialization structure
 m_init          = th_structure()                                                # behavioral model initialization structure
@@ -75,7 +102,9 @@ sim.m_init      = m_init
 sim             = th_sim_game(sim)                                              # simulate one treasure hunt game
 
 # Plot agent behavior
-plot_agent_behavior(paths=paths, theta=theta, beh_data=sim.data)
+if plot:
+    from th_imshow import plot_agent_behavior                                   # plotting libraries only imported if plotting
+    plot_agent_behavior(paths=paths, theta=theta, beh_data=sim.data)
 
 # Save data to tsv
 this_sub_dir = os.path.join(paths.data, f"sub-{a_init.a_name}", "beh")          # path to this agent subject's data folder
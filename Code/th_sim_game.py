@@ -1,9 +1,11 @@
 import numpy as np                                                              # NumPy
 import pandas as pd                                                             # Pandas
 import copy as cp
+import time
 from th_model import th_model
 from th_task import th_task                                                     # task model module
 from th_agent import th_agent                                                   # agent model module
+from th_instrument import instrument                                            # timers, counters and progress reports
 
 
 def th_sim_game(sim):
@@ -49,6 +51,7 @@ def th_sim_game(sim):
 
     # Task agent interaction simulation
     # --------------------------------------------------------------------------
+    game_start = time.perf_counter()                                            # game start time
     task.start_game()                                                           # game start configuration
 
     data_one_block = pd.DataFrame()                                             # init df for one block
@@ -80,19 +83,24 @@ def th_sim_game(sim):
         # Task and agent start new round----------------------------------------
         task.c = c                                                              # round number
         task.r = 0                                                              # reward
+        if c > 0:                                                               # treasure re-hidden, hiding spots and node colors persist
+            task.start_round()
+            agent.start_round()                                                 # belief carry-over
 
         for t in np.arange(theta.n_t):                                          # action iterations
 
             # ------ TRIAL START -----------------------------------------------
+            trial_start = time.perf_counter()                                   # trial start time
             task.t = t                                                          # trial number
 
             if t == 0:                                                          # first trial in round
-                task.g(a=1)                                                     # observation probability as if agent had stepped on its starting position
+                a_prev = 1                                                      # observation probability as if agent had stepped on its starting position
             else:                                                               # all subsequent trials
-                task.g(a=model.a)                                               # evaluate observation o
+                a_prev = int(model.a)                                           # previous action
             # TODO [FRAGE]: Alternativ könnte model.a quasi als dummy-action mit dem Wert 1 initiiert werden.
+            task.g(a=a_prev)                                                    # evaluate observation o
 
-            # tODO: agent update belief state
+            agent.update_belief(a=a_prev, o=task.o)                             # agent belief state update
 
             # Reset dynamic model components
             agent.v = np.nan                                                    # action valences
@@ -104,6 +112,15 @@ def th_sim_game(sim):
             data_one_round.loc[t, "s3_t"]        = task.s[2:]                   # record third task state s^3
             data_one_round.loc[t, "o_t"]         = task.o[:]                    # record observation o
             data_one_round.loc[t, "node_colors"] = cp.deepcopy(task.node_colors[:])  # record node colors
+            data_one_round.at[t, "marg_s1_b_t"]  = np.eye(theta.n_n)[task.s[0] - 1]  # record marginal belief over s^1 (observable)
+            data_one_round.at[t, "marg_s2_b_t"]  = agent.b.marg_s2()            # record marginal belief over s^2
+            data_one_round.at[t, "marg_s3_b_t"]  = agent.b.marg_s3()            # record marginal belief over s^3
+
+            # Round ends, if the treasure was found
+            if task.o[0] == 1:                                                  # treasure flag
+                task.r = 1                                                      # reward
+                data_one_round.loc[t, "r_t"] = task.r                           # record reward
+                break
 
             # ------- TRIAL INTERACTION ----------------------------------------
             # agent make decison
@@ -119,6 +136,12 @@ def th_sim_game(sim):
                 task.update_node_colors()                                       # unveal hiding spot status of current position
             task.f(a)                                                           # task state-state transition
 
+            traced = instrument.trace is not None or instrument.verbose         # number of live states, reported only
+            fields = {"n_live": agent.b.n_live} if traced else {}
+            instrument.add_time(                                                # trial wall time
+                "th_sim_game.trial", time.perf_counter() - trial_start,
+                round=int(c), trial=int(t), **fields)
+
             # ------ END OF ONE TRIAL ------
 
         # Create a dataframe this round's data from recording array dictionary
@@ -131,8 +154,13 @@ def th_sim_game(sim):
 
         # ------ END OF ONE ROUND ------
 
+    if hasattr(agent.b, "close"):                                               # release memory-mapped belief files
+        agent.b.close()
+
     data_one_block.insert(0, "agent", a_init.a_name)                            # add agent name column
     sim.data = data_one_block                                                   # output specification
+    instrument.add_time(                                                        # game wall time
+        "th_sim_game.game", time.perf_counter() - game_start, agent=a_init.a_name)
 
     # ------ END OF ONE GAME ------
 
@@ -0,0 +1,238 @@
+import numpy as np                                                              # numpy
+from th_sets import th_state_index                                              # state value to state index mapping
+
+
+class th_symmetry:
+    def __init__(self, theta, S=None):
+        """This function encodes the instantiation method of the treasure hunt
+        grid symmetry class. The square grid world is invariant under the
+        eight elements of the dihedral group, i.e. the identity, the rotations
+        by 90, 180 and 270 degrees, and the reflections about the vertical,
+        horizontal, main and anti diagonal axes. Task configurations that are
+        mapped onto each other by one of these transformations are
+        equivalent, such that caches and lookahead tables only need to store
+        one representative per orbit.
+
+        Inputs
+            theta      (obj) : task parameter structure with required fields
+                .d     (int) : dimensionality of the square grid world
+                .n_n   (int) : number of nodes
+                .n_h   (int) : number of hiding spots
+            S          (arr) : n_s x (2 + n_h) array of state values, only required to transform state beliefs
+
+        Authors - Belinda Fleischmann, Dirk Ostwald
+        """
+        # Structural components
+        self.theta   = theta                                                    # task parameters
+        self.S       = S                                                        # state set
+        self.n_g     = 8                                                        # number of group elements
+        self.A       = np.array([0, -theta.d, 1, theta.d, -1])                  # actions (drill, north, east, south, west)
+
+        # Node permutations, P[g, n] is the node index of node index n after transformation g
+        nodes        = np.arange(theta.n_n)                                     # node indices
+        rows, cols   = np.divmod(nodes, theta.d)                                # grid coordinates of nodes
+        self.P       = np.full((self.n_g, theta.n_n), 0, dtype=np.int64)        # node permutations initialization
+        for g in range(self.n_g):                                               # group element iterations
+            r, c      = self.transform_coords(g, rows, cols)                    # transformed grid coordinates
+            self.P[g] = r * theta.d + c                                         # transformed node indices
+        self.P_inv   = np.argsort(self.P, axis=1)                               # inverse node permutations
+
+        # Action permutations, P_a[g, i_a] is the action index of action index i_a after transformation g
+        directions   = np.array([[0, 0], [-1, 0], [0, 1], [1, 0], [0, -1]])     # action directions (row, col)
+        self.P_a     = np.full((self.n_g, len(self.A)), 0, dtype=np.int64)      # action permutations initialization
+        for g in range(self.n_g):                                               # group element iterations
+            origin   = np.array(self.transform_coords(g, 0, 0))                 # transformed origin
+            for i_a, direction in enumerate(directions):                        # action iterations
+                image = (np.array(self.transform_coords(g, *direction))         # transformed direction
+                         - origin)
+                self.P_a[g, i_a] = np.flatnonzero(                              # index of transformed direction
+                    np.all(directions == image, axis=1))[0]
+        self.P_a_inv = np.argsort(self.P_a, axis=1)                             # inverse action permutations
+
+        # State permutations, evaluated on demand
+        self.P_s     = {}                                                       # dict with n_g entries of n_s x 0 state index permutations
+
+    def transform_coords(self, g, rows, cols):
+        """This function evaluates the grid coordinates after transformation g
+
+        Inputs
+            self   (obj) : symmetry object
+            g      (int) : group element index in {0, ..., 7}
+            rows   (arr) : grid row coordinates in {0, ..., d - 1}
+            cols   (arr) : grid column coordinates in {0, ..., d - 1}
+
+        Outputs
+            rows   (arr) : transformed grid row coordinates
+            cols   (arr) : transformed grid column coordinates
+        """
+        m = self.theta.d - 1                                                    # maximal grid coordinate
+        transformations = [
+            lambda r, c: (r, c),                                                # identity
+            lambda r, c: (c, m - r),                                            # rotation by 90 degrees (clockwise)
+            lambda r, c: (m - r, m - c),                                        # rotation by 180 degrees
+            lambda r, c: (m - c, r),                                            # rotation by 270 degrees (clockwise)
+            lambda r, c: (r, m - c),                                            # reflection about the vertical axis
+            lambda r, c: (m - r, c),                                            # reflection about the horizontal axis
+            lambda r, c: (c, r),                                                # reflection about the main diagonal
+            lambda r, c: (m - c, m - r)                                         # reflection about the anti diagonal
+        ]
+        return transformations[g](rows, cols)
+
+    def transform_nodes(self, g, x):
+        """This function transforms node-indexed arrays, such as node colors
+        or marginal beliefs over nodes
+
+        Inputs
+            self   (obj) : symmetry object
+            g      (int) : group element index
+            x      (arr) : (...) x n_n array of node-indexed values
+
+        Outputs
+            y      (arr) : (...) x n_n array of transformed node-indexed values
+        """
+        x = np.asarray(x)
+        return x[..., self.P_inv[g]]
+
+    def transform_position(self, g, s1):
+        """This function transforms node values, such as the agent's position
+
+        Inputs
+            self   (obj) : symmetry object
+            g      (int) : group element index
+            s1     (int) : node value(s) in {1, ..., n_n}
+
+        Outputs
+            s1     (int) : transformed node value(s)
+        """
+        return self.P[g, np.asarray(s1) - 1] + 1
+
+    def transform_action(self, g, a):
+        """This function transforms an action value, e.g. to map an action
+        evaluated in a transformed configuration
+
+        Inputs
+            self   (obj) : symmetry object
+            g      (int) : group element index
+            a      (int) : action value in A
+
+        Outputs
+            a      (int) : transformed action value
+        """
+        i_a = int(np.flatnonzero(self.A == a)[0])                               # action index
+        return self.A[self.P_a[g, i_a]]
+
+    def inverse_action(self, g, a):
+        """This function maps an action value evaluated for the transformed
+        configuration back to the original configuration
+
+        Inputs
+            self   (obj) : symmetry object
+            g      (int) : group element index
+            a      (int) : action value in A, evaluated for the transformed configuration
+
+        Outputs
+            a      (int) : action value for the original configuration
+        """
+        i_a = int(np.flatnonzero(self.A == a)[0])                               # action index
+        return self.A[self.P_a_inv[g, i_a]]
+
+    def transform_states(self, g, s):
+        """This function transforms state values
+
+        Inputs
+            self   (obj) : symmetry object
+            g      (int) : group element index
+            s      (arr) : m x (2 + n_h) array of state values
+
+        Outputs
+            s      (arr) : m x (2 + n_h) array of transformed state values, s3 sorted ascendingly
+        """
+        s_g        = self.P[g, np.asarray(s, dtype=np.int64) - 1] + 1           # transformed node values
+        s_g[:, 2:] = np.sort(s_g[:, 2:], axis=1)                                # sort hiding spots
+        return s_g
+
+    def state_permutation(self, g):
+        """This function evaluates the state index permutation of group
+        element g, i.e. the state indices of all transformed states in S
+
+        Inputs
+            self   (obj) : symmetry object
+                .S (arr) : n_s x (2 + n_h) array of state values
+            g      (int) : group element index
+
+        Outputs
+            P_s    (arr) : n_s x 0 array of transformed state indices
+        """
+        if g not in self.P_s:
+            self.P_s[g] = th_state_index(                                       # transformed state indices
+                self.transform_states(g, self.S), self.theta)
+        return self.P_s[g]
+
+    def transform_belief(self, g, b):
+        """This function transforms beliefs over nodes, over hypotheses, i.e.
+        (s2, s3) values, or over states
+
+        Inputs
+            self   (obj) : symmetry object
+            g      (int) : group element index
+            b      (arr) : n_n, n_s / n_n or n_s x 0 array of probabilities
+
+        Outputs
+            b      (arr) : transformed array of probabilities
+        """
+        b       = np.asarray(b)
+        n_n     = self.theta.n_n                                                # number of nodes
+        n_ident = self.theta.n_s // n_n                                         # number of hypotheses (s2, s3)
+
+        if b.shape[-1] == n_n:                                                  # belief over nodes
+            return self.transform_nodes(g, b)
+
+        if b.shape[-1] == n_ident:                                              # belief over hypotheses, i.e. states with s1 = 1
+            P_s = self.state_permutation(g)[:n_ident] % n_ident                 # transformed hypothesis indices
+        else:                                                                   # belief over states
+            P_s = self.state_permutation(g)
+
+        b_g = np.empty_like(b)
+        b_g[..., P_s] = b                                                       # transformed belief
+        return b_g
+
+    def canonicalize(self, position, node_colors, belief=None):
+        """This function evaluates the canonical representative of the orbit
+        of a configuration, i.e. the transformed configuration with the
+        lexicographically smallest (position, node_colors) value
+
+        Inputs
+            self         (obj) : symmetry object
+            position     (int) : agent position s1 in {1, ..., n_n}
+            node_colors  (arr) : 1 x n_n array of node colors
+            belief       (arr) : optional belief over nodes, hypotheses or states
+
+        Outputs
+            g            (int) : group element mapping the configuration onto its representative
+            position     (int) : canonical position
+            node_colors  (arr) : canonical node colors
+            belief       (arr) : canonical belief (None if not provided)
+        """
+        positions = self.transform_position(np.arange(self.n_g), position)      # transformed positions
+        colors    = np.asarray(node_colors)[self.P_inv]                         # transformed node colors
+        keys      = np.column_stack((positions, colors))                        # orbit element keys
+        g         = int(np.lexsort(keys.T[::-1])[0])                            # smallest key, smallest g on ties
+
+        if belief is not None:
+            belief = self.transform_belief(g, belief)
+        return g, int(positions[g]), colors[g], belief
+
+    def orbit_key(self, position, node_colors):
+        """This function evaluates a hashable key identifying the orbit of a
+        configuration for caches and lookahead tables
+
+        Inputs
+            self         (obj) : symmetry object
+            position     (int) : agent position s1 in {1, ..., n_n}
+            node_colors  (arr) : 1 x n_n array of node colors
+
+        Outputs
+            key        (tuple) : (canonical position, canonical node colors as bytes)
+        """
+        _, position, node_colors, _ = self.canonicalize(position, node_colors)
+        return position, np.asarray(node_colors, dtype=np.int8).tobytes()
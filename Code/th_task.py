@@ -1,5 +1,7 @@
 import numpy as np                                                              # numpy
-import scipy.stats as rv
+from th_components import th_toarray                                            # representation independent array conversion
+from th_sets import th_state_index                                              # state index evaluation
+from th_structure import th_structure                                           # structures
 
 
 class th_task:
@@ -15,6 +17,10 @@ class th_task:
                 .A      (arr) : 5 x 1 array of action values
                 .R      (arr) : 2 x 1 array no reward values
                 .Phi    (dic) : dict with n_a entries of n_s x n_s sparse arrays of state transition probabilities
+                .rng    (obj) : optional random number generator of the game and round start states, a
+                                np.random.RandomState object, defaults to the np.random module
+                .starts (obj) : optional start states drawn beforehand, see th_task_starts, which are
+                                replayed instead of drawn from .rng
 
         Authors - Belinda Fleischmann, Dirk Ostwald
         """
@@ -26,6 +32,8 @@ class th_task:
         self.Phi         = t_init.Phi                                           # action-dependent state-state transition probability
         self.Omega       = t_init.Omega                                         # action-dependent and state-conditional observation probability distribution
         self.A_giv_s1    = np.nan                                               # state-dependent action set
+        self.rng         = t_init.rng if hasattr(t_init, "rng") else np.random  # random number generator of start states
+        self.starts      = t_init.starts if hasattr(t_init, "starts") else None # replayed start states
 
         # Dynamic components
         self.c           = np.nan                                               # current round
@@ -42,7 +50,7 @@ class th_task:
         This function determines a game's starting state, including the agent's
         starting position, the treasure position and the hiding spot positions.
         It keeps on sampling until the starting positon is not the treasure
-        location.
+        location. Start states drawn beforehand are replayed.
 
         Inputs
                 self   (obj) : task object
@@ -52,14 +60,46 @@ class th_task:
                     .s_i (int) : task state index
                     .s   (arr) : 1 x (n_h + 2) array of current task state
         """
+        if self.starts is not None:                                             # replay
+            self.i_s        = self.starts.i_s
+            self.s          = self.S[self.i_s, :]
+            return
 
         while True:
-            self.i_s        = rv.randint.rvs(0, self.theta.n_s)                 # uniform random state index
+            self.i_s        = self.rng.randint(0, self.theta.n_s)               # uniform random state index
             self.s          = self.S[self.i_s, :]                               # state value
             # check, if start position at beginning of a game is treasure loc
             if self.s[0] != self.s[1]:                                          # current positon == treasure location?
                 break
 
+    def start_round(self):
+        """
+        This function re-hides the treasure at the start of a new round. The
+        hiding spots and the node colors persist, and the new treasure
+        location is sampled uniformly among the hiding spots other than the
+        current position, unless the latter is the only hiding spot. The
+        hiding spots are ranked by n_h uniform random numbers, and the first
+        admissible one is selected, such that the number of random numbers
+        drawn does not depend on the current position. Rankings drawn
+        beforehand are replayed.
+
+        Inputs
+                self   (obj) : task object
+
+        Outputs
+                self     (obj) : task object with updated attributes
+                    .s_i (int) : task state index
+                    .s   (arr) : 1 x (n_h + 2) array of current task state
+        """
+        s1, s3     = self.s[0], self.s[2:]                                      # current position, hiding spots
+        rank       = (self.rng.random(self.theta.n_h) if self.starts is None    # random ranking of the hiding spots
+                      else self.starts.ranks[self.c - 1])
+        admissible = (s3 != s1) | (self.theta.n_h == 1)                         # possible treasure locations
+        s          = self.s.copy()
+        s[1]       = s3[admissible][np.argmin(rank[admissible])]                # new treasure location
+        self.i_s   = int(th_state_index(s, self.theta)[0])                      # state index
+        self.s     = self.S[self.i_s, :]                                        # state value
+
     def f(self, a):
         """This function evaluates the task's state-state transition function.
 
@@ -77,11 +117,11 @@ class th_task:
                 .i_s (int) : task state index
                 .s   (arr) : 1 x (n_h + 2) array of current task state (updated)
         """
-        i_a = int(np.where(self.A == a)[0])                                     # action index
+        i_a = int(np.where(self.A == a)[0][0])                                  # action index
 
-        Phi_a_s_t = self.Phi[i_a][self.i_s, :].toarray()[0]                     # a-dep. Phi vector giv current s_t
+        Phi_a_s_t = th_toarray(self.Phi[i_a][self.i_s, :]).ravel()              # a-dep. Phi vector giv current s_t
         i_s_tt = np.argmax(                                                     # index of s_{t+1}
-            rv.multinomial.rvs(
+            np.random.multinomial(
                 1, Phi_a_s_t
             ) != 0
         )
@@ -122,19 +162,26 @@ class th_task:
                 .i_s         (int) : state index
                 .O           (arr) : n_n x 2 array of observation values
                 .Omega       (dic) : dict with 2 entries of n_s x n_o sparse arrays of observation probability
+                .node_colors (arr) : 1 x n_n array representing node colors
             a                (int) : action in trial t
 
         Outputs
             self             (obj) : task object with updated attributes
                 .o           (arr) : 1 x 2 array of observation
         """
-        A = [0, 1]                                                              # compressed action space (drill/step)
-        i_a = A.index(a)                                                        # action index
+        i_a = 0 if a == 0 else 1                                                # compressed action index (drill/step)
 
         # TODO: Omega nicht deterministisch
-        Omega_a_s_t = self.Omega[i_a][self.i_s, :].toarray()[0]                 # Omega vector giv current a and s_t
+        Omega_a_s_t = th_toarray(self.Omega[i_a][self.i_s, :]).ravel()          # Omega vector giv current a and s_t
+
+        # After step actions, Omega admits the node colors black and grey or
+        # blue, of which the current node color is observed
+        if i_a == 1:
+            Omega_a_s_t = Omega_a_s_t * (                                       # restrict to current node color
+                self.O[:, 1] == self.node_colors[self.s[0] - 1])
+        Omega_a_s_t = Omega_a_s_t / Omega_a_s_t.sum()                           # normalize
         i_o = np.argmax(                                                        # index of o_t
-            rv.multinomial.rvs(
+            np.random.multinomial(
                 1, Omega_a_s_t
             ) != 0
         )
@@ -168,3 +215,25 @@ class th_task:
                         and action == 1)):
 
                 self.A_giv_s1 = self.A_giv_s1[self.A_giv_s1 != action]
+
+
+def th_task_starts(t_init):
+    """This function draws the start states of a game beforehand, i.e. the
+    game start state and the hiding spot rankings of all rounds, with the
+    same random numbers as th_task.start_game and th_task.start_round, such
+    that they can be replayed to several tasks, e.g. one per agent
+
+    Inputs
+        t_init      (obj) : task initialization parameter structure, see th_task
+
+    Outputs
+        starts      (obj) : start states with fields
+            .i_s    (int) : game start state index
+            .ranks  (arr) : (n_c - 1) x n_h array of hiding spot rankings of the rounds after the first
+    """
+    task         = th_task(t_init)
+    task.start_game()
+    starts       = th_structure()
+    starts.i_s   = int(task.i_s)
+    starts.ranks = task.rng.random((task.theta.n_c - 1, task.theta.n_h))
+    return starts
@@ -0,0 +1,293 @@
+"""
+This Python script serves the treasure hunt task to concurrent players over
+TCP. Each connection hosts one game session with its own task state, while
+all sessions share one loaded copy of the task components S, Phi and Omega.
+Messages are JSON objects, one per line.
+
+Client messages
+    {"type": "start", "player": <label>, "seed": <int>}  : start a game, seed optional
+    {"type": "move", "a": <action>}                      : perform an action, see "actions"
+    {"type": "quit"}                                     : close the session
+
+Server messages
+    {"type": "hello", ...}        : task parameters, sent on connection
+    {"type": "observation", ...}  : round, trial, position, observation, node colors and available actions
+    {"type": "round_end", ...}    : round, reward and treasure location
+    {"type": "game_end", ...}     : total reward and path of the behavioral data file
+    {"type": "error", ...}        : invalid message, the session continues
+
+The behavioral data of finished games are written to the Data layout of
+th_sim, i.e. Data/<label>_dim-<d>_hide-<n_h>/sub-<player>/beh/. A player
+label is held by at most one unfinished game, and a game is only started
+again on a connection once the previous game has ended.
+
+Usage (from the repository root)
+    python Code/th_vis_game.py serve [--dim 3] [--hide 2] [--rounds 1] [--trials 12] [--port 8765]
+    python Code/th_vis_game.py bots [--players 24] [--port 8765]
+
+Authors - Belinda Fleischmann, Dirk Ostwald
+"""
+import argparse                                                                 # command line arguments
+import asyncio                                                                  # asynchronous input/output
+import copy as cp                                                               # shallow copies of initialization structures
+import json                                                                     # JSON serialization
+import os                                                                       # operating system interface
+import re                                                                       # regular expressions
+import numpy as np                                                              # numpy
+import pandas as pd                                                             # pandas
+from th_task import th_task                                                     # task model module
+from th_queue import th_queue_components, th_queue_write                        # shared task components, atomic writes
+
+
+class th_vis_session:
+    def __init__(self, t_init, player, seed=None):
+        """This function encodes the instantiation method of the game session
+        class, i.e. of the task state of one player, whose start states are
+        drawn from the session's random number generator
+
+        Inputs
+            t_init      (obj) : task initialization structure, see th_task, shared by all sessions
+            player      (str) : alphanumeric player label
+            seed        (int) : seed of the session's start states, None for a random seed
+
+        Authors - Belinda Fleischmann, Dirk Ostwald
+        """
+        if not re.fullmatch(r"[A-Za-z0-9]+", player):
+            raise ValueError(f"Player label {player!r} is not alphanumeric")
+        t_init         = cp.copy(t_init)                                        # components are shared
+        t_init.rng     = np.random.RandomState(seed)                            # session start states
+        self.task      = th_task(t_init)                                        # task object
+        self.theta     = t_init.theta                                           # task parameters
+        self.player    = player                                                 # player label
+        self.rows      = []                                                     # behavioral data, one dict per trial
+        self.rewards   = 0                                                      # number of treasures found
+        self.done      = False                                                  # game finished
+
+    def observe(self, a_prev):
+        """This function evaluates the observation at the start of a trial,
+        records it and returns the observation message, and the round end
+        message, if the treasure was found"""
+        task = self.task
+        task.g(a=a_prev)                                                        # evaluate observation o
+        row  = {"round_": int(task.c) + 1, "trial": int(task.t) + 1, "s1_t": int(task.s[0]),
+                "s2_t": int(task.s[1]), "s3_t": task.s[2:].copy(), "o_t": task.o.copy(),
+                "a_t": np.nan, "r_t": np.nan, "node_colors": task.node_colors.copy()}
+        self.rows.append(row)
+        task.identify_A_giv_s1()                                                # evaluate set of available actions
+        messages = [{"type": "observation", "round": row["round_"], "trial": row["trial"],
+                     "s1": row["s1_t"], "o": [int(x) for x in task.o],
+                     "node_colors": [int(x) for x in task.node_colors],
+                     "actions": [int(x) for x in task.A_giv_s1]}]
+        if task.o[0] == 1:                                                      # treasure found
+            row["r_t"]    = 1
+            self.rewards += 1
+            messages.extend(self.end_round(reward=1))
+        return messages
+
+    def end_round(self, reward):
+        """This function ends the current round, and starts the next round
+        or ends the game"""
+        task     = self.task
+        messages = [{"type": "round_end", "round": int(task.c) + 1, "reward": reward,
+                     "treasure": int(task.s[1])}]
+        if task.c + 1 < self.theta.n_c:
+            task.c, task.t, task.r = task.c + 1, 0, 0
+            task.start_round()                                                  # treasure re-hidden, hiding spots and node colors persist
+            messages.extend(self.observe(a_prev=1))                             # observation as if stepped on the current position
+        else:
+            self.done = True
+        return messages
+
+    def start(self):
+        """This function starts the game and returns the first messages"""
+        task = self.task
+        task.c, task.t, task.r = 0, 0, 0
+        task.start_game()                                                       # game start configuration
+        return self.observe(a_prev=1)                                           # observation as if stepped on the starting position
+
+    def move(self, a):
+        """This function performs an action and returns the resulting
+        messages, i.e. the next observation and, if the round or game ended,
+        the round end message
+
+        Inputs
+            a          (int) : action value
+
+        Outputs
+            messages  (list) : list of message dicts
+        """
+        task = self.task
+        if self.done:
+            raise ValueError("The game is finished")
+        if a not in task.A_giv_s1:
+            raise ValueError(f"Action {a} is not available on node {task.s[0]}, available: {[int(x) for x in task.A_giv_s1]}")
+
+        self.rows[-1]["a_t"] = a                                                # record action
+        if a == 0:                                                              # if drill action
+            task.update_node_colors()                                           # unveal hiding spot status of current position
+        task.f(a)                                                               # task state-state transition
+        if task.t + 1 < self.theta.n_t:
+            task.t += 1
+            return self.observe(a_prev=a)
+        return self.end_round(reward=0)                                         # maximal number of actions
+
+    def data(self):
+        """This function returns the behavioral data of the session in the
+        column layout of th_sim_game"""
+        data = pd.DataFrame(self.rows, columns=["round_", "trial", "s1_t", "s2_t", "s3_t", "o_t",
+                                                "a_t", "r_t", "node_colors"], dtype=object)
+        data.insert(0, "agent", self.player)
+        return data
+
+
+def th_vis_save(session, data_dir, label):
+    """This function writes the behavioral data of a finished game session
+    and returns the path of the data file"""
+    theta     = session.theta
+    sub_dir   = os.path.join(data_dir, f"{label}_dim-{theta.d}_hide-{theta.n_h}", f"sub-{session.player}", "beh")
+    os.makedirs(sub_dir, exist_ok=True)
+    data_path = os.path.join(sub_dir, f"sub-{session.player}_beh.tsv")
+    th_queue_write(data_path, session.data().to_csv(sep="\t", na_rep="nan", index=False))
+    return data_path
+
+
+async def th_vis_handle(reader, writer, t_init, data_dir, label, players):
+    """This function serves one connection, i.e. one game session. The set
+    players holds the labels of the unfinished games of all connections."""
+    theta   = t_init.theta
+    session = None
+    held    = None                                                              # player label held by the unfinished game
+    loop    = asyncio.get_running_loop()
+
+    async def send(message):
+        writer.write((json.dumps(message) + "\n").encode())
+        await writer.drain()
+
+    await send({"type": "hello", "d": theta.d, "n_h": theta.n_h, "n_c": theta.n_c, "n_t": theta.n_t,
+                "actions": [int(a) for a in t_init.A]})
+    try:
+        while line := await reader.readline():
+            try:
+                message = json.loads(line)
+                if not isinstance(message, dict):                               # e.g. a JSON array or number
+                    raise ValueError(f"Unexpected message {message}")
+                if message.get("type") == "quit":
+                    break
+                if message.get("type") == "start":
+                    player = str(message.get("player", "player"))
+                    if session is not None and not session.done:
+                        raise ValueError(f"Game of player {session.player} is not finished")
+                    if player in players:                                       # data files are per player label
+                        raise ValueError(f"Player {player} is playing on another connection")
+                    session  = th_vis_session(t_init, player, message.get("seed"))
+                    players.add(player)
+                    held     = player
+                    messages = session.start()
+                elif message.get("type") == "move" and session is not None:
+                    messages = session.move(int(message["a"]))
+                else:
+                    raise ValueError(f"Unexpected message {message}")
+            except (ValueError, KeyError, TypeError) as error:                  # includes JSON decoding errors
+                await send({"type": "error", "message": str(error)})
+                continue
+
+            if session.done:                                                    # save behavioral data, off the event loop
+                data_path = await loop.run_in_executor(None, th_vis_save, session, data_dir, label)
+                players.discard(held)
+                held = None
+                messages.append({"type": "game_end", "rewards": session.rewards, "data": data_path})
+            for out in messages:
+                await send(out)
+    except ConnectionError:                                                     # player disconnected
+        pass
+    finally:
+        if held is not None:                                                    # unfinished game is abandoned
+            players.discard(held)
+        writer.close()
+
+
+async def th_vis_serve(t_init, host="127.0.0.1", port=8765, data_dir="Data", label="vis"):
+    """This function runs the game server until cancelled
+
+    Inputs
+        t_init      (obj) : task initialization structure, see th_task
+        host        (str) : host address
+        port        (int) : port, 0 for any free port
+        data_dir    (str) : path to Data directory
+        label       (str) : output directory label
+    """
+    players = set()                                                             # player labels of unfinished games
+    server  = await asyncio.start_server(
+        lambda reader, writer: th_vis_handle(reader, writer, t_init, data_dir, label, players), host, port)
+    print(f"Serving dim-{t_init.theta.d}_hide-{t_init.theta.n_h} on "
+          f"{', '.join(str(s.getsockname()[:2]) for s in server.sockets)}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+async def th_vis_bot(host, port, player, seed):
+    """This function plays one game with uniformly random actions, e.g. to
+    load test the server
+
+    Outputs
+        end        (dict) : game end message
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = np.random.default_rng(seed)
+
+    async def send(message):
+        writer.write((json.dumps(message) + "\n").encode())
+        await writer.drain()
+
+    await reader.readline()                                                     # hello
+    await send({"type": "start", "player": player, "seed": seed})
+    while True:
+        message = json.loads(await reader.readline())
+        if message["type"] == "game_end":
+            break
+        if message["type"] == "observation":
+            actions = message["actions"]
+        elif message["type"] == "error":
+            raise RuntimeError(message["message"])
+        if message["type"] == "observation" and message["o"][0] == 0:           # next round follows a found treasure
+            await send({"type": "move", "a": int(rng.choice(actions))})
+    await send({"type": "quit"})
+    writer.close()
+    return message
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Treasure hunt game server")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="serve games until interrupted")
+    serve.add_argument("--dim", type=int, default=3, help="dimension of the square grid world")
+    serve.add_argument("--hide", type=int, default=2, help="number of hiding spots")
+    serve.add_argument("--rounds", type=int, default=1, help="number of rounds per game")
+    serve.add_argument("--trials", type=int, default=12, help="maximal number of actions per round")
+    serve.add_argument("--label", default="vis", help="output directory label")
+    serve.add_argument("--data", default="Data", help="Data directory")
+    serve.add_argument("--host", default="127.0.0.1", help="host address")
+    serve.add_argument("--port", type=int, default=8765, help="port")
+    bots = commands.add_parser("bots", help="play concurrent games with random actions")
+    bots.add_argument("--players", type=int, default=24, help="number of concurrent players")
+    bots.add_argument("--host", default="127.0.0.1", help="host address")
+    bots.add_argument("--port", type=int, default=8765, help="port")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        _, t_init, _ = th_queue_components({"d": args.dim, "n_h": args.hide, "n_c": args.rounds,
+                                            "n_t": args.trials, "label": args.label})
+        try:
+            asyncio.run(th_vis_serve(t_init, args.host, args.port, args.data, args.label))
+        except KeyboardInterrupt:
+            pass
+    else:
+        async def play():
+            return await asyncio.gather(*[th_vis_bot(args.host, args.port, f"bot{i + 1:03d}", i)
+                                          for i in range(args.players)])
+        ends = asyncio.run(play())
+        print(f"{len(ends)} games, {sum(end['rewards'] for end in ends)} treasures found")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Equivalence tests of the kernel backends of th_kernels: each kernel of the
+default backend, the compiled loops if Numba is installed and the
+uncompiled loops otherwise, is compared with its NumPy fallback on the
+state sets of small task configurations, and the TH_NUMBA=0 override is
+checked in a fresh interpreter.
+
+Usage (from the repository root)
+    python -m pytest tests
+    python -m unittest discover tests
+
+Authors - Belinda Fleischmann, Dirk Ostwald
+"""
+import os                                                                       # operating system interface
+import subprocess                                                               # child processes
+import sys                                                                      # system interface
+import unittest                                                                 # test framework
+import numpy as np                                                              # numpy
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Code")
+sys.path.insert(0, CODE_DIR)
+
+import th_kernels                                                               # noqa: E402
+from th_kernels import (th_kernel, th_kernel_states, th_kernel_phi_targets,     # noqa: E402
+                        th_kernel_omega_entries, th_kernel_compact)
+from th_omega import th_omega_class_table                                       # noqa: E402
+
+# Small task configurations (d, n_h)
+CONFIGS = [(2, 1), (2, 2), (3, 2), (3, 3)]
+
+# Reference backend, compiled loops if Numba is installed, uncompiled loops otherwise
+REFERENCE = "numba" if "numba" in th_kernels.kernels else "loop"
+
+# Observation set, as by th_sets
+O = np.array([[0, 0], [0, 1], [0, 2], [1, 0], [1, 2]])
+
+
+class test_kernels(unittest.TestCase):
+    def test_phi_targets(self):
+        for d, n_h in CONFIGS:
+            theta, S = th_kernel_states(d, n_h)
+            n_ident  = theta.n_s // theta.n_n
+            for a in [0, -d, 1, d, -1]:
+                with self.subTest(d=d, n_h=n_h, a=a):
+                    target = th_kernel_phi_targets(S, a, theta, use="numpy")
+                    np.testing.assert_array_equal(target, th_kernel_phi_targets(S, a, theta, use=REFERENCE))
+                    start, stop = n_ident, theta.n_s - n_ident                  # state range of whole s1 blocks
+                    np.testing.assert_array_equal(
+                        target[start:stop], th_kernel_phi_targets(S, a, theta, start, stop, use=REFERENCE))
+                    self.assertTrue(np.all(np.diff(target.reshape(-1, n_ident), axis=1) == 1))  # identity blocks
+
+    def test_omega_entries(self):
+        for d, n_h in CONFIGS:
+            _, S   = th_kernel_states(d, n_h)
+            labels = ((S[:, 2:] == S[:, [0]]).any(axis=1).astype(np.int8)
+                      + (S[:, 0] == S[:, 1])).astype(np.int8)
+            for p in [0, 1]:
+                with self.subTest(d=d, n_h=n_h, p=p):
+                    table = th_omega_class_table(O, p)
+                    for x, y in zip(th_kernel_omega_entries(labels, table, "numpy"),
+                                    th_kernel_omega_entries(labels, table, REFERENCE)):
+                        np.testing.assert_array_equal(x, y)
+
+    def test_compact(self):
+        rng = np.random.default_rng(0)
+        for d, n_h in CONFIGS:
+            theta, _ = th_kernel_states(d, n_h)
+            with self.subTest(d=d, n_h=n_h):
+                i_h     = np.sort(rng.choice(theta.n_s, size=theta.n_s // 2, replace=False))
+                p       = rng.random(i_h.size)
+                p      /= p.sum()
+                weights = (rng.random(i_h.size) < 0.5).astype(np.float64)
+                i_x, p_x = th_kernel_compact(i_h, p, weights, "numpy")
+                i_y, p_y = th_kernel_compact(i_h, p, weights, REFERENCE)
+                np.testing.assert_array_equal(i_x, i_y)
+                np.testing.assert_allclose(p_x, p_y, rtol=1e-12, atol=0)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            th_kernel("compact", use="fortran")
+
+    def backend(self, numba_env):
+        """Default backend of th_kernels imported in a fresh interpreter"""
+        env = {key: value for key, value in os.environ.items() if key != "TH_NUMBA"}
+        if numba_env is not None:
+            env["TH_NUMBA"] = numba_env
+        return subprocess.run(
+            [sys.executable, "-c", "import th_kernels; print(th_kernels.backend)"],
+            cwd=CODE_DIR, env=env, capture_output=True, text=True, check=True).stdout.strip()
+
+    def test_numba_override(self):
+        self.assertEqual(self.backend("0"), "numpy")
+        self.assertEqual(self.backend(None), "numba" if th_kernels.numba is not None else "numpy")
+        self.assertEqual(self.backend("1"), "numba" if th_kernels.numba is not None else "numpy")
+
+
+if __name__ == "__main__":
+    unittest.main()